@@ -15,6 +15,8 @@ from googleapiclient.http import MediaFileUpload
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
 
+from utils.http_client import get_client
+
 # Initialize Sentry
 sentry_sdk.init(
     dsn=os.getenv("SENTRY_DSN"),
@@ -110,42 +112,40 @@ async def youtube_oauth_callback(data: OAuthCallback):
 async def instagram_oauth_callback(data: OAuthCallback):
     """Exchange Instagram OAuth code for tokens and store in Supabase"""
     try:
-        import httpx
+        client = get_client("instagram")
+        resp = await client.post(
+            "https://api.instagram.com/oauth/access_token",
+            data={
+                "client_id": os.getenv("INSTAGRAM_CLIENT_ID"),
+                "client_secret": os.getenv("INSTAGRAM_CLIENT_SECRET"),
+                "grant_type": "authorization_code",
+                "redirect_uri": "http://localhost:8000/oauth/instagram/callback",
+                "code": data.code,
+            },
+        )
         
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                "https://api.instagram.com/oauth/access_token",
-                data={
-                    "client_id": os.getenv("INSTAGRAM_CLIENT_ID"),
-                    "client_secret": os.getenv("INSTAGRAM_CLIENT_SECRET"),
-                    "grant_type": "authorization_code",
-                    "redirect_uri": "http://localhost:8000/oauth/instagram/callback",
-                    "code": data.code,
-                },
-            )
-            
-            if resp.status_code != 200:
-                raise HTTPException(400, "Instagram token exchange failed")
-            
-            token_data = resp.json()
-            
-            # Store in Supabase
-            if supabase:
-                users = supabase.table("users").select("id").limit(1).execute()
-                if not users.data:
-                    user = supabase.table("users").insert({"email": "solo@videoexpress.ai"}).execute()
-                    user_id = user.data[0]["id"]
-                else:
-                    user_id = users.data[0]["id"]
-                
-                supabase.table("social_tokens").upsert({
-                    "user_id": user_id,
-                    "provider": "instagram",
-                    "access_token": token_data["access_token"],
-                    "expires_at": None,  # Long-lived tokens don't expire
-                }).execute()
+        if resp.status_code != 200:
+            raise HTTPException(400, "Instagram token exchange failed")
+        
+        token_data = resp.json()
+        
+        # Store in Supabase
+        if supabase:
+            users = supabase.table("users").select("id").limit(1).execute()
+            if not users.data:
+                user = supabase.table("users").insert({"email": "solo@videoexpress.ai"}).execute()
+                user_id = user.data[0]["id"]
+            else:
+                user_id = users.data[0]["id"]
             
-            return {"success": True, "provider": "instagram"}
+            supabase.table("social_tokens").upsert({
+                "user_id": user_id,
+                "provider": "instagram",
+                "access_token": token_data["access_token"],
+                "expires_at": None,  # Long-lived tokens don't expire
+            }).execute()
+        
+        return {"success": True, "provider": "instagram"}
     
     except Exception as e:
         sentry_sdk.capture_exception(e)
@@ -179,14 +179,13 @@ async def upload_to_youtube(data: SocialUpload):
         youtube = build("youtube", "v3", credentials=credentials)
         
         # Download video from R2
-        import httpx
         import tempfile
         
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(data.video_url)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-                tmp.write(resp.content)
-                tmp_path = tmp.name
+        client = get_client("downloads")
+        resp = await client.get(data.video_url)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+            tmp.write(resp.content)
+            tmp_path = tmp.name
         
         # Upload to YouTube
         request = youtube.videos().insert(
@@ -237,42 +236,40 @@ async def upload_to_instagram(data: SocialUpload):
         access_token = token_data["access_token"]
         
         # Instagram Graph API upload (simplified)
-        import httpx
+        client = get_client("instagram")
+        # Create media container
+        resp = await client.post(
+            f"https://graph.instagram.com/v18.0/me/media",
+            params={
+                "video_url": data.video_url,
+                "caption": f"{data.title}\n\n{data.description}",
+                "access_token": access_token,
+            },
+        )
         
-        async with httpx.AsyncClient() as client:
-            # Create media container
-            resp = await client.post(
-                f"https://graph.instagram.com/v18.0/me/media",
-                params={
-                    "video_url": data.video_url,
-                    "caption": f"{data.title}\n\n{data.description}",
-                    "access_token": access_token,
-                },
-            )
-            
-            if resp.status_code != 200:
-                raise HTTPException(400, "Instagram media creation failed")
-            
-            container_id = resp.json()["id"]
-            
-            # Publish media
-            resp = await client.post(
-                f"https://graph.instagram.com/v18.0/me/media_publish",
-                params={
-                    "creation_id": container_id,
-                    "access_token": access_token,
-                },
-            )
-            
-            if resp.status_code != 200:
-                raise HTTPException(400, "Instagram publish failed")
-            
-            media_id = resp.json()["id"]
-            
-            return {
-                "success": True,
-                "media_id": media_id,
-            }
+        if resp.status_code != 200:
+            raise HTTPException(400, "Instagram media creation failed")
+        
+        container_id = resp.json()["id"]
+        
+        # Publish media
+        resp = await client.post(
+            f"https://graph.instagram.com/v18.0/me/media_publish",
+            params={
+                "creation_id": container_id,
+                "access_token": access_token,
+            },
+        )
+        
+        if resp.status_code != 200:
+            raise HTTPException(400, "Instagram publish failed")
+        
+        media_id = resp.json()["id"]
+        
+        return {
+            "success": True,
+            "media_id": media_id,
+        }
     
     except Exception as e:
         sentry_sdk.capture_exception(e)
@@ -3,8 +3,12 @@ GPU Control API - Fixed with correct RunPod GraphQL API
 """
 
 from fastapi import APIRouter, HTTPException
-import httpx
+from typing import Dict, Optional, Tuple
+import asyncio
 import os
+import time
+
+from utils.http_client import get_client
 
 router = APIRouter()
 
@@ -12,29 +16,38 @@ RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY")
 RUNPOD_ENDPOINT_ID = os.getenv("RUNPOD_ENDPOINT_ID")
 RUNPOD_GRAPHQL_URL = "https://api.runpod.io/graphql"
 
+# Endpoint metadata cache: the UI polls /gpu/status, and the only query RunPod offers
+# lists every endpoint on the account, so one fetch refreshes all entries.
+ENDPOINT_CACHE_TTL = float(os.getenv("ENDPOINT_CACHE_TTL", "30"))
+_endpoint_cache: Dict[str, Tuple[float, dict]] = {}  # endpoint_id -> (fetched_at, endpoint)
+_endpoint_refresh: Optional[Tuple[int, asyncio.Task]] = None  # (generation, in-flight fetch)
+# Bumped by every mutation: a fetch that started before it may return pre-mutation values,
+# so its result must not repopulate the cache or be shared with later callers
+_cache_generation = 0
+
 async def gql(query: str, variables: dict = None):
     """Execute GraphQL query with proper error logging"""
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.post(
-            RUNPOD_GRAPHQL_URL,
-            headers={
-                "Authorization": f"Bearer {RUNPOD_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={"query": query, "variables": variables or {}}
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(500, f"RunPod API error {response.status_code}: {response.text}")
-        
-        data = response.json()
-        if "errors" in data:
-            raise HTTPException(500, f"RunPod GraphQL errors: {data['errors']}")
-        
-        return data["data"]
+    response = await get_client("runpod_graphql").post(
+        RUNPOD_GRAPHQL_URL,
+        headers={
+            "Authorization": f"Bearer {RUNPOD_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        json={"query": query, "variables": variables or {}}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(500, f"RunPod API error {response.status_code}: {response.text}")
+    
+    data = response.json()
+    if "errors" in data:
+        raise HTTPException(500, f"RunPod GraphQL errors: {data['errors']}")
+    
+    return data["data"]
 
-async def get_endpoint(endpoint_id: str):
-    """Fetch endpoint with all required fields"""
+async def fetch_endpoints() -> Dict[str, dict]:
+    """Fetch all endpoints with the fields saveEndpoint requires, and refresh the cache (unless a mutation happened meanwhile)"""
+    generation = _cache_generation
     query = """
     query {
       myself {
@@ -51,17 +64,46 @@ async def get_endpoint(endpoint_id: str):
     """
     
     data = await gql(query)
-    endpoints = data["myself"]["endpoints"]
-    ep = next((e for e in endpoints if e["id"] == endpoint_id), None)
+    now = time.monotonic()
+    endpoints = {e["id"]: e for e in data["myself"]["endpoints"]}
+    if generation != _cache_generation:
+        return endpoints
     
+    _endpoint_cache.clear()
+    for ep_id, ep in endpoints.items():
+        _endpoint_cache[ep_id] = (now, ep)
+    return endpoints
+
+async def get_endpoint(endpoint_id: str, refresh: bool = False):
+    """Get endpoint metadata from the TTL cache, refreshing at most once for concurrent callers"""
+    global _endpoint_refresh
+    
+    cached = _endpoint_cache.get(endpoint_id)
+    if cached and not refresh and time.monotonic() - cached[0] < ENDPOINT_CACHE_TTL:
+        return dict(cached[1])
+    
+    # Single-flight: everyone who misses while a fetch is in progress awaits the same task
+    # A fetch started before the last mutation is not joined
+    if _endpoint_refresh is None or _endpoint_refresh[1].done() or _endpoint_refresh[0] != _cache_generation:
+        _endpoint_refresh = (_cache_generation, asyncio.create_task(fetch_endpoints()))
+    endpoints = await asyncio.shield(_endpoint_refresh[1])
+    
+    ep = endpoints.get(endpoint_id)
     if not ep:
         raise HTTPException(404, f"Endpoint not found: {endpoint_id}")
     
-    return ep
+    return dict(ep)
+
+def invalidate_endpoint(endpoint_id: str):
+    """Drop a cached endpoint so the next read goes to RunPod, and orphan any fetch already in flight"""
+    global _cache_generation
+    _cache_generation += 1
+    _endpoint_cache.pop(endpoint_id, None)
 
 async def set_workers_min(endpoint_id: str, workers_min: int):
     """Update workers using saveEndpoint with all required fields"""
-    ep = await get_endpoint(endpoint_id)
+    # saveEndpoint overwrites every field it is given, so build it from current metadata, not the cache
+    ep = await get_endpoint(endpoint_id, refresh=True)
     
     mutation = """
     mutation($input: SaveEndpointInput!) {
@@ -84,7 +126,10 @@ async def set_workers_min(endpoint_id: str, workers_min: int):
         }
     }
     
-    return await gql(mutation, variables)
+    try:
+        return await gql(mutation, variables)
+    finally:
+        invalidate_endpoint(endpoint_id)
 
 @router.post("/gpu/off")
 async def gpu_off():
@@ -109,9 +154,9 @@ async def gpu_on():
     }
 
 @router.get("/gpu/status")
-async def gpu_status():
-    """Get current GPU status"""
-    ep = await get_endpoint(RUNPOD_ENDPOINT_ID)
+async def gpu_status(refresh: bool = False):
+    """Get current GPU status (cached for ENDPOINT_CACHE_TTL seconds unless refresh=true)"""
+    ep = await get_endpoint(RUNPOD_ENDPOINT_ID, refresh=refresh)
     return {
         "status": "on" if ep["workersMin"] > 0 else "off",
         "workers_min": ep["workersMin"],
@@ -90,62 +90,68 @@ async def process_runpod_job(job_id: str, endpoint: str, params: dict):
             update_job(job_id, status="FAILED", error_code="config_error", error_message="RunPod not configured")
             return
         
-        async with httpx.AsyncClient(timeout=300) as client:
-            resp = await client.post(
-                f"{endpoint}/run",
-                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
-                json={"input": params}
-            )
+        client = get_client("runpod")
+        resp = await client.post(
+            f"{endpoint}/run",
+            headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
+            json={"input": params}
+        )
+        
+        if resp.status_code != 200:
+            update_job(job_id, status="FAILED", error_code="runpod_submit_error", error_message=f"RunPod returned {resp.status_code}")
+            return
+        
+        runpod_data = resp.json()
+        runpod_job_id = runpod_data.get("id")
+        
+        if not runpod_job_id:
+            update_job(job_id, status="FAILED", error_code="runpod_invalid_response", error_message="No job ID returned")
+            return
+        
+        update_job(job_id, runpod_job_id=runpod_job_id, progress=10, heartbeat=True)
+        submitted_at = time.monotonic()
+        cold_start_recorded = False
+        
+        # Poll for completion
+        while True:
+            if get_job_status(job_id) == "CANCELED":
+                break
             
-            if resp.status_code != 200:
-                update_job(job_id, status="FAILED", error_code="runpod_submit_error", error_message=f"RunPod returned {resp.status_code}")
-                return
+            status_resp = await client.get(
+                f"{endpoint}/status/{runpod_job_id}",
+                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"}
+            )
+            status_data = status_resp.json()
             
-            runpod_data = resp.json()
-            runpod_job_id = runpod_data.get("id")
+            runpod_status = status_data.get("status")
+            progress = status_data.get("progress", 10)
             
-            if not runpod_job_id:
-                update_job(job_id, status="FAILED", error_code="runpod_invalid_response", error_message="No job ID returned")
-                return
+            if not cold_start_recorded and runpod_status not in ("IN_QUEUE", None):
+                merge_job_meta(job_id, {"cold_start": cold_start_sample(endpoint, submitted_at, time.monotonic(), status_data)})
+                cold_start_recorded = True
             
-            update_job(job_id, runpod_job_id=runpod_job_id, progress=10, heartbeat=True)
+            update_job(job_id, progress=min(progress, 95), heartbeat=True)
             
-            # Poll for completion
-            while True:
+            if runpod_status == "COMPLETED":
                 if get_job_status(job_id) == "CANCELED":
                     break
                 
-                status_resp = await client.get(
-                    f"{endpoint}/status/{runpod_job_id}",
-                    headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"}
-                )
-                status_data = status_resp.json()
-                
-                runpod_status = status_data.get("status")
-                progress = status_data.get("progress", 10)
-                
-                update_job(job_id, progress=min(progress, 95), heartbeat=True)
-                
-                if runpod_status == "COMPLETED":
-                    if get_job_status(job_id) == "CANCELED":
-                        break
-                    
-                    output = status_data.get("output", {})
-                    output_url = output.get("output_url")
-                    
-                    if output_url:
-                        update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[output_url], heartbeat=True)
-                    else:
-                        update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[], heartbeat=True)
-                    break
-                    
-                elif runpod_status in ["FAILED", "CANCELLED"]:
-                    error_msg = status_data.get("error", "RunPod job failed")
-                    update_job(job_id, status="FAILED", error_code="runpod_execution_error", error_message=error_msg)
-                    break
+                output = status_data.get("output", {})
+                output_url = output.get("output_url")
                 
-                await asyncio.sleep(2)
+                if output_url:
+                    update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[output_url], heartbeat=True)
+                else:
+                    update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[], heartbeat=True)
+                break
                 
+            elif runpod_status in ["FAILED", "CANCELLED"]:
+                error_msg = status_data.get("error", "RunPod job failed")
+                update_job(job_id, status="FAILED", error_code="runpod_execution_error", error_message=error_msg)
+                break
+            
+            await asyncio.sleep(2)
+            
     except Exception as e:
         logger.exception(f"Job {job_id} failed")
         update_job(job_id, status="FAILED", error_code="internal_error", error_message=str(e))
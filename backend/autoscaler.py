@@ -0,0 +1,215 @@
+"""
+Queue-depth driven GPU autoscaler
+Watches QUEUED/RUNNING jobs per type and drives workersMin through api_gpu_control.set_workers_min
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from fastapi import APIRouter
+
+from api_gpu_control import RUNPOD_ENDPOINT_ID, get_endpoint, set_workers_min
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+AUTOSCALE_ENABLED = os.getenv("AUTOSCALE_ENABLED", "false").lower() == "true"
+AUTOSCALE_INTERVAL = int(os.getenv("AUTOSCALE_INTERVAL", "15"))  # seconds between evaluations
+AUTOSCALE_IDLE_WINDOW = int(os.getenv("AUTOSCALE_IDLE_WINDOW", "300"))  # demand must stay low this long before scaling down
+AUTOSCALE_COOLDOWN = int(os.getenv("AUTOSCALE_COOLDOWN", "60"))  # min seconds between scale-ups of a warm endpoint
+AUTOSCALE_MAX_WORKERS = int(os.getenv("AUTOSCALE_MAX_WORKERS", "3"))
+AUTOSCALE_JOBS_PER_WORKER = int(os.getenv("AUTOSCALE_JOBS_PER_WORKER", "2"))
+AUTOSCALE_RATE_WINDOW = int(os.getenv("AUTOSCALE_RATE_WINDOW", "600"))  # arrivals are counted over this window
+AUTOSCALE_LOOKAHEAD = int(os.getenv("AUTOSCALE_LOOKAHEAD", "120"))  # predicted arrivals within this horizon count as demand
+AUTOSCALE_RATE_ALPHA = 0.3  # EWMA smoothing for arrival rate
+# Live jobs touch updated_at on every poll; QUEUED/RUNNING rows untouched this long were orphaned (e.g. by a restart)
+AUTOSCALE_STALE_AFTER = int(os.getenv("AUTOSCALE_STALE_AFTER", "600"))
+
+# Job types that never touch a GPU endpoint
+CPU_JOB_TYPES = {"PIPELINE", "EXPORT"}
+
+# "VIDEO=abc123,TTS=def456"; "*" catches every other GPU job type
+AUTOSCALE_ENDPOINTS = os.getenv("AUTOSCALE_ENDPOINTS", "")
+
+# Per-endpoint scaler state and a rolling log of decisions for /gpu/autoscaler
+_state: Dict[str, dict] = {}
+_decisions: deque = deque(maxlen=100)
+
+
+def parse_endpoint_map(spec: str, default_endpoint_id: Optional[str]) -> Dict[str, str]:
+    """Parse AUTOSCALE_ENDPOINTS into {job_type: endpoint_id}"""
+    mapping = {}
+    for part in spec.split(","):
+        if "=" in part:
+            job_type, endpoint_id = part.split("=", 1)
+            mapping[job_type.strip().upper()] = endpoint_id.strip()
+    if "*" not in mapping and default_endpoint_id:
+        mapping["*"] = default_endpoint_id
+    return mapping
+
+
+def read_queue_depth(conn, since: datetime, active_since: datetime) -> Dict[str, dict]:
+    """
+    Per job type: {"queued": n, "running": n, "arrivals": n} (arrivals = jobs created since `since`).
+    Only QUEUED/RUNNING rows updated since `active_since` count, so an orphaned row can't keep a GPU warm.
+    """
+    depth: Dict[str, dict] = {}
+
+    rows = conn.execute(
+        "SELECT type, status, COUNT(*) FROM jobs WHERE status IN ('QUEUED', 'RUNNING') AND updated_at >= ? "
+        "GROUP BY type, status",
+        (active_since.isoformat(),)
+    ).fetchall()
+    for job_type, status, count in rows:
+        depth.setdefault(job_type, {"queued": 0, "running": 0, "arrivals": 0})[status.lower()] = count
+
+    rows = conn.execute(
+        "SELECT type, COUNT(*) FROM jobs WHERE created_at >= ? GROUP BY type", (since.isoformat(),)
+    ).fetchall()
+    for job_type, count in rows:
+        depth.setdefault(job_type, {"queued": 0, "running": 0, "arrivals": 0})["arrivals"] = count
+
+    return {t: d for t, d in depth.items() if t not in CPU_JOB_TYPES}
+
+
+def group_by_endpoint(depth: Dict[str, dict], endpoints: Dict[str, str]) -> Dict[str, dict]:
+    """Sum per-type depth into per-endpoint demand"""
+    grouped: Dict[str, dict] = {}
+    for job_type, d in depth.items():
+        endpoint_id = endpoints.get(job_type) or endpoints.get("*")
+        if not endpoint_id:
+            continue
+        g = grouped.setdefault(endpoint_id, {"queued": 0, "running": 0, "arrivals": 0, "types": {}})
+        for k in ("queued", "running", "arrivals"):
+            g[k] += d[k]
+        g["types"][job_type] = d
+    # Endpoints with no jobs at all still need evaluating so they can scale to zero
+    for endpoint_id in set(endpoints.values()):
+        grouped.setdefault(endpoint_id, {"queued": 0, "running": 0, "arrivals": 0, "types": {}})
+    return grouped
+
+
+def desired_workers(backlog: int, arrival_rate: float) -> int:
+    """Workers needed for the current backlog plus arrivals predicted over the lookahead horizon"""
+    predicted = arrival_rate * AUTOSCALE_LOOKAHEAD
+    # Less than one expected job within the horizon is not worth keeping a GPU warm for
+    demand = backlog + (predicted if predicted >= 1 else 0)
+    return max(0, min(AUTOSCALE_MAX_WORKERS, math.ceil(demand / AUTOSCALE_JOBS_PER_WORKER)))
+
+
+def decide(state: dict, current: int, desired: int, now: float) -> Optional[int]:
+    """
+    Hysteresis: scale up as soon as demand exceeds capacity (respecting a cooldown unless
+    we're cold), scale down only after demand has stayed below capacity for the idle window.
+    Returns the new workersMin, or None to leave it alone.
+    """
+    if desired > current:
+        state["low_since"] = None
+        if current == 0 or now - state.get("last_change", 0) >= AUTOSCALE_COOLDOWN:
+            return desired
+        return None
+
+    if desired < current:
+        if state.get("low_since") is None:
+            state["low_since"] = now
+        if now - state["low_since"] >= AUTOSCALE_IDLE_WINDOW:
+            state["low_since"] = None
+            return desired
+        return None
+
+    state["low_since"] = None
+    return None
+
+
+async def evaluate(get_conn: Callable, endpoints: Dict[str, str]):
+    """One autoscaler tick across all mapped endpoints"""
+    conn = get_conn()
+    try:
+        utcnow = datetime.utcnow()
+        depth = read_queue_depth(
+            conn, utcnow - timedelta(seconds=AUTOSCALE_RATE_WINDOW), utcnow - timedelta(seconds=AUTOSCALE_STALE_AFTER)
+        )
+    finally:
+        conn.close()
+
+    now = time.monotonic()
+    for endpoint_id, demand in group_by_endpoint(depth, endpoints).items():
+        state = _state.setdefault(endpoint_id, {"rate": 0.0, "low_since": None, "last_change": 0.0})
+
+        rate = demand["arrivals"] / AUTOSCALE_RATE_WINDOW
+        state["rate"] = AUTOSCALE_RATE_ALPHA * rate + (1 - AUTOSCALE_RATE_ALPHA) * state["rate"]
+
+        ep = await get_endpoint(endpoint_id)
+        current = ep["workersMin"]
+        backlog = demand["queued"] + demand["running"]
+        desired = desired_workers(backlog, state["rate"])
+        target = decide(state, current, desired, now)
+
+        metric = {
+            "ts": datetime.utcnow().isoformat(),
+            "endpoint_id": endpoint_id,
+            "queued": demand["queued"],
+            "running": demand["running"],
+            "arrival_rate_per_min": round(state["rate"] * 60, 3),
+            "current_workers_min": current,
+            "desired_workers_min": desired,
+            "action": "hold",
+            "types": demand["types"],
+        }
+
+        if target is not None and target != current:
+            await set_workers_min(endpoint_id, target)
+            state["last_change"] = now
+            metric["action"] = "scale_up" if target > current else "scale_down"
+            metric["new_workers_min"] = target
+            _decisions.append(metric)
+            logger.info(f"autoscale {json.dumps(metric)}")
+        else:
+            logger.debug(f"autoscale {json.dumps(metric)}")
+
+
+async def autoscaler_loop(get_conn: Callable):
+    """Background task started from app startup when AUTOSCALE_ENABLED=true"""
+    endpoints = parse_endpoint_map(AUTOSCALE_ENDPOINTS, RUNPOD_ENDPOINT_ID)
+    if not endpoints:
+        logger.warning("Autoscaler enabled but no endpoints configured (RUNPOD_ENDPOINT_ID / AUTOSCALE_ENDPOINTS)")
+        return
+
+    logger.info(f"Autoscaler started for {endpoints}")
+    while True:
+        try:
+            await evaluate(get_conn, endpoints)
+        except Exception:
+            logger.exception("Autoscaler tick failed")
+        await asyncio.sleep(AUTOSCALE_INTERVAL)
+
+
+@router.get("/gpu/autoscaler")
+async def autoscaler_status():
+    """Autoscaler config, per-endpoint state and recent scaling decisions"""
+    return {
+        "enabled": AUTOSCALE_ENABLED,
+        "endpoints": parse_endpoint_map(AUTOSCALE_ENDPOINTS, RUNPOD_ENDPOINT_ID),
+        "config": {
+            "interval_s": AUTOSCALE_INTERVAL,
+            "idle_window_s": AUTOSCALE_IDLE_WINDOW,
+            "cooldown_s": AUTOSCALE_COOLDOWN,
+            "max_workers": AUTOSCALE_MAX_WORKERS,
+            "jobs_per_worker": AUTOSCALE_JOBS_PER_WORKER,
+            "lookahead_s": AUTOSCALE_LOOKAHEAD,
+            "stale_after_s": AUTOSCALE_STALE_AFTER,
+        },
+        "state": {
+            endpoint_id: {"arrival_rate_per_min": round(s["rate"] * 60, 3), "scaling_down": s["low_since"] is not None}
+            for endpoint_id, s in _state.items()
+        },
+        "recent_decisions": list(_decisions),
+    }
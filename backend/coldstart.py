@@ -0,0 +1,143 @@
+"""
+Cold-start measurement and predictive pre-warming
+Latency samples live in jobs.meta["cold_start"]; pre-warm pings a RunPod endpoint with a no-op job
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from utils.http_client import get_client
+
+logger = logging.getLogger(__name__)
+
+RUNPOD_ENDPOINT = os.getenv("RUNPOD_ENDPOINT")
+RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY")
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() == "true"
+PREWARM_COOLDOWN = int(os.getenv("PREWARM_COOLDOWN", "120"))  # seconds between pings per endpoint
+
+# Job types whose worker endpoint is configured under a different name
+JOB_TYPE_ENDPOINT_ALIASES = {"RENDER": "VIDEO"}
+
+_last_prewarm: Dict[str, float] = {}  # endpoint -> last successful ping (failures don't start the cooldown)
+_prewarm_inflight: Set[str] = set()
+_background: Set[asyncio.Task] = set()
+
+
+def endpoint_for_job_type(job_type: str) -> Optional[str]:
+    """RUNPOD_<TYPE>_ENDPOINT if set (see api_workers.py), else the shared RUNPOD_ENDPOINT"""
+    job_type = JOB_TYPE_ENDPOINT_ALIASES.get(job_type.upper(), job_type.upper())
+    return os.getenv(f"RUNPOD_{job_type}_ENDPOINT") or RUNPOD_ENDPOINT
+
+
+def endpoint_id(endpoint_url: str) -> str:
+    """https://api.runpod.ai/v2/<id> -> <id>"""
+    return endpoint_url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def cold_start_sample(endpoint_url: str, submitted_at: float, first_progress_at: float, status_data: dict) -> dict:
+    """Build the jobs.meta["cold_start"] record for one job"""
+    sample = {
+        "endpoint": endpoint_id(endpoint_url),
+        "latency_s": round(first_progress_at - submitted_at, 3),
+        "measured_at": datetime.utcnow().isoformat(),
+    }
+    # RunPod reports its own queue + boot delay in ms
+    if "delayTime" in status_data:
+        sample["runpod_delay_s"] = round(status_data["delayTime"] / 1000, 3)
+    return sample
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def cold_start_stats(conn, since: datetime) -> Dict[str, dict]:
+    """Per-endpoint submit -> first-progress latency percentiles for jobs created since `since`"""
+    rows = conn.execute(
+        """
+        SELECT json_extract(meta, '$.cold_start.endpoint'), json_extract(meta, '$.cold_start.latency_s')
+        FROM jobs
+        WHERE json_extract(meta, '$.cold_start.latency_s') IS NOT NULL
+        AND created_at >= ?
+        """,
+        (since.isoformat(),)
+    ).fetchall()
+
+    by_endpoint: Dict[str, List[float]] = {}
+    for ep, latency in rows:
+        by_endpoint.setdefault(ep, []).append(float(latency))
+
+    return {
+        ep: {
+            "count": len(samples),
+            "p50_s": round(percentile(samples, 50), 3),
+            "p90_s": round(percentile(samples, 90), 3),
+            "p99_s": round(percentile(samples, 99), 3),
+            "max_s": round(max(samples), 3),
+        }
+        for ep, samples in by_endpoint.items()
+    }
+
+
+async def prewarm(job_type: str, reason: str) -> dict:
+    """Start a worker on the endpoint for job_type unless one is already up or we pinged recently"""
+    endpoint = endpoint_for_job_type(job_type)
+    if not PREWARM_ENABLED or not endpoint or not RUNPOD_API_KEY:
+        return {"prewarmed": False, "reason": "disabled or RunPod not configured"}
+
+    ep_id = endpoint_id(endpoint)
+    if time.monotonic() - _last_prewarm.get(ep_id, -PREWARM_COOLDOWN) < PREWARM_COOLDOWN:
+        return {"prewarmed": False, "endpoint": ep_id, "reason": "cooldown"}
+    if ep_id in _prewarm_inflight:
+        return {"prewarmed": False, "endpoint": ep_id, "reason": "in progress"}
+    _prewarm_inflight.add(ep_id)
+    try:
+        return await _prewarm(endpoint, ep_id, job_type, reason)
+    finally:
+        _prewarm_inflight.discard(ep_id)
+
+
+async def _prewarm(endpoint: str, ep_id: str, job_type: str, reason: str) -> dict:
+    client = get_client("runpod")
+    headers = {"Authorization": f"Bearer {RUNPOD_API_KEY}"}
+
+    try:
+        health = (await client.get(f"{endpoint}/health", headers=headers, timeout=10)).json()
+        workers = health.get("workers", {})
+        if workers.get("idle", 0) + workers.get("running", 0) > 0:
+            _last_prewarm[ep_id] = time.monotonic()
+            return {"prewarmed": False, "endpoint": ep_id, "reason": "workers already up"}
+    except Exception as e:
+        logger.warning(f"Pre-warm health check failed for {ep_id}: {e}")
+
+    try:
+        resp = await client.post(
+            f"{endpoint}/run",
+            headers=headers,
+            json={"input": {"warmup": True, "job_type": job_type}},
+            timeout=10
+        )
+        resp.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Pre-warm failed for {ep_id}: {e}")
+        return {"prewarmed": False, "endpoint": ep_id, "reason": str(e)}
+
+    _last_prewarm[ep_id] = time.monotonic()
+    logger.info(f"Pre-warming {ep_id} for {job_type} ({reason})")
+    return {"prewarmed": True, "endpoint": ep_id}
+
+
+def prewarm_in_background(job_type: str, reason: str):
+    """Fire-and-forget prewarm so it overlaps with the request that triggered it"""
+    task = asyncio.create_task(prewarm(job_type, reason))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
@@ -1,16 +1,16 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, model_validator
+from typing import Callable, Optional, List
 import sqlite3
 import uuid
 import json
 from datetime import datetime, timedelta
-import httpx
 import os
 import asyncio
 import logging
 import sys
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -22,6 +22,8 @@ print(f"RUNPOD_API_KEY: {'SET' if os.getenv('RUNPOD_API_KEY') else 'NOT SET'}")
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Modules shared with the GPU workers (frame-rate upsampling filters)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "workers", "common"))
 
 try:
     from utils.gemini_helper import enhance_prompt, generate_script, improve_prompt_for_style
@@ -45,6 +47,19 @@ except ImportError:
     HAS_GPU_CONTROL = False
     print("GPU control not available")
 
+# Import autoscaler (drives GPU control from queue depth)
+try:
+    from autoscaler import router as autoscaler_router, autoscaler_loop, AUTOSCALE_ENABLED
+    HAS_AUTOSCALER = True
+except ImportError:
+    HAS_AUTOSCALER = False
+    print("GPU autoscaler not available")
+
+from utils.http_client import get_client, init_clients, close_clients
+from pipeline import StageFailed, build_script_dag, run_dag, stage_summary
+from coldstart import cold_start_sample, cold_start_stats, endpoint_for_job_type, prewarm, prewarm_in_background
+from interpolation import validate_interpolation
+
 # Configure logging (no secrets)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -69,6 +84,9 @@ if HAS_GPU_CONTROL:
     app.include_router(gpu_router)
     print("GPU control routes loaded (/gpu/on, /gpu/off)")
 
+if HAS_AUTOSCALER:
+    app.include_router(autoscaler_router)
+
 DB_PATH = os.getenv("DB_PATH", "./jobs.db")
 RUNPOD_ENDPOINT = os.getenv("RUNPOD_ENDPOINT")
 RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY")
@@ -77,6 +95,7 @@ S3_BUCKET = os.getenv("S3_BUCKET")
 # HARDENING: Configurable timeouts
 JOB_HEARTBEAT_TIMEOUT = int(os.getenv("JOB_HEARTBEAT_TIMEOUT", "600"))  # 10 minutes default
 COLD_START_THRESHOLD = int(os.getenv("COLD_START_THRESHOLD", "15"))  # 15 seconds
+STITCH_HEARTBEAT_INTERVAL = 30  # seconds between heartbeats while ffmpeg stitches
 DB_RETRY_ATTEMPTS = 3
 DB_RETRY_DELAY = 0.1  # 100ms
 
@@ -105,9 +124,14 @@ def init_db():
             finished_at TEXT,
             status_message TEXT,
             error_code TEXT,
-            error_message TEXT
+            error_message TEXT,
+            meta TEXT
         )
     """)
+    # Older databases predate the meta column (see migrate.py)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)").fetchall()}
+    if "meta" not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN meta TEXT")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON jobs(status)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_created ON jobs(created_at DESC)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_heartbeat ON jobs(last_heartbeat_at) WHERE status = 'RUNNING'")
@@ -133,7 +157,22 @@ class JobCreate(BaseModel):
     type: str
     params: dict
 
-class TimelineStitch(BaseModel):
+class TTSCreate(BaseModel):
+    text: str
+    format: Optional[str] = None  # opus/aac/mp3/wav; the worker defaults to opus and validates both
+    bitrate: Optional[str] = None  # e.g. "48k"
+
+class UpsampleOptions(BaseModel):
+    target_fps: Optional[int] = None  # e.g. 24/30: interpolate on CPU while stitching
+    interpolation: str = "mci"  # "mci" (motion interpolation) or "blend"
+
+    @model_validator(mode="after")
+    def check_upsampling(self):
+        # Reject bad values with a 422 here rather than failing the stitch after the GPU work is done
+        validate_interpolation(self.target_fps, self.interpolation)
+        return self
+
+class TimelineStitch(UpsampleOptions):
     clips: List[dict]
     captions: Optional[List[dict]] = []
 
@@ -145,6 +184,10 @@ class ScriptGenerate(BaseModel):
     topic: str
     duration: Optional[int] = 60
 
+class PipelineCreate(UpsampleOptions):
+    scenes: List[dict]
+    captions: Optional[List[dict]] = []
+
 @app.get("/health")
 def health():
     return {"status": "ok", "runpod_connected": bool(RUNPOD_ENDPOINT)}
@@ -165,6 +208,11 @@ async def create_job(job: JobCreate, bg: BackgroundTasks):
     
     return {"job_id": job_id, "status": "QUEUED", "created_at": now}
 
+@app.post("/jobs/tts")
+async def create_tts_job(data: TTSCreate, bg: BackgroundTasks):
+    """Voice audio from the TTS worker, in the requested format/bitrate"""
+    return await create_job(JobCreate(type="TTS", params=data.model_dump(exclude_none=True)), bg)
+
 @app.get("/jobs/{job_id}")
 def get_job(job_id: str):
     conn = get_db_connection()
@@ -193,7 +241,8 @@ def get_job(job_id: str):
         "created_at": row[7],
         "updated_at": row[8],
         "started_at": row[10],
-        "finished_at": row[11]
+        "finished_at": row[11],
+        "meta": json.loads(row[15]) if len(row) > 15 and row[15] else None
     }
 
 @app.get("/jobs")
@@ -214,7 +263,7 @@ def list_jobs(limit: int = 50):
     } for row in rows]
 
 @app.post("/jobs/{job_id}/cancel")
-def cancel_job(job_id: str):
+async def cancel_job(job_id: str, bg: BackgroundTasks):
     """TASK 2: Hard cancel semantics - idempotent, immediate, prevents output"""
     conn = get_db_connection()
     
@@ -237,16 +286,42 @@ def cancel_job(job_id: str):
         "UPDATE jobs SET status = 'CANCELED', updated_at = ?, error_code = 'user_canceled', error_message = 'Job canceled by user' WHERE job_id = ?",
         (now, job_id)
     )
+    # RunPod jobs to stop: this one plus any running pipeline children
+    runpod_jobs = conn.execute(
+        "SELECT runpod_job_id, type FROM jobs WHERE (job_id = ? OR json_extract(params, '$.pipeline_job_id') = ?) "
+        "AND runpod_job_id IS NOT NULL AND status IN ('QUEUED', 'RUNNING', 'CANCELED')",
+        (job_id, job_id)
+    ).fetchall()
+    # Pipeline children share the parent's fate
+    conn.execute(
+        "UPDATE jobs SET status = 'CANCELED', updated_at = ?, finished_at = ?, error_code = 'user_canceled', error_message = 'Parent pipeline canceled' "
+        "WHERE json_extract(params, '$.pipeline_job_id') = ? AND status IN ('QUEUED', 'RUNNING')",
+        (now, now, job_id)
+    )
     conn.commit()
     conn.close()
     
     logger.info(f"Job {job_id} canceled by user")
     
-    # NOTE: RunPod cancellation is best-effort. Worker checks job status before uploading.
-    # If worker returns results after cancel, process_job will discard them.
+    # RunPod cancellation is best-effort: the worker polls its job status from the diffusion step
+    # callback and stops within a step. If results still arrive, process_job discards them.
+    for runpod_job_id, job_type in runpod_jobs:
+        bg.add_task(cancel_runpod_job, runpod_job_id, job_type)
     
     return {"status": "CANCELED", "message": "Job canceled successfully"}
 
+async def cancel_runpod_job(runpod_job_id: str, job_type: str):
+    """Ask RunPod to cancel a submitted job on the endpoint it was sent to"""
+    try:
+        resp = await get_client("runpod").post(
+            f"{endpoint_for_job_type(job_type)}/cancel/{runpod_job_id}",
+            headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
+            timeout=10
+        )
+        resp.raise_for_status()
+    except Exception as e:
+        logger.warning(f"RunPod cancel failed for {runpod_job_id}: {e}")
+
 @app.post("/timeline/stitch")
 async def stitch_timeline(data: TimelineStitch, bg: BackgroundTasks):
     job_id = str(uuid.uuid4())
@@ -254,15 +329,37 @@ async def stitch_timeline(data: TimelineStitch, bg: BackgroundTasks):
     now = datetime.utcnow().isoformat()
     conn.execute(
         "INSERT INTO jobs (job_id, type, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
-        (job_id, "EXPORT", "QUEUED", json.dumps({"clips": data.clips, "captions": data.captions}), now, now)
+        (job_id, "EXPORT", "QUEUED", json.dumps({"clips": data.clips, "captions": data.captions, "target_fps": data.target_fps, "interpolation": data.interpolation}), now, now)
     )
     conn.commit()
     conn.close()
     
-    bg.add_task(process_stitch_job, job_id, data.clips, data.captions)
+    bg.add_task(process_stitch_job, job_id, data.clips, data.captions, data.target_fps, data.interpolation)
     
     return {"job_id": job_id, "status": "QUEUED"}
 
+@app.post("/jobs/pipeline")
+async def create_pipeline_job(data: PipelineCreate, bg: BackgroundTasks):
+    """Script-to-video: TTS and VIDEO for all scenes in parallel, LIPSYNC per scene, then one stitch"""
+    try:
+        dag = build_script_dag(data.scenes, data.captions, data.target_fps, data.interpolation)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    job_id = str(uuid.uuid4())
+    conn = get_db_connection()
+    now = datetime.utcnow().isoformat()
+    conn.execute(
+        "INSERT INTO jobs (job_id, type, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (job_id, "PIPELINE", "QUEUED", json.dumps({"scenes": data.scenes, "captions": data.captions}), now, now)
+    )
+    conn.commit()
+    conn.close()
+    
+    bg.add_task(process_pipeline_job, job_id, dag)
+    
+    return {"job_id": job_id, "status": "QUEUED", "type": "PIPELINE", "nodes": list(dag)}
+
 @app.post("/ai/enhance-prompt")
 async def enhance_user_prompt(data: PromptEnhance):
     """Enhance basic prompt using Gemini AI (optional paid API)"""
@@ -272,9 +369,26 @@ async def enhance_user_prompt(data: PromptEnhance):
 @app.post("/ai/generate-script")
 async def generate_video_script(data: ScriptGenerate):
     """Generate full video script with scenes using Gemini AI"""
+    # A video job usually follows a script; start the GPU booting while Gemini writes
+    prewarm_in_background("VIDEO", "generate-script")
     result = await generate_script(data.topic, data.duration)
     return result
 
+@app.post("/gpu/prewarm")
+async def prewarm_endpoint(job_type: str = "VIDEO"):
+    """Pre-warm the worker endpoint for a job type (called when a studio screen opens)"""
+    return await prewarm(job_type, "client")
+
+@app.get("/metrics/cold-start")
+def cold_start_metrics(hours: int = 24):
+    """Submit -> first-progress latency percentiles per RunPod endpoint"""
+    conn = get_db_connection()
+    try:
+        stats = cold_start_stats(conn, datetime.utcnow() - timedelta(hours=hours))
+    finally:
+        conn.close()
+    return {"window_hours": hours, "endpoints": stats}
+
 @app.post("/ai/style-prompt")
 async def style_prompt(prompt: str, style: str):
     """Adapt prompt to specific visual style using Gemini AI"""
@@ -326,106 +440,143 @@ async def delete_job(job_id: str):
         "artifacts_cleaned": len(deleted_files)
     }
 
-async def process_job(job_id: str, job_type: str, params: dict):
-    """Background task: submit to RunPod, poll, update DB with heartbeat enforcement"""
+async def process_job(job_id: str, job_type: str, params: dict, on_meta: Optional[Callable[[dict], None]] = None):
+    """
+    Background task: submit to RunPod, poll, update DB with heartbeat enforcement.
+    Worker-reported meta (e.g. an early preview_url) is merged into the job's meta and passed to on_meta.
+    """
+    def record_meta(patch: dict):
+        merge_job_meta(job_id, patch)
+        if on_meta:
+            on_meta(patch)
+    
     try:
         # TASK 1: Initialize heartbeat
         update_job(job_id, status="RUNNING", progress=5, heartbeat=True)
         
-        if not RUNPOD_ENDPOINT or not RUNPOD_API_KEY:
+        # Each job type has its own worker endpoint (RUNPOD_<TYPE>_ENDPOINT, falling back to RUNPOD_ENDPOINT)
+        endpoint = endpoint_for_job_type(job_type)
+        if not endpoint or not RUNPOD_API_KEY:
             update_job(job_id, status="FAILED", error_code="config_error", error_message="RunPod not configured")
             return
         
-        async with httpx.AsyncClient(timeout=300) as client:
-            resp = await client.post(
-                f"{RUNPOD_ENDPOINT}/run",
-                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
-                json={"input": {"job_type": job_type, **params}}
+        client = get_client("runpod")
+        resp = await client.post(
+            f"{endpoint}/run",
+            headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
+            json={"input": {"job_type": job_type, **params}}
+        )
+        
+        if resp.status_code != 200:
+            update_job(job_id, status="FAILED", error_code="runpod_submit_error", error_message=f"RunPod returned {resp.status_code}")
+            logger.error(f"RunPod submit failed for job {job_id}: {resp.status_code}")
+            return
+        
+        runpod_data = resp.json()
+        runpod_job_id = runpod_data.get("id")
+        
+        if not runpod_job_id:
+            update_job(job_id, status="FAILED", error_code="runpod_invalid_response", error_message="No job ID returned from RunPod")
+            return
+        
+        update_job(job_id, runpod_job_id=runpod_job_id, progress=10, heartbeat=True)
+        submitted_at = time.monotonic()
+        cold_start_recorded = False
+        preview_recorded = False
+        
+        while True:
+            # TASK 2: Check if job was canceled
+            job_status = get_job_status(job_id)
+            if job_status == "CANCELED":
+                logger.info(f"Job {job_id} was canceled, stopping polling")
+                break
+            
+            status_resp = await client.get(
+                f"{endpoint}/status/{runpod_job_id}",
+                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"}
             )
+            status_data = status_resp.json()
             
-            if resp.status_code != 200:
-                update_job(job_id, status="FAILED", error_code="runpod_submit_error", error_message=f"RunPod returned {resp.status_code}")
-                logger.error(f"RunPod submit failed for job {job_id}: {resp.status_code}")
-                return
+            runpod_status = status_data.get("status")
+            progress = status_data.get("progress", 10)
             
-            runpod_data = resp.json()
-            runpod_job_id = runpod_data.get("id")
+            # progress_update() shows up as the running job's output: a number, or a dict such as
+            # {"progress": n, "preview_url": ...} (TTS uploads its first sentence early)
+            partial = status_data.get("output")
+            if runpod_status == "IN_PROGRESS" and isinstance(partial, (int, float)):
+                progress = partial
+            elif runpod_status == "IN_PROGRESS" and isinstance(partial, dict):
+                progress = partial.get("progress", progress)
+                if partial.get("preview_url") and not preview_recorded:
+                    record_meta({"preview_url": partial["preview_url"]})
+                    preview_recorded = True
             
-            if not runpod_job_id:
-                update_job(job_id, status="FAILED", error_code="runpod_invalid_response", error_message="No job ID returned from RunPod")
-                return
+            # Cold start = time until a worker picks the job up
+            if not cold_start_recorded and runpod_status not in ("IN_QUEUE", None):
+                merge_job_meta(job_id, {"cold_start": cold_start_sample(endpoint, submitted_at, time.monotonic(), status_data)})
+                cold_start_recorded = True
             
-            update_job(job_id, runpod_job_id=runpod_job_id, progress=10, heartbeat=True)
+            # TASK 1: Update heartbeat on every progress update
+            update_job(job_id, progress=min(progress, 95), heartbeat=True)
             
-            while True:
-                # TASK 2: Check if job was canceled
-                job_status = get_job_status(job_id)
-                if job_status == "CANCELED":
-                    logger.info(f"Job {job_id} was canceled, stopping polling")
+            if runpod_status == "COMPLETED":
+                # TASK 2: Double-check not canceled before accepting output
+                if get_job_status(job_id) == "CANCELED":
+                    logger.info(f"Job {job_id} completed but was canceled, discarding output")
                     break
                 
-                status_resp = await client.get(
-                    f"{RUNPOD_ENDPOINT}/status/{runpod_job_id}",
-                    headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"}
-                )
-                status_data = status_resp.json()
-                
-                runpod_status = status_data.get("status")
-                progress = status_data.get("progress", 10)
-                
-                # TASK 1: Update heartbeat on every progress update
-                update_job(job_id, progress=min(progress, 95), heartbeat=True)
+                output = status_data.get("output") or {}
+                # Worker meta (timings, cache hits, format, ...) goes on the job, and on the pipeline stage via on_meta
+                if output.get("meta"):
+                    record_meta(output["meta"])
+                # Workers report their own failures as a completed run with ok: false
+                if output.get("ok") is False:
+                    error_msg = output.get("error_message") or "Worker reported a failure"
+                    update_job(job_id, status="FAILED", error_code=output.get("error_code") or "worker_error", error_message=error_msg)
+                    logger.error(f"Job {job_id} failed in the worker: {error_msg}")
+                    break
+                # Handle both old and new response formats
+                video_url = output.get("video_url") or output.get("audio_url") or output.get("output_url")
                 
-                if runpod_status == "COMPLETED":
-                    # TASK 2: Double-check not canceled before accepting output
-                    if get_job_status(job_id) == "CANCELED":
-                        logger.info(f"Job {job_id} completed but was canceled, discarding output")
-                        break
-                    
-                    output = status_data.get("output", {})
-                    # Handle both old and new response formats
-                    video_url = output.get("video_url") or output.get("audio_url") or output.get("output_url")
-                    
-                    if video_url:
-                        # PRODUCTION: Validate MP4 before marking success
-                        if HAS_EXTENDED_API and video_url.startswith(("http://", "https://")):
-                            try:
-                                import tempfile
-                                async with httpx.AsyncClient() as dl_client:
-                                    dl_resp = await dl_client.get(video_url, timeout=30)
-                                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-                                        tmp.write(dl_resp.content)
-                                        tmp_path = tmp.name
-                                if not validate_video(tmp_path):
-                                    logger.warning(f"Job {job_id} video validation failed")
-                                    update_job(job_id, status="FAILED", error_code="invalid_video", error_message="Video validation failed")
-                                    os.unlink(tmp_path)
-                                    break
+                if video_url:
+                    # PRODUCTION: Validate MP4 before marking success
+                    if HAS_EXTENDED_API and video_url.startswith(("http://", "https://")):
+                        try:
+                            import tempfile
+                            dl_resp = await get_client("downloads").get(video_url, timeout=30)
+                            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+                                tmp.write(dl_resp.content)
+                                tmp_path = tmp.name
+                            if not validate_video(tmp_path):
+                                logger.warning(f"Job {job_id} video validation failed")
+                                update_job(job_id, status="FAILED", error_code="invalid_video", error_message="Video validation failed")
                                 os.unlink(tmp_path)
-                            except Exception as e:
-                                logger.warning(f"Video validation skipped: {e}")
-                        
-                        update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[video_url], heartbeat=True)
-                    else:
-                        update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[], heartbeat=True)
-                    
-                    logger.info(f"Job {job_id} completed successfully")
-                    break
+                                break
+                            os.unlink(tmp_path)
+                        except Exception as e:
+                            logger.warning(f"Video validation skipped: {e}")
                     
-                elif runpod_status in ["FAILED", "CANCELLED"]:
-                    error_msg = status_data.get("error", "RunPod job failed")
-                    update_job(job_id, status="FAILED", error_code="runpod_execution_error", error_message=error_msg)
-                    logger.error(f"Job {job_id} failed: {error_msg}")
-                    break
+                    update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[video_url], heartbeat=True)
+                else:
+                    update_job(job_id, status="SUCCEEDED", progress=100, output_urls=[], heartbeat=True)
                 
-                await asyncio.sleep(2)
+                logger.info(f"Job {job_id} completed successfully")
+                break
                 
+            elif runpod_status in ["FAILED", "CANCELLED"]:
+                error_msg = status_data.get("error", "RunPod job failed")
+                update_job(job_id, status="FAILED", error_code="runpod_execution_error", error_message=error_msg)
+                logger.error(f"Job {job_id} failed: {error_msg}")
+                break
+            
+            await asyncio.sleep(2)
+            
     except Exception as e:
         # TASK 6: Structured error surfacing
         logger.exception(f"Job {job_id} failed with exception")
         update_job(job_id, status="FAILED", error_code="internal_error", error_message=str(e))
 
-async def process_stitch_job(job_id: str, clips: list, captions: list):
+async def process_stitch_job(job_id: str, clips: list, captions: list, target_fps: Optional[int] = None, interpolation: str = "mci"):
     """Background task for FFmpeg stitching with heartbeat"""
     try:
         try:
@@ -441,7 +592,13 @@ async def process_stitch_job(job_id: str, clips: list, captions: list):
             return
         
         output_path = f"/tmp/{job_id}.mp4"
-        stitch_timeline(clips, captions, output_path)
+        # ffmpeg (minterpolate especially) can run for minutes: keep it off the event loop and the heartbeat fresh
+        stitching = asyncio.create_task(asyncio.to_thread(
+            stitch_timeline, clips, captions, output_path, target_fps=target_fps, interpolation=interpolation
+        ))
+        while not (await asyncio.wait({stitching}, timeout=STITCH_HEARTBEAT_INTERVAL))[0]:
+            update_job(job_id, heartbeat=True)
+        stitching.result()
         
         update_job(job_id, status="RUNNING", progress=80, heartbeat=True)
         
@@ -460,6 +617,87 @@ async def process_stitch_job(job_id: str, clips: list, captions: list):
         logger.exception(f"Stitch job {job_id} failed")
         update_job(job_id, status="FAILED", error_code="ffmpeg_error", error_message=str(e))
 
+async def process_pipeline_job(job_id: str, dag: dict):
+    """Background task: run a pipeline DAG as one child job per node, recording per-stage timings"""
+    nodes = {node_id: {"type": node["type"], "deps": node["deps"]} for node_id, node in dag.items()}
+    timings = {}
+    started = datetime.utcnow()
+    
+    def on_node_done(node_id: str, timing: dict):
+        timings[node_id] = timing
+        progress = 5 + int(90 * len(timings) / len(dag))
+        update_job(job_id, progress=progress, heartbeat=True,
+                   status_message=f"{len(timings)}/{len(dag)} stages done",
+                   meta={"nodes": nodes, "timings": timings, "stages": stage_summary(timings)})
+    
+    async def run_node(node_id: str, node: dict, params: dict) -> list:
+        if get_job_status(job_id) == "CANCELED":
+            raise StageFailed("pipeline canceled")
+        
+        child_id = str(uuid.uuid4())
+        nodes[node_id]["job_id"] = child_id
+        conn = get_db_connection()
+        now = datetime.utcnow().isoformat()
+        conn.execute(
+            "INSERT INTO jobs (job_id, type, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (child_id, node["type"], "QUEUED", json.dumps({**params, "pipeline_job_id": job_id, "pipeline_node": node_id}), now, now)
+        )
+        conn.commit()
+        conn.close()
+        
+        def on_child_meta(patch: dict):
+            # Surface what the worker reports (e.g. the TTS preview_url) on the pipeline job while it runs
+            nodes[node_id].setdefault("meta", {}).update(patch)
+            update_job(job_id, meta={"nodes": nodes, "timings": timings, "stages": stage_summary(timings)})
+        
+        if node["type"] == "EXPORT":
+            await process_stitch_job(child_id, params["clips"], params["captions"], params.get("target_fps"), params.get("interpolation", "mci"))
+        else:
+            await process_job(child_id, node["type"], params, on_meta=on_child_meta)
+        
+        status, output_urls, error_message = get_job_result(child_id)
+        if status != "SUCCEEDED":
+            raise StageFailed(f"{node['type']} job {child_id} {status}: {error_message or 'no output'}")
+        return output_urls
+    
+    async def keep_alive():
+        # Children carry their own heartbeats; this only shows the orchestrator is alive
+        while True:
+            await asyncio.sleep(30)
+            update_job(job_id, heartbeat=True)
+    
+    update_job(job_id, status="RUNNING", progress=5, heartbeat=True, meta={"nodes": nodes, "timings": timings})
+    ticker = asyncio.create_task(keep_alive())
+    try:
+        result = await run_dag(dag, run_node, on_node_done)
+    except Exception as e:
+        logger.exception(f"Pipeline {job_id} failed with exception")
+        update_job(job_id, status="FAILED", error_code="internal_error", error_message=str(e))
+        return
+    finally:
+        ticker.cancel()
+    
+    meta = {
+        "nodes": nodes,
+        "timings": result["timings"],
+        "stages": stage_summary(result["timings"]),
+        "failed": result["failed"],
+        "total_s": round((datetime.utcnow() - started).total_seconds(), 3),
+    }
+    
+    if get_job_status(job_id) == "CANCELED":
+        update_job(job_id, meta=meta)
+        return
+    
+    if result["failed"]:
+        node_id, reason = next(iter(result["failed"].items()))
+        update_job(job_id, status="FAILED", meta=meta, heartbeat=True,
+                   error_code="pipeline_stage_failed", error_message=f"{node_id}: {reason}")
+        logger.error(f"Pipeline {job_id} failed: {result['failed']}")
+    else:
+        update_job(job_id, status="SUCCEEDED", progress=100, output_urls=result["outputs"]["export"], meta=meta, heartbeat=True)
+        logger.info(f"Pipeline {job_id} completed in {meta['total_s']}s")
+
 def update_job(job_id: str, heartbeat: bool = False, error_code: str = None, error_message: str = None, status_message: str = None, **kwargs):
     """Update job with retry logic and heartbeat support (TASK 1 & 3)"""
     conn = get_db_connection()
@@ -493,7 +731,7 @@ def update_job(job_id: str, heartbeat: bool = False, error_code: str = None, err
             values.append(datetime.utcnow().isoformat())
     
     for k, v in kwargs.items():
-        if k == "output_urls":
+        if k in ("output_urls", "meta"):
             v = json.dumps(v)
         fields.append(f"{k} = ?")
         values.append(v)
@@ -518,10 +756,36 @@ def get_job_status(job_id: str) -> str:
     conn.close()
     return row[0] if row else "UNKNOWN"
 
+def merge_job_meta(job_id: str, patch: dict):
+    """Merge keys into a job's meta JSON"""
+    conn = get_db_connection()
+    row = conn.execute("SELECT meta FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    conn.close()
+    meta = json.loads(row[0]) if row and row[0] else {}
+    meta.update(patch)
+    update_job(job_id, meta=meta)
+
+def get_job_result(job_id: str) -> tuple:
+    """Get (status, output_urls, error_message) for a job"""
+    conn = get_db_connection()
+    row = conn.execute("SELECT status, output_urls, error_message FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    conn.close()
+    if not row:
+        return "UNKNOWN", [], None
+    return row[0], json.loads(row[1]) if row[1] else [], row[2]
+
 @app.on_event("startup")
 async def startup_event():
     """TASK 1: Start heartbeat monitor on startup"""
+    init_clients()
     asyncio.create_task(heartbeat_monitor())
+    if HAS_AUTOSCALER and AUTOSCALE_ENABLED:
+        asyncio.create_task(autoscaler_loop(get_db_connection))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled HTTP connections"""
+    await close_clients()
 
 async def heartbeat_monitor():
     """TASK 1: Monitor jobs for timeout and mark as FAILED if no heartbeat"""
@@ -52,6 +52,11 @@ def migrate_database():
         conn.execute("ALTER TABLE jobs ADD COLUMN error_message TEXT")
         needs_migration = True
     
+    if "meta" not in columns:
+        print("Adding meta column...")
+        conn.execute("ALTER TABLE jobs ADD COLUMN meta TEXT")
+        needs_migration = True
+    
     # Migrate old error column if exists
     if "error" in columns and "error_message" in columns:
         print("Migrating old error column to error_message...")
@@ -0,0 +1,184 @@
+"""
+Script-to-video pipeline DAG
+Models each scene as TTS + VIDEO -> LIPSYNC, with a single EXPORT (stitch) at the end
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+class StageFailed(Exception):
+    """Raised by a stage runner (or on its behalf) when a node cannot produce output"""
+
+
+def build_script_dag(scenes: List[dict], captions: Optional[List[dict]] = None,
+                     target_fps: Optional[int] = None, interpolation: str = "mci") -> Dict[str, dict]:
+    """
+    Turn /ai/generate-script scenes into a DAG of job nodes.
+
+    scenes = [{"scene_number": 1, "duration": 10, "visual_prompt": "...", "narration": "..."}, ...]
+
+    Every node is {"type": JOB_TYPE, "deps": [node_id, ...], "params": {...}}.
+    TTS and VIDEO nodes have no deps so all scenes start in parallel; each LIPSYNC
+    waits only on its own scene; EXPORT waits on every scene's final clip.
+    target_fps/interpolation are passed to EXPORT to upsample the final video while stitching.
+    """
+    dag: Dict[str, dict] = {}
+    scene_outputs = []
+
+    for i, scene in enumerate(scenes):
+        n = scene.get("scene_number", i + 1)
+        prompt = scene.get("visual_prompt") or scene.get("prompt")
+        narration = scene.get("narration")
+        duration = int(scene.get("duration", 5))
+
+        if not prompt:
+            raise ValueError(f"Scene {n} is missing visual_prompt")
+
+        video_id = f"scene{n}.video"
+        dag[video_id] = {
+            "type": "VIDEO",
+            "deps": [],
+            "params": {"prompt": prompt, "duration": duration},
+        }
+
+        if narration and narration.strip():
+            tts_id = f"scene{n}.tts"
+            lipsync_id = f"scene{n}.lipsync"
+            dag[tts_id] = {"type": "TTS", "deps": [], "params": {"text": narration}}
+            dag[lipsync_id] = {
+                "type": "LIPSYNC",
+                "deps": [video_id, tts_id],
+                # face_url/audio_url are filled from dep outputs at run time
+                "params": {"face_from": video_id, "audio_from": tts_id},
+            }
+            scene_outputs.append((lipsync_id, duration))
+        else:
+            scene_outputs.append((video_id, duration))
+
+    if not scene_outputs:
+        raise ValueError("Pipeline needs at least one scene")
+
+    dag["export"] = {
+        "type": "EXPORT",
+        "deps": [node_id for node_id, _ in scene_outputs],
+        "params": {
+            "clips_from": [{"node": node_id, "duration": d} for node_id, d in scene_outputs],
+            "captions": captions or [],
+            "target_fps": target_fps,
+            "interpolation": interpolation,
+        },
+    }
+    return dag
+
+
+def resolve_params(node: dict, outputs: Dict[str, List[str]]) -> dict:
+    """Substitute *_from references in a node's params with its deps' output URLs"""
+    params = dict(node["params"])
+
+    if "face_from" in params:
+        params["face_url"] = outputs[params.pop("face_from")][0]
+    if "audio_from" in params:
+        params["audio_url"] = outputs[params.pop("audio_from")][0]
+    if "clips_from" in params:
+        clips = []
+        start = 0
+        for ref in params.pop("clips_from"):
+            clips.append({"url": outputs[ref["node"]][0], "start": start, "end": start + ref["duration"]})
+            start += ref["duration"]
+        params["clips"] = clips
+
+    return params
+
+
+async def run_dag(
+    dag: Dict[str, dict],
+    run_node: Callable[[str, dict, dict], Awaitable[List[str]]],
+    on_node_done: Optional[Callable[[str, dict], None]] = None,
+) -> dict:
+    """
+    Execute a DAG, starting each node as soon as all of its deps have produced output.
+
+    run_node(node_id, node, resolved_params) must return the node's output URLs or raise.
+    Returns {"outputs": {node_id: [urls]}, "timings": {node_id: {...}}, "failed": {node_id: error}}.
+    A failed node skips everything downstream of it; independent branches keep running.
+    """
+    outputs: Dict[str, List[str]] = {}
+    timings: Dict[str, dict] = {}
+    failed: Dict[str, str] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    for node_id, node in dag.items():
+        for dep in node["deps"]:
+            if dep not in dag:
+                raise ValueError(f"Node {node_id} depends on unknown node {dep}")
+
+    async def run_one(node_id: str):
+        node = dag[node_id]
+        deps = [tasks[d] for d in node["deps"]]
+        if deps:
+            await asyncio.gather(*deps, return_exceptions=True)
+
+        bad = [d for d in node["deps"] if d in failed]
+        if bad:
+            failed[node_id] = f"skipped: upstream {', '.join(bad)} failed"
+            return
+
+        started = time.monotonic()
+        timings[node_id] = {"type": node["type"], "started_at": datetime.utcnow().isoformat()}
+        try:
+            outputs[node_id] = await run_node(node_id, node, resolve_params(node, outputs))
+            if not outputs[node_id]:
+                raise StageFailed(f"{node_id} produced no output")
+        except Exception as e:
+            failed[node_id] = str(e)
+        finally:
+            timings[node_id]["finished_at"] = datetime.utcnow().isoformat()
+            timings[node_id]["duration_s"] = round(time.monotonic() - started, 3)
+            if on_node_done:
+                on_node_done(node_id, timings[node_id])
+
+    # Create tasks in an order where deps already exist when a node's task is built
+    for node_id in topological_order(dag):
+        tasks[node_id] = asyncio.create_task(run_one(node_id))
+
+    await asyncio.gather(*tasks.values())
+
+    return {"outputs": outputs, "timings": timings, "failed": failed}
+
+
+def topological_order(dag: Dict[str, dict]) -> List[str]:
+    """Kahn's algorithm; raises ValueError on cycles"""
+    remaining = {node_id: set(node["deps"]) for node_id, node in dag.items()}
+    order = []
+    while remaining:
+        ready = [node_id for node_id, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Pipeline DAG has a cycle among: {', '.join(remaining)}")
+        for node_id in ready:
+            order.append(node_id)
+            del remaining[node_id]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+
+def stage_summary(timings: Dict[str, dict]) -> Dict[str, dict]:
+    """Aggregate per-node timings into per-stage (job type) wall-clock spans"""
+    summary: Dict[str, dict] = {}
+    for t in timings.values():
+        if "finished_at" not in t:
+            continue
+        s = summary.setdefault(t["type"], {
+            "nodes": 0,
+            "first_started_at": t["started_at"],
+            "last_finished_at": t["finished_at"],
+            "busy_s": 0.0,
+        })
+        s["nodes"] += 1
+        s["first_started_at"] = min(s["first_started_at"], t["started_at"])
+        s["last_finished_at"] = max(s["last_finished_at"], t["finished_at"])
+        s["busy_s"] = round(s["busy_s"] + t["duration_s"], 3)
+    return summary
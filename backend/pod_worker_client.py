@@ -4,31 +4,37 @@ Replaces RunPod serverless calls with HTTP API calls to Pod worker
 """
 
 import os
-import httpx
 from typing import Optional
 
+from utils.http_client import get_client
+
 VIDEO_WORKER_BASE_URL = os.getenv("VIDEO_WORKER_BASE_URL", "http://localhost:8001")
 
-async def submit_video_job(prompt: str, duration: int = 5) -> dict:
-    """Submit video generation job to Pod worker"""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            f"{VIDEO_WORKER_BASE_URL}/generate",
-            json={"prompt": prompt, "duration": duration}
-        )
-        response.raise_for_status()
-        return response.json()
+async def submit_video_job(prompt: str, duration: int = 5, priority: int = 0,
+                           target_fps: Optional[int] = None, interpolation: str = "mci") -> dict:
+    """Submit video generation job to Pod worker (raises httpx.HTTPStatusError with Retry-After on 429 when its queue is full)"""
+    response = await get_client("pod_worker").post(
+        f"{VIDEO_WORKER_BASE_URL}/generate",
+        json={"prompt": prompt, "duration": duration, "priority": priority, "target_fps": target_fps, "interpolation": interpolation},
+        timeout=30.0
+    )
+    response.raise_for_status()
+    return response.json()
 
 async def get_job_status(job_id: str) -> dict:
     """Get job status from Pod worker"""
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(f"{VIDEO_WORKER_BASE_URL}/status/{job_id}")
-        response.raise_for_status()
-        return response.json()
+    response = await get_client("pod_worker").get(f"{VIDEO_WORKER_BASE_URL}/status/{job_id}", timeout=10.0)
+    response.raise_for_status()
+    return response.json()
 
 async def check_worker_health() -> dict:
-    """Check if Pod worker is healthy"""
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        response = await client.get(f"{VIDEO_WORKER_BASE_URL}/health")
-        response.raise_for_status()
-        return response.json()
+    """Check if Pod worker is healthy ("ready" is False while the model loads; jobs submitted then just queue)"""
+    response = await get_client("pod_worker").get(f"{VIDEO_WORKER_BASE_URL}/health", timeout=5.0)
+    response.raise_for_status()
+    return response.json()
+
+async def cancel_job(job_id: str) -> dict:
+    """Cancel a Pod worker job (queued jobs are dropped, running ones stop at the next diffusion step)"""
+    response = await get_client("pod_worker").post(f"{VIDEO_WORKER_BASE_URL}/cancel/{job_id}", timeout=10.0)
+    response.raise_for_status()
+    return response.json()
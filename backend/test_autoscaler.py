@@ -0,0 +1,74 @@
+"""
+Tests for the GPU autoscaler's demand estimate and scaling policy
+Run: cd backend && python -m pytest -q test_autoscaler.py
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import autoscaler  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def policy(monkeypatch):
+    monkeypatch.setattr(autoscaler, "AUTOSCALE_MAX_WORKERS", 3)
+    monkeypatch.setattr(autoscaler, "AUTOSCALE_JOBS_PER_WORKER", 2)
+    monkeypatch.setattr(autoscaler, "AUTOSCALE_LOOKAHEAD", 120)
+    monkeypatch.setattr(autoscaler, "AUTOSCALE_COOLDOWN", 60)
+    monkeypatch.setattr(autoscaler, "AUTOSCALE_IDLE_WINDOW", 300)
+
+
+def test_desired_workers_covers_backlog_and_predicted_arrivals():
+    assert autoscaler.desired_workers(0, 0.0) == 0
+    assert autoscaler.desired_workers(3, 0.0) == 2
+    assert autoscaler.desired_workers(0, 0.5 / 120) == 0  # under one expected job in the lookahead
+    assert autoscaler.desired_workers(1, 2 / 120) == 2  # 1 queued + 2 predicted
+    assert autoscaler.desired_workers(50, 0.0) == 3  # capped
+
+
+def test_cold_endpoint_scales_up_at_once_then_respects_the_cooldown():
+    state = {"low_since": None, "last_change": 1000.0}
+
+    assert autoscaler.decide(state, 0, 1, 1001.0) == 1  # cold: no cooldown
+    assert autoscaler.decide(state, 1, 2, 1030.0) is None  # warm, 30s after the last change
+    assert autoscaler.decide(state, 1, 2, 1060.0) == 2
+
+
+def test_scale_down_waits_for_the_idle_window():
+    state = {"low_since": None, "last_change": 0.0}
+
+    assert autoscaler.decide(state, 2, 0, 1000.0) is None
+    assert autoscaler.decide(state, 2, 0, 1299.0) is None
+    assert autoscaler.decide(state, 2, 0, 1300.0) == 0
+    assert state["low_since"] is None
+
+
+def test_demand_returning_resets_the_idle_window():
+    state = {"low_since": None, "last_change": 0.0}
+
+    autoscaler.decide(state, 2, 0, 1000.0)
+    assert autoscaler.decide(state, 2, 2, 1200.0) is None  # back at capacity: hold
+    assert autoscaler.decide(state, 2, 0, 1400.0) is None  # the window restarts here
+    assert autoscaler.decide(state, 2, 0, 1700.0) == 0
+
+
+def test_orphaned_rows_do_not_count_as_demand():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE jobs (job_id TEXT, type TEXT, status TEXT, created_at TEXT, updated_at TEXT)")
+    now = datetime.utcnow()
+    fresh, stale = now.isoformat(), (now - timedelta(hours=3)).isoformat()
+    conn.executemany("INSERT INTO jobs VALUES (?, ?, ?, ?, ?)", [
+        ("live", "VIDEO", "RUNNING", fresh, fresh),
+        ("queued", "VIDEO", "QUEUED", fresh, fresh),
+        ("orphan", "VIDEO", "QUEUED", stale, stale),
+        ("orphan-tts", "TTS", "RUNNING", stale, stale),
+        ("export", "EXPORT", "RUNNING", fresh, fresh),
+    ])
+
+    depth = autoscaler.read_queue_depth(conn, now - timedelta(minutes=10), now - timedelta(minutes=10))
+
+    assert depth == {"VIDEO": {"queued": 1, "running": 1, "arrivals": 2}}
@@ -0,0 +1,241 @@
+"""
+Tests for the script-to-video pipeline DAG
+Run: cd backend && python -m pytest -q test_pipeline.py
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from pipeline import build_script_dag, resolve_params, run_dag, topological_order
+
+SCENES = [
+    {"scene_number": 1, "duration": 4, "visual_prompt": "a beach", "narration": "Hello there."},
+    {"scene_number": 2, "duration": 6, "visual_prompt": "a forest", "narration": ""},
+]
+
+
+def test_dependencies_come_before_dependents():
+    dag = build_script_dag(SCENES)
+    order = topological_order(dag)
+
+    assert set(order) == {"scene1.video", "scene1.tts", "scene1.lipsync", "scene2.video", "export"}
+    for node_id, node in dag.items():
+        assert all(order.index(dep) < order.index(node_id) for dep in node["deps"])
+    assert dag["export"]["deps"] == ["scene1.lipsync", "scene2.video"]
+
+
+def test_cycles_and_missing_prompts_are_rejected():
+    with pytest.raises(ValueError):
+        topological_order({"a": {"deps": ["b"]}, "b": {"deps": ["a"]}})
+    with pytest.raises(ValueError):
+        build_script_dag([{"narration": "no prompt"}])
+
+
+def test_params_are_resolved_from_upstream_outputs():
+    dag = build_script_dag(SCENES, target_fps=30)
+    outputs = {
+        "scene1.video": ["v1.mp4"], "scene1.tts": ["a1.ogg"],
+        "scene1.lipsync": ["l1.mp4"], "scene2.video": ["v2.mp4"],
+    }
+
+    assert resolve_params(dag["scene1.lipsync"], outputs) == {"face_url": "v1.mp4", "audio_url": "a1.ogg"}
+    export = resolve_params(dag["export"], outputs)
+    assert export["clips"] == [
+        {"url": "l1.mp4", "start": 0, "end": 4},
+        {"url": "v2.mp4", "start": 4, "end": 10},
+    ]
+    assert export["target_fps"] == 30
+    assert "clips_from" in dag["export"]["params"]  # the DAG itself is not mutated
+
+
+def test_run_dag_runs_nodes_after_their_deps():
+    dag = build_script_dag(SCENES)
+    finished = []
+
+    async def run_node(node_id, node, params):
+        await asyncio.sleep(0.01 if node["type"] == "VIDEO" else 0)
+        assert all(dep in finished for dep in node["deps"])
+        finished.append(node_id)
+        return [f"{node_id}.out"]
+
+    result = asyncio.run(run_dag(dag, run_node))
+
+    assert result["failed"] == {}
+    assert set(result["outputs"]) == set(dag)
+    assert finished[-1] == "export"
+    assert set(result["timings"]) == set(dag)
+
+
+def test_failed_node_skips_dependents_but_not_independent_branches():
+    dag = build_script_dag(SCENES)
+    ran = []
+
+    async def run_node(node_id, node, params):
+        ran.append(node_id)
+        if node_id == "scene1.tts":
+            raise RuntimeError("TTS worker down")
+        return [f"{node_id}.out"]
+
+    result = asyncio.run(run_dag(dag, run_node))
+
+    assert result["failed"]["scene1.tts"] == "TTS worker down"
+    assert result["failed"]["scene1.lipsync"].startswith("skipped: upstream scene1.tts")
+    assert result["failed"]["export"].startswith("skipped: upstream scene1.lipsync")
+    assert "scene1.lipsync" not in ran and "export" not in ran
+    assert set(result["outputs"]) == {"scene1.video", "scene2.video"}
+
+
+def test_empty_output_counts_as_failure():
+    dag = {"a": {"type": "VIDEO", "deps": [], "params": {}}, "b": {"type": "EXPORT", "deps": ["a"], "params": {}}}
+
+    async def run_node(node_id, node, params):
+        return []
+
+    result = asyncio.run(run_dag(dag, run_node))
+
+    assert "produced no output" in result["failed"]["a"]
+    assert result["failed"]["b"].startswith("skipped")
+
+
+class FakeRunPod:
+    """Routes /run and /status by endpoint; each endpoint answers with its worker's output"""
+
+    def __init__(self, outputs):
+        self.outputs = outputs  # endpoint -> COMPLETED output
+        self.submitted = []  # (endpoint, input)
+        self.runs = {}
+
+    class Response:
+        def __init__(self, data):
+            self.status_code = 200
+            self.data = data
+
+        def json(self):
+            return self.data
+
+    async def post(self, url, headers=None, json=None, timeout=None):
+        endpoint = url.rsplit("/run", 1)[0]
+        run_id = f"rp{len(self.submitted)}"
+        self.submitted.append((endpoint, json["input"]))
+        self.runs[run_id] = endpoint
+        return self.Response({"id": run_id})
+
+    async def get(self, url, headers=None, timeout=None):
+        endpoint, run_id = url.rsplit("/status/", 1)
+        assert self.runs[run_id] == endpoint  # polled where it was submitted
+        return self.Response({"status": "COMPLETED", "output": self.outputs[endpoint]})
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """main with a throwaway jobs DB, per-type RunPod endpoints and a fake stitcher"""
+    pytest.importorskip("fastapi")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "jobs.db"))  # read when main is first imported
+    import coldstart
+    import main
+    from utils import ffmpeg_utils
+
+    monkeypatch.setattr(main, "DB_PATH", str(tmp_path / "jobs.db"))
+    main.init_db()
+    monkeypatch.setattr(main, "RUNPOD_API_KEY", "key")
+    monkeypatch.setattr(main, "HAS_EXTENDED_API", False)
+    monkeypatch.setattr(coldstart, "RUNPOD_ENDPOINT", "https://rp/video")
+    monkeypatch.setenv("RUNPOD_TTS_ENDPOINT", "https://rp/tts")
+    monkeypatch.setenv("RUNPOD_LIPSYNC_ENDPOINT", "https://rp/lipsync")
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(main.asyncio, "sleep", lambda s: real_sleep(min(s, 0.01)))
+
+    stitched = []
+
+    def stitch_timeline(clips, captions, output_path, target_fps=None, interpolation="mci"):
+        stitched.append(clips)
+        return output_path
+
+    monkeypatch.setattr(ffmpeg_utils, "stitch_timeline", stitch_timeline)
+    return main, stitched
+
+
+def run_pipeline(main, runpod, scenes):
+    conn = main.get_db_connection()
+    conn.execute("INSERT INTO jobs (job_id, type, status, params, created_at, updated_at) VALUES ('p1', 'PIPELINE', 'QUEUED', '{}', 'x', 'x')")
+    conn.commit()
+    conn.close()
+    asyncio.run(main.process_pipeline_job("p1", build_script_dag(scenes)))
+    return main.get_job("p1")
+
+
+def test_stages_go_to_their_own_endpoints_and_export_gets_the_lipsync_clip(backend, monkeypatch):
+    main, stitched = backend
+    runpod = FakeRunPod({
+        "https://rp/video": {"ok": True, "video_url": "https://cdn/v.mp4"},
+        "https://rp/tts": {"ok": True, "audio_url": "https://cdn/a.ogg"},
+        "https://rp/lipsync": {"ok": True, "output_url": "https://cdn/l.mp4"},
+    })
+    monkeypatch.setattr(main, "get_client", lambda name: runpod)
+
+    job = run_pipeline(main, runpod, SCENES)
+
+    assert job["status"] == "SUCCEEDED"
+    sent = {(endpoint, payload["job_type"]) for endpoint, payload in runpod.submitted}
+    assert sent == {("https://rp/video", "VIDEO"), ("https://rp/tts", "TTS"), ("https://rp/lipsync", "LIPSYNC")}
+    # Cold-start samples are keyed by the endpoint each stage actually ran on
+    cold_starts = {node["type"]: main.get_job(node["job_id"])["meta"]["cold_start"]["endpoint"]
+                   for node in job["meta"]["nodes"].values() if node["type"] != "EXPORT"}
+    assert cold_starts == {"VIDEO": "video", "TTS": "tts", "LIPSYNC": "lipsync"}
+    lipsync = next(payload for endpoint, payload in runpod.submitted if payload["job_type"] == "LIPSYNC")
+    assert (lipsync["face_url"], lipsync["audio_url"]) == ("https://cdn/v.mp4", "https://cdn/a.ogg")
+    assert [clip["url"] for clip in stitched[0]] == ["https://cdn/l.mp4", "https://cdn/v.mp4"]
+
+
+def test_worker_reported_failure_fails_the_stage(backend, monkeypatch):
+    main, stitched = backend
+    runpod = FakeRunPod({
+        "https://rp/video": {"ok": True, "video_url": "https://cdn/v.mp4"},
+        "https://rp/tts": {"ok": False, "error_code": "invalid_input", "error_message": "text is empty"},
+        "https://rp/lipsync": {"ok": True, "output_url": "https://cdn/l.mp4"},
+    })
+    monkeypatch.setattr(main, "get_client", lambda name: runpod)
+
+    job = run_pipeline(main, runpod, SCENES)
+
+    assert job["status"] == "FAILED"
+    tts = main.get_job(job["meta"]["nodes"]["scene1.tts"]["job_id"])
+    assert (tts["status"], tts["error"]) == ("FAILED", {"code": "invalid_input", "message": "text is empty"})
+    assert "text is empty" in job["meta"]["failed"]["scene1.tts"]
+    assert job["meta"]["failed"]["export"].startswith("skipped")
+    assert not stitched
+
+
+def test_stitching_runs_off_the_event_loop_and_keeps_the_heartbeat(backend, monkeypatch):
+    main, _ = backend
+    from utils import ffmpeg_utils
+
+    monkeypatch.setattr(main, "STITCH_HEARTBEAT_INTERVAL", 0.05)
+    heartbeats = []
+    real_update_job = main.update_job
+
+    def update_job(job_id, **kwargs):
+        if kwargs == {"heartbeat": True}:
+            heartbeats.append(job_id)
+        real_update_job(job_id, **kwargs)
+
+    monkeypatch.setattr(main, "update_job", update_job)
+    monkeypatch.setattr(ffmpeg_utils, "stitch_timeline", lambda *a, **kw: time.sleep(0.3))
+    conn = main.get_db_connection()
+    conn.execute("INSERT INTO jobs (job_id, type, status, params, created_at, updated_at) VALUES ('s1', 'EXPORT', 'QUEUED', '{}', 'x', 'x')")
+    conn.commit()
+    conn.close()
+
+    async def stitch_while_ticking():
+        ticks = 0
+        stitch = asyncio.create_task(main.process_stitch_job("s1", [], []))
+        while not stitch.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+
+    assert asyncio.run(stitch_while_ticking()) > 5  # the loop kept running during the 0.3s stitch
+    assert len(heartbeats) >= 2
+    assert main.get_job("s1")["status"] == "SUCCEEDED"
@@ -1,54 +1,113 @@
 import subprocess
 import os
+import shutil
+import tempfile
 
-def stitch_timeline(clips: list, captions: list, output_path: str):
+from interpolation import interpolation_filter  # workers/common, on sys.path via main.py
+
+def stitch_timeline(clips: list, captions: list, output_path: str, target_fps: int = None, interpolation: str = "mci"):
     """
     clips = [{"url": "s3://...", "start": 0, "end": 5}, ...]
     captions = [{"text": "Hello", "start": 0, "end": 2}, ...]
+    target_fps: optionally interpolate the stitched video up to this frame rate
     """
-    clip_files = []
-    
-    for i, clip in enumerate(clips):
-        local_path = f"/tmp/clip_{i}.mp4"
-        
-        if clip['url'].startswith('http'):
-            subprocess.run(["curl", "-o", local_path, clip['url']], check=True)
-        elif clip['url'].startswith('s3://'):
-            subprocess.run(["aws", "s3", "cp", clip['url'], local_path], check=True)
-        else:
-            local_path = clip['url'].replace('file://', '')
-        
-        clip_files.append(local_path)
-    
-    concat_file = "/tmp/concat.txt"
-    with open(concat_file, "w") as f:
-        for clip in clip_files:
-            f.write(f"file '{clip}'\n")
-    
-    temp_output = "/tmp/stitched_temp.mp4"
-    subprocess.run([
-        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_file,
-        "-c", "copy", temp_output
-    ], check=True)
-    
-    if captions:
-        subtitle_file = "/tmp/subs.srt"
-        with open(subtitle_file, "w") as f:
-            for i, cap in enumerate(captions, 1):
-                start = format_srt_time(cap['start'])
-                end = format_srt_time(cap['end'])
-                f.write(f"{i}\n{start} --> {end}\n{cap['text']}\n\n")
-        
+    filters = []
+    if target_fps:
+        filters.append(interpolation_filter(target_fps, interpolation))
+
+    # Per-stitch scratch dir so concurrent pipelines don't overwrite each other's clips
+    work_dir = tempfile.mkdtemp(prefix="stitch_")
+    try:
+        clip_files = []
+
+        for i, clip in enumerate(clips):
+            local_path = os.path.join(work_dir, f"clip_{i}.mp4")
+
+            if clip['url'].startswith('http'):
+                subprocess.run(["curl", "-o", local_path, clip['url']], check=True)
+            elif clip['url'].startswith('s3://'):
+                subprocess.run(["aws", "s3", "cp", clip['url'], local_path], check=True)
+            else:
+                local_path = clip['url'].replace('file://', '')
+
+            clip_files.append(local_path)
+
+        clip_files = add_missing_audio(clip_files, work_dir)
+
+        concat_file = os.path.join(work_dir, "concat.txt")
+        with open(concat_file, "w") as f:
+            for clip in clip_files:
+                f.write(f"file '{clip}'\n")
+
+        temp_output = os.path.join(work_dir, "stitched_temp.mp4")
         subprocess.run([
-            "ffmpeg", "-y", "-i", temp_output, 
-            "-vf", f"subtitles={subtitle_file}:force_style='FontSize=24,PrimaryColour=&HFFFFFF&'",
-            "-c:a", "copy", output_path
+            "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_file,
+            "-c", "copy", temp_output
         ], check=True)
-    else:
-        os.rename(temp_output, output_path)
-    
+
+        if captions:
+            subtitle_file = os.path.join(work_dir, "subs.srt")
+            with open(subtitle_file, "w") as f:
+                for i, cap in enumerate(captions, 1):
+                    start = format_srt_time(cap['start'])
+                    end = format_srt_time(cap['end'])
+                    f.write(f"{i}\n{start} --> {end}\n{cap['text']}\n\n")
+            # Burn subtitles after interpolation so caption edges aren't smeared
+            filters.append(f"subtitles={subtitle_file}:force_style='FontSize=24,PrimaryColour=&HFFFFFF&'")
+
+        # Captions and fps upsampling share one re-encode pass
+        if filters:
+            subprocess.run([
+                "ffmpeg", "-y", "-i", temp_output,
+                "-vf", ",".join(filters),
+                "-c:a", "copy", output_path
+            ], check=True)
+        else:
+            shutil.move(temp_output, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
     return output_path
 
+def audio_params(path: str):
+    """(sample_rate, channels) of the first audio stream, or None for a silent clip"""
+    result = subprocess.run([
+        "ffprobe", "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "stream=sample_rate,channels", "-of", "csv=p=0", path
+    ], capture_output=True, text=True, check=True)
+    line = result.stdout.strip()
+    if not line:
+        return None
+    sample_rate, channels = line.split(",")[:2]
+    return int(sample_rate), int(channels)
+
+def add_missing_audio(clip_files: list, work_dir: str) -> list:
+    """
+    Give silent clips a silent AAC track matching the narrated ones.
+    Concat with -c copy needs every clip to have the same streams; a pipeline mixes
+    lipsync clips (with audio) and plain VIDEO clips (without) when only some scenes are narrated.
+    """
+    params = [audio_params(path) for path in clip_files]
+    narrated = [p for p in params if p]
+    if not narrated or len(narrated) == len(params):
+        return clip_files
+
+    sample_rate, channels = narrated[0]
+    layout = "mono" if channels == 1 else "stereo"
+    padded = []
+    for i, (path, p) in enumerate(zip(clip_files, params)):
+        if p:
+            padded.append(path)
+            continue
+        silent_path = os.path.join(work_dir, f"clip_{i}_audio.mp4")
+        subprocess.run([
+            "ffmpeg", "-y", "-i", path,
+            "-f", "lavfi", "-i", f"anullsrc=channel_layout={layout}:sample_rate={sample_rate}",
+            "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", "-shortest", silent_path
+        ], check=True)
+        padded.append(silent_path)
+    return padded
+
 def format_srt_time(seconds: float):
     h = int(seconds // 3600)
     m = int((seconds % 3600) // 60)
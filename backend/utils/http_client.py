@@ -0,0 +1,86 @@
+"""
+Shared HTTP clients for the backend
+One pooled httpx.AsyncClient per upstream host, created at startup and closed on shutdown,
+so repeated calls to RunPod, Google, Meta and OpenAI reuse keep-alive (and HTTP/2) connections
+"""
+
+import os
+import importlib.util
+import logging
+from typing import Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable per upstream in CLIENT_CONFIG
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))  # connection-level retries only
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Each entry is one connection pool; limits are therefore per upstream host
+CLIENT_CONFIG = {
+    "runpod": {"timeout": 300, "max_connections": 50, "max_keepalive": 20},
+    "runpod_graphql": {"timeout": 30},
+    "pod_worker": {"timeout": 30, "http2": False},  # plain HTTP to our own pod
+    "openai": {"timeout": 30},
+    "instagram": {"timeout": 60},
+    "downloads": {"timeout": 300, "follow_redirects": True},  # R2 / public media URLs
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    cfg = CLIENT_CONFIG.get(name, {})
+    http2 = cfg.get("http2", True) and HTTP2_AVAILABLE
+
+    limits = httpx.Limits(
+        max_connections=cfg.get("max_connections", HTTP_MAX_CONNECTIONS),
+        max_keepalive_connections=cfg.get("max_keepalive", HTTP_MAX_KEEPALIVE),
+        keepalive_expiry=cfg.get("keepalive_expiry", HTTP_KEEPALIVE_EXPIRY),
+    )
+    timeout = httpx.Timeout(cfg.get("timeout", HTTP_TIMEOUT), connect=HTTP_CONNECT_TIMEOUT)
+    transport = httpx.AsyncHTTPTransport(
+        retries=cfg.get("retries", HTTP_RETRIES),
+        http2=http2,
+        limits=limits,
+    )
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=timeout,
+        follow_redirects=cfg.get("follow_redirects", False),
+    )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Get the shared client for an upstream (created lazily if startup hasn't run)"""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _build_client(name)
+        _clients[name] = client
+    return client
+
+
+def init_clients():
+    """Create every configured client up front (call from app startup)"""
+    for name in CLIENT_CONFIG:
+        get_client(name)
+    logger.info(f"HTTP clients ready: {', '.join(CLIENT_CONFIG)} (http2={HTTP2_AVAILABLE})")
+
+
+async def close_clients():
+    """Close all pooled connections (call from app shutdown)"""
+    for name, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close HTTP client {name}: {e}")
+    _clients.clear()
@@ -4,9 +4,10 @@ Add OPENAI_API_KEY to .env to use
 """
 
 import os
-import httpx
 from typing import Optional
 
+from utils.http_client import get_client
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 async def generate_script_openai(topic: str, duration: int = 60) -> dict:
@@ -44,43 +45,43 @@ Format as JSON:
 Return ONLY valid JSON, no markdown."""
     
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o-mini",  # Cheaper, faster
-                    "messages": [
-                        {"role": "system", "content": "You are a professional video scriptwriter. Return only valid JSON."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7
-                }
-            )
-            
-            if response.status_code != 200:
-                return {"error": f"OpenAI API error: {response.status_code}", "scenes": []}
-            
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-            
-            # Clean JSON if wrapped in markdown
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            
-            import json
-            script = json.loads(content)
-            
-            return {
-                "title": script.get("title", topic),
-                "scenes": script.get("scenes", []),
-                "used_openai": True
+        client = get_client("openai")
+        response = await client.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": "gpt-4o-mini",  # Cheaper, faster
+                "messages": [
+                    {"role": "system", "content": "You are a professional video scriptwriter. Return only valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.7
             }
-            
+        )
+        
+        if response.status_code != 200:
+            return {"error": f"OpenAI API error: {response.status_code}", "scenes": []}
+        
+        data = response.json()
+        content = data["choices"][0]["message"]["content"]
+        
+        # Clean JSON if wrapped in markdown
+        if content.startswith("```"):
+            content = content.split("```")[1]
+            if content.startswith("json"):
+                content = content[4:]
+        
+        import json
+        script = json.loads(content)
+        
+        return {
+            "title": script.get("title", topic),
+            "scenes": script.get("scenes", []),
+            "used_openai": True
+        }
+        
     except Exception as e:
         return {"error": str(e), "scenes": []}
@@ -1,11 +1,17 @@
 
 import React, { useState, useRef, useEffect } from 'react';
+import { prewarmGpu } from '../src/api/client';
 
 export const ACTalker: React.FC = () => {
   const [image, setImage] = useState<string | null>(null);
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const [active, setActive] = useState(false);
 
+  // Opening the lip-sync studio means a lipsync job is likely: boot a worker now to hide the cold start
+  useEffect(() => {
+    prewarmGpu('LIPSYNC').catch((err) => console.error('Failed to prewarm GPU:', err));
+  }, []);
+
   useEffect(() => {
     if (!active || !canvasRef.current) return;
     const canvas = canvasRef.current;
@@ -1,5 +1,6 @@
 
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
+import { prewarmGpu } from '../src/api/client';
 import { TrainingImage } from '../types';
 
 export const TrainingStudio: React.FC = () => {
@@ -7,6 +8,11 @@ export const TrainingStudio: React.FC = () => {
   const [trainingName, setTrainingName] = useState('');
   const [training, setTraining] = useState(false);
 
+  // Opening the training studio means a LoRA run is likely: boot a worker now to hide the cold start
+  useEffect(() => {
+    prewarmGpu('LORA').catch((err) => console.error('Failed to prewarm GPU:', err));
+  }, []);
+
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     // FIX: Explicitly cast files to File[] to resolve 'unknown' type inference and allow URL.createObjectURL
     const files = Array.from(e.target.files || []) as File[];
@@ -1,11 +1,17 @@
 
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
+import { prewarmGpu } from '../src/api/client';
 
 export const VoiceLab: React.FC = () => {
   const [cloning, setCloning] = useState<boolean>(false);
   const [selectedPreset, setSelectedPreset] = useState<string>('Enthusiastic');
   const [recorded, setRecorded] = useState<boolean>(false);
 
+  // Opening the voice lab means synthesis is likely: boot a TTS worker now to hide the cold start
+  useEffect(() => {
+    prewarmGpu('TTS').catch((err) => console.error('Failed to prewarm GPU:', err));
+  }, []);
+
   const presets = [
     'Enthusiastic', 'Melancholic', 'Authoritative', 'Whispering', 'Aggressive', 
     'Seductive', 'Cyborg', 'Distant', 'Child-like', 'Elderly', 'Cinematic Narrator'
@@ -1,7 +1,7 @@
 
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { Resolution } from '../types';
-import { createJob, enhancePrompt } from '../src/api/client';
+import { createJob, enhancePrompt, prewarmGpu } from '../src/api/client';
 import { useJob } from '../src/hooks/useJob';
 
 export const WanControlPanel: React.FC = () => {
@@ -12,6 +12,11 @@ export const WanControlPanel: React.FC = () => {
   const [enhancing, setEnhancing] = useState(false);
   const { job, error } = useJob(jobId);
 
+  // Opening the studio means a render is likely: boot a GPU worker now to hide the cold start
+  useEffect(() => {
+    prewarmGpu('VIDEO').catch((err) => console.error('Failed to prewarm GPU:', err));
+  }, []);
+
   const handleEnhancePrompt = async () => {
     if (!prompt) return;
     setEnhancing(true);
@@ -0,0 +1,95 @@
+"""
+Micro-batching for CogVideoX inference
+Requests with identical generation settings (frames/steps/guidance) that arrive within a short window
+run as a single pipeline call over a list of prompts; each caller gets back only its own frames.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+# Every prompt in a batch adds its own latents and activations on the same GPU: raise only with VRAM headroom
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1"))
+BATCH_WAIT_S = float(os.getenv("BATCH_WAIT_S", "0.5"))  # how long the first request waits for company
+
+
+class BatchRequest:
+    """One caller's prompt, its generation settings and the future its frames are delivered to"""
+
+    def __init__(self, prompt: str, settings: dict, context=None):
+        self.prompt = prompt
+        self.settings = settings
+        self.context = context  # opaque to the batcher (e.g. the RunPod job for progress updates)
+        self.key = tuple(sorted(settings.items()))
+        self.submitted_at = time.time()
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """
+    Collects requests from any number of threads and runs them on a single worker thread.
+    run_batch(requests) must return one output per request, in order.
+    """
+
+    def __init__(self, run_batch: Callable[[List[BatchRequest]], list],
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = BATCH_WAIT_S):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._pending: List[BatchRequest] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, prompt: str, settings: dict, context=None) -> Future:
+        request = BatchRequest(prompt, settings, context)
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify_all()
+        self.start()
+        return request.future
+
+    def next_batch(self) -> List[BatchRequest]:
+        """Oldest pending request plus compatible followers, waiting up to max_wait from its arrival"""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            key = self._pending[0].key
+            deadline = self._pending[0].submitted_at + self.max_wait
+            while True:
+                compatible = [r for r in self._pending if r.key == key]
+                remaining = deadline - time.time()
+                if len(compatible) >= self.max_batch_size or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = compatible[:self.max_batch_size]
+            self._pending = [r for r in self._pending if r not in batch]
+            return batch
+
+    def run_once(self):
+        batch = self.next_batch()
+        try:
+            outputs = self.run_batch(batch)
+            if len(outputs) != len(batch):
+                raise RuntimeError(f"Batch returned {len(outputs)} outputs for {len(batch)} prompts")
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        for request, output in zip(batch, outputs):
+            request.future.set_result(output)
+
+    def start(self):
+        """Start the worker thread on first use"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="micro-batcher")
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            self.run_once()
@@ -0,0 +1,98 @@
+"""
+CPU benchmark: streaming raw frames into ffmpeg (workers/common/encoder.py) vs diffusers export_to_video
+Each method runs in a fresh process so peak RSS is measured independently.
+
+Run: cd runpod_worker && python bench_encoder.py [--frames 49] [--width 720] [--height 480] [--segments 1]
+Needs ffmpeg on PATH; the export_to_video side needs diffusers (+ imageio/imageio-ffmpeg or opencv).
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "workers", "common"))  # encoder
+
+METHODS = ["stream", "export_to_video"]
+
+
+def synthetic_frames(n: int, width: int, height: int) -> np.ndarray:
+    """Float frames in [0, 1] shaped like CogVideoX output_type="np" (a moving gradient, so motion isn't free)"""
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    frames = np.empty((n, height, width, 3), dtype=np.float32)
+    for i in range(n):
+        shift = i / max(1, n)
+        frames[i, ..., 0] = (x + shift) % 1.0
+        frames[i, ..., 1] = (y + shift) % 1.0
+        frames[i, ..., 2] = 0.5
+    return frames
+
+
+def run_method(method: str, args) -> dict:
+    frames = synthetic_frames(args.frames, args.width, args.height)
+    baseline_rss = peak_rss_mb()
+
+    out_dir = tempfile.mkdtemp()
+    t0 = time.time()
+    for seg in range(args.segments):
+        path = os.path.join(out_dir, f"seg{seg}.mp4")
+        if method == "stream":
+            from encoder import encode_frames
+            encode_frames(frames, path, args.fps)
+        else:
+            from diffusers.utils import export_to_video
+            export_to_video(list(frames), path, fps=args.fps)
+    elapsed = time.time() - t0
+
+    size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    return {
+        "method": method,
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_over_frames_mb": round(peak_rss_mb() - baseline_rss, 1),
+        "output_kb": size // 1024,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=49)
+    parser.add_argument("--width", type=int, default=720)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=int, default=8)
+    parser.add_argument("--segments", type=int, default=1)
+    parser.add_argument("--method", choices=METHODS, help=argparse.SUPPRESS)  # child process mode
+    args = parser.parse_args()
+
+    if args.method:
+        print(json.dumps(run_method(args.method, args)))
+        return
+
+    frame_mb = args.frames * args.width * args.height * 3 * 4 / 1024 / 1024
+    print(f"{args.segments} x {args.frames} frames @ {args.width}x{args.height} ({frame_mb:.0f} MB float32 per segment)")
+    for method in METHODS:
+        result = subprocess.run(
+            [sys.executable, __file__, "--method", method] + [a for a in sys.argv[1:]],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            print(f"  {method:16s} failed: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"  {method:16s} {r['seconds']:7.2f}s  peak RSS {r['peak_rss_mb']:7.1f} MB  (+{r['rss_over_frames_mb']:.1f} MB while encoding)  {r['output_kb']} KB")
+
+
+if __name__ == "__main__":
+    main()
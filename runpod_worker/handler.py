@@ -1,9 +1,20 @@
 import os
+import asyncio
 import time
 import traceback
 import runpod  # type: ignore
-import boto3  # type: ignore
-from botocore.exceptions import ClientError, NoCredentialsError  # type: ignore
+
+from batching import MicroBatcher, MAX_BATCH_SIZE
+from cancellation import (
+    CANCEL_CHECK_INTERVAL, JobCancelled, check_cancel_config, make_step_callback, runpod_job_cancelled, safe_progress,
+)
+from cogvideo import LazyPipeline
+from interpolation import validate_interpolation
+from r2_upload import upload_file, validate_r2_env
+from segments import (
+    FPS, SEGMENT_FRAMES, VIDEO_ENCODER, finalize_video, generate_segment, remove_files,
+    segment_condition, segment_count, stream_frames_to_r2, write_video,
+)
 
 # Force all temp operations to /runpod-volume
 os.environ.setdefault("TMPDIR", "/runpod-volume/tmp")
@@ -16,25 +27,19 @@ MODEL_ID = "THUDM/CogVideoX-2b"
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "/workspace/tmp")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# Lazy imports - only load heavy deps when needed
-_torch = None
-_pipeline_class = None
-_export_to_video = None
-_pipeline_instance = None
-
-def lazy_import_ml():
-    global _torch, _pipeline_class, _export_to_video
-    if _torch is None:
-        import torch  # type: ignore
-        from diffusers.pipelines.cogvideo import CogVideoXPipeline  # type: ignore
-        from diffusers.utils import export_to_video  # type: ignore
-        _torch = torch
-        _pipeline_class = CogVideoXPipeline
-        _export_to_video = export_to_video
-
 def log(msg: str):
     print(f"[{WORKER_VERSION}] {msg}", flush=True)
 
+# Loaded at boot (before serverless.start) so the first job after a scale-up doesn't pay for it
+WARMUP_INFERENCE = os.getenv("WARMUP_INFERENCE", "false").lower() == "true"
+_pipeline = LazyPipeline(MODEL_ID, WARMUP_INFERENCE, log)
+
+# Per-step progress and RunPod cancel polling: see cancellation.py (PROGRESS_INTERVAL, CANCEL_CHECK_INTERVAL)
+NUM_INFERENCE_STEPS = 50
+
+# Upload while ffmpeg encodes (fragmented MP4 into R2 multipart parts) instead of encode-then-upload
+STREAM_UPLOAD = os.getenv("STREAM_UPLOAD", "true").lower() == "true"
+
 def log_disk(path="/runpod-volume"):
     try:
         st = os.statvfs(path)
@@ -43,119 +48,126 @@ def log_disk(path="/runpod-volume"):
     except Exception as e:
         log(f"disk check failed: {e}")
 
-def safe_progress(job, pct: int):
-    """Progress updates must never crash the job."""
-    try:
-        pct = max(0, min(100, int(pct)))
-        runpod.serverless.progress_update(job, pct)
-    except Exception as e:
-        log(f"progress_update failed (ignored): {e}")
-
-def validate_env():
-    required = [
-        "R2_BUCKET",
-        "R2_PUBLIC_BASE_URL",
-        "AWS_ACCESS_KEY_ID",
-        "AWS_SECRET_ACCESS_KEY",
-        "AWS_ENDPOINT_URL",
-    ]
-    missing = [k for k in required if not os.getenv(k)]
-    if missing:
-        raise ValueError(f"Missing required env vars: {', '.join(missing)}")
-
-def get_s3_client():
-    return boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_REGION", "auto"),
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+def run_batch(requests) -> list:
+    """
+    One pipeline call for a batch of compatible requests, returning each request's own frames.
+    The call only stops early if every job in it was cancelled; generate_video drops the rest afterwards.
+    """
+    pipe = _pipeline.load()
+    settings = dict(requests[0].settings)
+    settings.pop("conditioned", None)
+    contexts = [r.context for r in requests]
+    
+    def on_progress(pct):
+        for ctx in contexts:
+            lo, hi = ctx["progress_range"]
+            safe_progress(ctx["job"], lo + (hi - lo) * pct / 100)
+    
+    log(f"Running inference for {len(requests)} prompt(s)...")
+    return generate_segment(
+        pipe,
+        [r.prompt for r in requests],
+        settings,
+        [ctx["condition"] for ctx in contexts],
+        make_step_callback(
+            settings["num_inference_steps"],
+            on_progress,
+            lambda: all(runpod_job_cancelled(ctx["job"].get("id", "")) for ctx in contexts),
+            start_pct=0,
+            end_pct=100,
+            cancel_interval=CANCEL_CHECK_INTERVAL,
+        ),
+        log,
     )
 
-def load_pipeline():
-    global _pipeline_instance
-    if _pipeline_instance is None:
-        lazy_import_ml()
-        log(f"Loading {MODEL_ID}...")
-        _pipeline_instance = _pipeline_class.from_pretrained(
-            MODEL_ID,
-            torch_dtype=_torch.float16,
-        ).to("cuda")
-        _pipeline_instance.enable_model_cpu_offload()
-        
-        # Safe VAE optimization
-        if hasattr(_pipeline_instance, "vae"):
-            vae = _pipeline_instance.vae
-            if hasattr(vae, "enable_slicing"):
-                vae.enable_slicing()
-                log("VAE slicing enabled")
-            elif hasattr(vae, "enable_tiling"):
-                vae.enable_tiling()
-                log("VAE tiling enabled")
-            else:
-                log("VAE slicing/tiling not supported (ok)")
-        
-        log("Pipeline loaded")
-    return _pipeline_instance
+# Concurrent jobs with the same settings share a pipeline call (see concurrency_modifier below)
+_batcher = MicroBatcher(run_batch)
 
-def generate_video(prompt: str, duration: int, output_path: str, job):
+def generate_video(prompt: str, duration: int, output_path: str, job, guidance_scale: float = 6.0, num_inference_steps: int = NUM_INFERENCE_STEPS,
+                   target_fps: int = None, interpolation: str = "mci", upload_key: str = None) -> dict:
+    """
+    Generate, encode and join all segments. With upload_key the final MP4 is streamed to R2 as it is
+    encoded and the result includes output_url; otherwise it is left at output_path.
+    """
     log(f"Generating video: prompt='{prompt[:50]}...' duration={duration}s")
     
     safe_progress(job, 25)
-    pipe = load_pipeline()
+    _pipeline.load()
     
-    # CogVideoX generates 49 frames (6s at 8fps)
-    num_frames = 49
-    fps = 8
+    # CogVideoX generates 49 frames (6s at 8fps) per segment; longer durations get more segments
+    num_segments = segment_count(duration)
+    segment_paths = []
+    prev_frames = None
+    total_frames = 0
+    output_url = None
+    # A single segment with no post-processing goes straight from the encoder to R2
+    direct_upload = upload_key and num_segments == 1 and not target_fps and VIDEO_ENCODER == "stream"
     
     safe_progress(job, 40)
-    log("Running inference...")
-    
-    video_frames = pipe(
-        prompt=prompt,
-        num_frames=num_frames,
-        guidance_scale=6.0,
-        num_inference_steps=50,
-    ).frames[0]
-    
-    safe_progress(job, 75)
-    log(f"Generated {len(video_frames)} frames")
+    for i in range(num_segments):
+        condition = segment_condition(prev_frames)
+        settings = {
+            "num_frames": SEGMENT_FRAMES,
+            "guidance_scale": guidance_scale,
+            "num_inference_steps": num_inference_steps,
+            "conditioned": condition is not None,
+        }
+        context = {
+            "job": job,
+            "condition": condition,
+            "progress_range": (40 + 45 * i / num_segments, 40 + 45 * (i + 1) / num_segments),
+        }
+        try:
+            # Also catches cancels that land while the previous segment was being encoded
+            if i and runpod_job_cancelled(job.get("id", "")):
+                raise JobCancelled(f"Cancelled before segment {i + 1}/{num_segments}")
+            video_frames = _batcher.submit(prompt, settings, context=context).result()
+            # Batched with a live job, a cancelled one still runs to the end of the shared call; stop it here
+            if runpod_job_cancelled(job.get("id", "")):
+                raise JobCancelled(f"Cancelled during segment {i + 1}/{num_segments}")
+        except Exception:
+            remove_files(segment_paths)
+            raise
+        log(f"Segment {i + 1}/{num_segments}: {len(video_frames)} frames")
+        
+        if direct_upload:
+            log(f"Encoding and uploading {upload_key}...")
+            output_url = stream_frames_to_r2(video_frames, upload_key)
+        else:
+            segment_path = f"{output_path}.seg{i}.mp4"
+            write_video(video_frames, segment_path)
+            segment_paths.append(segment_path)
+        prev_frames = video_frames
+        total_frames += len(video_frames)
     
     safe_progress(job, 90)
-    log("Encoding MP4...")
-    _export_to_video(video_frames, output_path, fps=fps)
+    info = {"fps": FPS, "segments": num_segments, "frames": total_frames, "duration_s": round(total_frames / FPS, 2)}
+    if not direct_upload:
+        t0 = time.time()
+        if target_fps:
+            log(f"Joining {num_segments} segment(s), upsampling {FPS} -> {target_fps} fps ({interpolation})...")
+            info.update(fps=target_fps, interpolation=interpolation)
+        else:
+            log(f"Joining {num_segments} segment(s)...")
+        output_url = finalize_video(segment_paths, output_path, target_fps, interpolation, upload_key)
+        info["finalize_s"] = round(time.time() - t0, 2)
     
-    if not os.path.exists(output_path):
+    if output_url:
+        info["output_url"] = output_url
+        info["streamed_upload"] = True
+        log(f"Streamed to R2: {output_url}")
+    elif not os.path.exists(output_path):
         raise RuntimeError("Video file not created")
-    
-    size = os.path.getsize(output_path)
-    log(f"MP4 created: {size} bytes")
+    else:
+        log(f"MP4 created: {os.path.getsize(output_path)} bytes")
+    return info
 
 def upload_to_r2(file_path: str, job_id: str) -> str:
-    bucket = os.getenv("R2_BUCKET")
-    public_base = os.getenv("R2_PUBLIC_BASE_URL").rstrip("/")
     key = f"videos/{job_id}/final.mp4"
-
-    log(f"Uploading to R2 bucket={bucket} key={key}")
-
-    try:
-        s3 = get_s3_client()
-        with open(file_path, "rb") as f:
-            s3.put_object(
-                Bucket=bucket,
-                Key=key,
-                Body=f,
-                ContentType="video/mp4",
-                CacheControl="public, max-age=31536000",
-            )
-        url = f"{public_base}/{key}"
-        log(f"Upload complete: {url}")
-        return url
-    except NoCredentialsError:
-        raise RuntimeError("R2 credentials not configured")
-    except ClientError as e:
-        msg = e.response.get("Error", {}).get("Message", str(e))
-        raise RuntimeError(f"R2 upload failed: {msg}")
+    log(f"Uploading to R2: {key}")
+    url = upload_file(file_path, key, "video/mp4")
+    log(f"Upload complete: {url}")
+    return url
 
 def handler(job):
     job_id = job.get("id", f"job-{int(time.time())}")
@@ -166,6 +178,12 @@ def handler(job):
         
         payload = job.get("input", {}) or {}
 
+        # Pre-warm ping from the backend: boot the worker and load the model, do no work
+        if payload.get("warmup"):
+            if _pipeline.state["status"] != "ready":
+                _pipeline.warm_up()
+            return {"ok": True, "warmup": True, "load": _pipeline.state, "worker_version": WORKER_VERSION, "build_id": BUILD_ID}
+
         prompt = payload.get("prompt")
         duration = payload.get("duration", 5)
 
@@ -178,18 +196,31 @@ def handler(job):
                 "build_id": BUILD_ID,
             }
 
+        target_fps = payload.get("target_fps")
+        interpolation = payload.get("interpolation", "mci")
+        if target_fps:
+            try:
+                validate_interpolation(int(target_fps), interpolation)
+            except ValueError as e:
+                return {"ok": False, "error_code": "invalid_input", "error_message": str(e), "worker_version": WORKER_VERSION, "build_id": BUILD_ID}
+
         safe_progress(job, 10)
-        validate_env()
+        validate_r2_env()
 
         output_path = os.path.join(OUTPUT_DIR, f"{job_id}_final.mp4")
-        generate_video(str(prompt), int(duration), output_path, job)
+        video_info = generate_video(
+            str(prompt), int(duration), output_path, job,
+            guidance_scale=float(payload.get("guidance_scale", 6.0)),
+            num_inference_steps=int(payload.get("num_inference_steps", NUM_INFERENCE_STEPS)),
+            target_fps=int(target_fps) if target_fps else None,
+            interpolation=interpolation,
+            upload_key=f"videos/{job_id}/final.mp4" if STREAM_UPLOAD else None,
+        )
 
-        public_url = upload_to_r2(output_path, job_id)
-
-        try:
-            os.remove(output_path)
-        except Exception:
-            pass
+        public_url = video_info.pop("output_url", None)
+        if not public_url:
+            public_url = upload_to_r2(output_path, job_id)
+            remove_files([output_path])
 
         safe_progress(job, 100)
         return {
@@ -199,10 +230,13 @@ def handler(job):
             "build_id": BUILD_ID,
             "meta": {
                 "model": "cogvideox-2b",
-                "fps": 8,
+                **video_info,
             },
         }
 
+    except JobCancelled as e:
+        log(f"Job {job_id} cancelled: {e}")
+        return {"ok": False, "error_code": "cancelled", "error_message": str(e), "worker_version": WORKER_VERSION, "build_id": BUILD_ID}
     except (ValueError, ImportError) as e:
         log(f"Config/Import error: {e}")
         return {"ok": False, "error_code": "config_error", "error_message": str(e), "worker_version": WORKER_VERSION, "build_id": BUILD_ID}
@@ -214,6 +248,15 @@ def handler(job):
         log(f"Unexpected error: {e}\n{tb}")
         return {"ok": False, "error_code": "internal_error", "error_message": str(e), "worker_version": WORKER_VERSION, "build_id": BUILD_ID}
 
+async def async_handler(job):
+    """Each job blocks its own thread while the batcher groups concurrent ones onto the GPU"""
+    return await asyncio.to_thread(handler, job)
+
+def concurrency_modifier(current_concurrency: int) -> int:
+    return MAX_BATCH_SIZE
+
 if __name__ == "__main__":
     log(f"BOOT build_id={BUILD_ID} worker_version={WORKER_VERSION}")
-    runpod.serverless.start({"handler": handler})
+    check_cancel_config(log)
+    _pipeline.warm_up()
+    runpod.serverless.start({"handler": async_handler, "concurrency_modifier": concurrency_modifier})
@@ -0,0 +1,212 @@
+"""
+CPU-only tests for the micro-batcher with a stub pipeline
+Run: cd runpod_worker && python -m pytest -q test_batching.py
+(the handler tests need the runpod package installed)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from batching import BatchRequest, MicroBatcher
+
+SETTINGS = {"num_frames": 49, "guidance_scale": 6.0, "num_inference_steps": 50}
+
+
+class StubPipeline:
+    """Records each call's prompts and returns one fake video per prompt"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, requests):
+        self.calls.append([r.prompt for r in requests])
+        return [[f"{r.prompt}-frame-{i}" for i in range(3)] for r in requests]
+
+
+def submit_all(batcher, items):
+    """Submit from separate threads (as concurrent RunPod jobs would) and collect results by prompt"""
+    results = {}
+    started = threading.Barrier(len(items))
+
+    def run(prompt, settings):
+        started.wait()
+        results[prompt] = batcher.submit(prompt, settings).result(timeout=5)
+
+    threads = [threading.Thread(target=run, args=item) for item in items]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_compatible_requests_share_one_call():
+    pipe = StubPipeline()
+    batcher = MicroBatcher(pipe, max_batch_size=4, max_wait=1.0)
+
+    results = submit_all(batcher, [(f"p{i}", SETTINGS) for i in range(4)])
+
+    assert len(pipe.calls) == 1
+    assert sorted(pipe.calls[0]) == ["p0", "p1", "p2", "p3"]
+    for prompt, frames in results.items():
+        assert frames == [f"{prompt}-frame-{i}" for i in range(3)]
+
+
+def test_max_batch_size_is_respected():
+    pipe = StubPipeline()
+    batcher = MicroBatcher(pipe, max_batch_size=2, max_wait=1.0)
+
+    results = submit_all(batcher, [(f"p{i}", SETTINGS) for i in range(4)])
+
+    assert [len(c) for c in pipe.calls] == [2, 2]
+    assert set(results) == {"p0", "p1", "p2", "p3"}
+
+
+def test_incompatible_settings_are_not_mixed():
+    pipe = StubPipeline()
+    batcher = MicroBatcher(pipe, max_batch_size=4, max_wait=0.2)
+    fast = dict(SETTINGS, num_inference_steps=20)
+
+    results = submit_all(batcher, [("a", SETTINGS), ("b", fast), ("c", SETTINGS), ("d", fast)])
+
+    assert sorted(sorted(c) for c in pipe.calls) == [["a", "c"], ["b", "d"]]
+    assert results["d"][0] == "d-frame-0"
+
+
+def test_lone_request_runs_after_wait_window():
+    pipe = StubPipeline()
+    batcher = MicroBatcher(pipe, max_batch_size=4, max_wait=0.05)
+
+    assert batcher.submit("solo", SETTINGS).result(timeout=5)[0] == "solo-frame-0"
+    assert pipe.calls == [["solo"]]
+
+
+def test_pipeline_error_fails_every_request_in_batch():
+    def broken(requests):
+        raise RuntimeError("CUDA out of memory")
+
+    batcher = MicroBatcher(broken, max_batch_size=2, max_wait=0.05)
+    futures = [batcher.submit("a", SETTINGS), batcher.submit("b", SETTINGS)]
+
+    for f in futures:
+        assert isinstance(f.exception(timeout=5), RuntimeError)
+
+
+class StubOutput:
+    def __init__(self, frames):
+        self.frames = frames
+
+
+class StubDiffusersPipeline:
+    """Called like CogVideoXPipeline: one fake video per prompt, running the step callback each step"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, num_frames, guidance_scale, num_inference_steps, output_type="pil", callback_on_step_end=None):
+        self.calls.append(list(prompt))
+        for step in range(num_inference_steps):
+            callback_on_step_end(self, step, 0, {})
+        return StubOutput([[f"{p}-frame-{i}" for i in range(3)] for p in prompt])
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    pytest.importorskip("runpod")
+    monkeypatch.setenv("TMPDIR", tempfile.mkdtemp())
+    monkeypatch.setenv("OUTPUT_DIR", tempfile.mkdtemp())
+    for var in ["R2_BUCKET", "R2_PUBLIC_BASE_URL", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_ENDPOINT_URL"]:
+        monkeypatch.setenv(var, "test")
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(__file__), "..", "workers", "common"))
+    import handler
+    import segments
+
+    state = {"pipe": StubDiffusersPipeline(), "progress": {}, "cancelled": set(), "uploads": {}}
+
+    def upload_file(path, key, content_type):
+        state["uploads"][key] = open(path).read()
+        return f"https://r2.test/{key}"
+
+    monkeypatch.setattr(handler._pipeline, "pipe", state["pipe"])
+    monkeypatch.setattr(handler, "safe_progress", lambda job, pct: state["progress"].setdefault(job["id"], []).append(pct))
+    monkeypatch.setattr(handler, "runpod_job_cancelled", lambda job_id: job_id in state["cancelled"])
+    monkeypatch.setattr(segments, "encode_frames", lambda frames, path, fps: open(path, "w").write(",".join(frames)))
+    monkeypatch.setattr(handler, "upload_file", upload_file)
+    monkeypatch.setattr(handler, "STREAM_UPLOAD", False)
+    monkeypatch.setattr(handler, "_batcher", MicroBatcher(handler.run_batch, max_batch_size=2, max_wait=1.0))
+    handler.state = state
+    return handler
+
+
+def run_jobs(handler, jobs):
+    """Run handler(job) for each job on its own thread, as RunPod's concurrency_modifier would"""
+    results = {}
+    threads = [threading.Thread(target=lambda j=job: results.__setitem__(j["id"], handler.handler(j))) for job in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    return results
+
+
+def test_run_batch_returns_each_request_its_own_frames(handler):
+    batcher = handler._batcher
+    settings = {"num_frames": 49, "guidance_scale": 6.0, "num_inference_steps": 3}
+    contexts = [{"job": {"id": job_id}, "condition": None, "progress_range": (40, 85)} for job_id in ("j1", "j2")]
+    futures = [batcher.submit(p, settings, context=ctx) for p, ctx in zip(["cat", "dog"], contexts)]
+
+    assert futures[0].result(timeout=5) == ["cat-frame-0", "cat-frame-1", "cat-frame-2"]
+    assert futures[1].result(timeout=5) == ["dog-frame-0", "dog-frame-1", "dog-frame-2"]
+    assert handler.state["pipe"].calls == [["cat", "dog"]]
+    # Both jobs get progress from the shared call, mapped into their own range
+    for job_id in ("j1", "j2"):
+        assert handler.state["progress"][job_id][-1] == 85
+
+
+def test_batch_stops_only_when_every_job_is_cancelled(handler):
+    handler.state["cancelled"].update({"a", "b"})
+    settings = {"num_frames": 49, "guidance_scale": 6.0, "num_inference_steps": 3}
+    requests = [
+        BatchRequest(p, settings, context={"job": {"id": j}, "condition": None, "progress_range": (0, 100)})
+        for p, j in [("cat", "a"), ("dog", "b")]
+    ]
+    with pytest.raises(handler.JobCancelled):
+        handler.run_batch(requests)
+
+
+def test_cancelled_job_sharing_a_batch_is_not_uploaded(handler):
+    handler.state["cancelled"].add("gone")
+    jobs = [
+        {"id": "kept", "input": {"prompt": "cat", "duration": 5, "num_inference_steps": 2}},
+        {"id": "gone", "input": {"prompt": "dog", "duration": 5, "num_inference_steps": 2}},
+    ]
+
+    results = run_jobs(handler, jobs)
+
+    assert [sorted(c) for c in handler.state["pipe"].calls] == [["cat", "dog"]]
+    assert results["kept"]["ok"] and results["kept"]["output_url"].endswith("videos/kept/final.mp4")
+    assert results["gone"]["error_code"] == "cancelled"
+    assert list(handler.state["uploads"]) == ["videos/kept/final.mp4"]
+    assert handler.state["uploads"]["videos/kept/final.mp4"].startswith("cat-frame-0")
+
+
+def test_cancel_between_segments_stops_before_the_next_one(handler, monkeypatch):
+    import segments
+
+    def encode_and_cancel(frames, path, fps):
+        open(path, "w").write(",".join(frames))
+        handler.state["cancelled"].add("long")  # cancelled while segment 1 is being encoded
+
+    monkeypatch.setattr(segments, "encode_frames", encode_and_cancel)
+    job = {"id": "long", "input": {"prompt": "cat", "duration": 12, "num_inference_steps": 2}}
+
+    result = handler.handler(job)
+
+    assert result["error_code"] == "cancelled"
+    assert "before segment 2/2" in result["error_message"]
+    assert handler.state["pipe"].calls == [["cat"]]
+    assert handler.state["uploads"] == {}
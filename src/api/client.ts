@@ -11,6 +11,7 @@ export interface Job {
     message: string;
   };
   status_hint?: 'warming_gpu' | null;
+  meta?: Record<string, any> | null;
   created_at: string;
   updated_at: string;
 }
@@ -87,6 +88,35 @@ export async function stitchTimeline(clips: any[], captions: any[] = []): Promis
   return res.json();
 }
 
+export async function createPipeline(
+  scenes: Array<{ scene_number?: number; duration: number; visual_prompt: string; narration?: string }>,
+  captions: any[] = []
+): Promise<{ job_id: string; status: string; type: string; nodes: string[] }> {
+  const res = await fetch(`${API_BASE}/jobs/pipeline`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ scenes, captions })
+  });
+  
+  if (!res.ok) {
+    throw new Error(`Failed to create pipeline: ${res.statusText}`);
+  }
+  
+  return res.json();
+}
+
+export async function prewarmGpu(jobType: string = 'VIDEO'): Promise<{ prewarmed: boolean; endpoint?: string; reason?: string }> {
+  const res = await fetch(`${API_BASE}/gpu/prewarm?job_type=${encodeURIComponent(jobType)}`, {
+    method: 'POST'
+  });
+  
+  if (!res.ok) {
+    throw new Error(`Failed to prewarm GPU: ${res.statusText}`);
+  }
+  
+  return res.json();
+}
+
 export async function checkHealth(): Promise<{ status: string; runpod_connected: boolean }> {
   const res = await fetch(`${API_BASE}/health`);
   
@@ -0,0 +1,74 @@
+"""
+Per-step progress and cooperative cancellation for the CogVideoX workers
+Progress writes are throttled to PROGRESS_INTERVAL. The serverless handlers poll RunPod's status API
+(needs RUNPOD_API_KEY and RUNPOD_ENDPOINT_ID) at most every CANCEL_CHECK_INTERVAL seconds, i.e. every step
+once steps are slower; the pod API server raises JobCancelled from its own job-store check.
+"""
+
+import json
+import os
+import time
+import urllib.request
+from typing import Callable
+
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "2"))
+CANCEL_CHECK_INTERVAL = float(os.getenv("CANCEL_CHECK_INTERVAL", "1"))
+
+
+class JobCancelled(Exception):
+    """Raised from the diffusion step callback to abort a cancelled job"""
+
+
+def safe_progress(job, pct: int, log: Callable[[str], None] = print):
+    """Progress updates must never crash the job."""
+    try:
+        import runpod  # type: ignore  # serverless images only
+
+        pct = max(0, min(100, int(pct)))
+        runpod.serverless.progress_update(job, pct)
+    except Exception as e:
+        log(f"progress_update failed (ignored): {e}")
+
+
+def make_step_callback(num_steps: int, on_progress: Callable[[float], None], is_cancelled: Callable[[], bool],
+                       start_pct: float = 40, end_pct: float = 75, cancel_interval: float = 0.0):
+    """diffusers callback_on_step_end: throttled per-step progress plus cooperative cancellation"""
+    last = {"progress": 0.0, "cancel": 0.0}
+
+    def callback(pipe, step, timestep, callback_kwargs):
+        now = time.time()
+        if now - last["cancel"] >= cancel_interval:
+            last["cancel"] = now
+            if is_cancelled():
+                raise JobCancelled(f"Cancelled at step {step + 1}/{num_steps}")
+        if now - last["progress"] >= PROGRESS_INTERVAL or step + 1 == num_steps:
+            last["progress"] = now
+            on_progress(start_pct + (end_pct - start_pct) * (step + 1) / num_steps)
+        return callback_kwargs
+
+    return callback
+
+
+def check_cancel_config(log: Callable[[str], None] = print):
+    """Say so at boot when cancellation can't work, rather than silently running cancelled jobs to the end"""
+    missing = [k for k in ("RUNPOD_API_KEY", "RUNPOD_ENDPOINT_ID") if not os.getenv(k)]
+    if missing:
+        log(f"{', '.join(missing)} not set: cancelled jobs will not be stopped mid-generation")
+
+
+def runpod_job_cancelled(job_id: str, log: Callable[[str], None] = print) -> bool:
+    """Ask RunPod whether this job was cancelled; False when we can't tell (no API key configured)"""
+    api_key = os.getenv("RUNPOD_API_KEY")
+    endpoint_id = os.getenv("RUNPOD_ENDPOINT_ID")
+    if not api_key or not endpoint_id:
+        return False
+    try:
+        req = urllib.request.Request(
+            f"https://api.runpod.ai/v2/{endpoint_id}/status/{job_id}",
+            headers={"Authorization": f"Bearer {api_key}"},
+        )
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return json.load(resp).get("status") == "CANCELLED"
+    except Exception as e:
+        log(f"cancel check failed (ignored): {e}")
+        return False
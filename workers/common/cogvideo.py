@@ -0,0 +1,100 @@
+"""
+CogVideoX loading shared by the serverless video handlers and the pod API server
+Workers load the model at boot so the first job after a scale-up doesn't pay for it. Each stage
+(import, weight download, from_pretrained, device placement) is timed separately into the worker's
+load state, which is reported by /health (pod) and by warm-up job output (serverless).
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+
+def new_load_state() -> dict:
+    return {"status": "cold", "timings": {}, "error": None}
+
+
+@contextmanager
+def timed(timings: dict, name: str):
+    """Record the block's wall-clock seconds as timings[name]"""
+    t0 = time.time()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.time() - t0, 2)
+
+
+def load_cogvideox(model_id: str, timings: dict, log: Callable[[str], None] = print):
+    """Import diffusers, fetch the weights and load the pipeline onto the GPU, timing each stage"""
+    with timed(timings, "import_s"):
+        import torch  # type: ignore
+        from diffusers.pipelines.cogvideo import CogVideoXPipeline  # type: ignore
+
+    # Fetch weights separately so download and load time show up apart
+    with timed(timings, "download_s"):
+        from huggingface_hub import snapshot_download  # type: ignore
+        snapshot_download(model_id)
+
+    log(f"Loading {model_id}...")
+    with timed(timings, "load_s"):
+        pipe = CogVideoXPipeline.from_pretrained(model_id, torch_dtype=torch.float16)
+
+    with timed(timings, "to_device_s"):
+        pipe = pipe.to("cuda")
+        pipe.enable_model_cpu_offload()
+        # Safe VAE optimization
+        vae = getattr(pipe, "vae", None)
+        if vae is not None:
+            if hasattr(vae, "enable_slicing"):
+                vae.enable_slicing()
+                log("VAE slicing enabled")
+            elif hasattr(vae, "enable_tiling"):
+                vae.enable_tiling()
+                log("VAE tiling enabled")
+            else:
+                log("VAE slicing/tiling not supported (ok)")
+
+    log(f"Pipeline loaded: {timings}")
+    return pipe
+
+
+def run_warm_up(state: dict, load: Callable[[], object], warmup_inference: bool = False, log: Callable[[str], None] = print):
+    """
+    Run load() (and optionally a tiny inference) and record the outcome in state.
+    A failure doesn't keep the worker from starting; jobs retry the load and report the error.
+    """
+    state["status"] = "loading"
+    state["error"] = None
+    state["started_at"] = t0 = time.time()
+    try:
+        pipe = load()
+        if warmup_inference:
+            with timed(state["timings"], "warmup_inference_s"):
+                pipe(prompt="warm-up", num_frames=9, guidance_scale=6.0, num_inference_steps=2)
+        state["status"] = "ready"
+    except Exception as e:
+        state["status"] = "failed"
+        state["error"] = str(e)
+        log(f"Warm-up failed: {e}")
+    state["timings"]["total_s"] = round(time.time() - t0, 2)
+    log(f"Warm-up {state['status']} in {state['timings']['total_s']}s")
+
+
+class LazyPipeline:
+    """A worker's one CogVideoX pipeline: loaded by warm_up() at boot, or by the first load() if that failed"""
+
+    def __init__(self, model_id: str, warmup_inference: bool = False, log: Callable[[str], None] = print):
+        self.model_id = model_id
+        self.warmup_inference = warmup_inference
+        self.log = log
+        self.pipe = None
+        self.state = new_load_state()
+
+    def load(self):
+        if self.pipe is None:
+            self.pipe = load_cogvideox(self.model_id, self.state["timings"], self.log)
+        return self.pipe
+
+    def warm_up(self):
+        """Load the pipeline (and optionally run a tiny inference) before accepting jobs"""
+        run_warm_up(self.state, self.load, self.warmup_inference, self.log)
@@ -0,0 +1,137 @@
+"""
+Streaming video encoder
+Frames are written one at a time as raw RGB into an ffmpeg subprocess, so encoding runs alongside
+frame conversion and the host never holds a second, converted copy of the whole clip
+(export_to_video builds a full list of uint8 frames before it starts encoding)
+With a sink, ffmpeg writes fragmented MP4 to stdout instead of a file and the bytes are forwarded
+to sink.write() as they are produced (e.g. r2_upload.StreamingUpload).
+"""
+
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+VIDEO_CODEC = os.getenv("VIDEO_CODEC", "libx264")
+VIDEO_CRF = os.getenv("VIDEO_CRF", "18")
+VIDEO_PRESET = os.getenv("VIDEO_PRESET", "medium")
+
+# Fragmented MP4 needs no seek back to write the moov atom, so it can be written to a pipe
+FRAGMENTED_MP4 = ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov+default_base_moof", "pipe:1"]
+
+
+def to_rgb24(frame, out: np.ndarray) -> np.ndarray:
+    """Convert one frame (HxWx3 float in [0, 1], uint8 array, or PIL image) into the preallocated uint8 buffer"""
+    if not isinstance(frame, np.ndarray):
+        frame = np.asarray(frame.convert("RGB"))
+    if frame.dtype == np.uint8:
+        np.copyto(out, frame)
+    else:
+        np.copyto(out, np.clip(frame, 0.0, 1.0) * 255 + 0.5, casting="unsafe")
+    return out
+
+
+class FrameEncoder:
+    """
+    with FrameEncoder(path, fps=8) as enc:
+        for frame in frames:
+            enc.write(frame)
+    ffmpeg is started on the first frame (its size fixes the stream dimensions).
+    Pass sink instead of output_path to stream the encoded bytes; the caller closes the sink.
+    """
+
+    def __init__(self, output_path: str, fps: int, codec: str = VIDEO_CODEC, crf: str = VIDEO_CRF, preset: str = VIDEO_PRESET, sink=None):
+        self.output_path = output_path
+        self.sink = sink
+        self.fps = fps
+        self.codec = codec
+        self.crf = str(crf)
+        self.preset = preset
+        self.frames = 0
+        self._proc = None
+        self._buf = None
+        self._pump = None
+        self._pump_error = None
+
+    def _start(self, width: int, height: int):
+        cmd = [
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+            # yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", self.codec, "-crf", self.crf, "-preset", self.preset, "-pix_fmt", "yuv420p",
+        ]
+        if self.sink is None:
+            cmd += ["-movflags", "+faststart", self.output_path]
+        else:
+            cmd += FRAGMENTED_MP4
+        self._proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+            stdout=subprocess.PIPE if self.sink is not None else None,
+        )
+        self._buf = np.empty((height, width, 3), dtype=np.uint8)
+        if self.sink is not None:
+            # Drain stdout concurrently or ffmpeg blocks once the pipe buffer fills
+            self._pump = threading.Thread(target=self._forward_output, daemon=True, name="encoder-output")
+            self._pump.start()
+
+    def _forward_output(self):
+        try:
+            for chunk in iter(lambda: self._proc.stdout.read(1024 * 1024), b""):
+                self.sink.write(chunk)
+        except Exception as e:
+            self._pump_error = e
+            self._proc.kill()
+
+    def write(self, frame):
+        if self._proc is None:
+            height, width = (frame.shape[0], frame.shape[1]) if isinstance(frame, np.ndarray) else (frame.height, frame.width)
+            self._start(width, height)
+        try:
+            self._proc.stdin.write(to_rgb24(frame, self._buf).data)
+        except BrokenPipeError:
+            if self._pump_error is not None:
+                raise self._pump_error
+            raise RuntimeError(f"ffmpeg exited early: {self._stderr()}")
+        self.frames += 1
+
+    def close(self):
+        if self._proc is None:
+            raise RuntimeError("No frames written")
+        self._proc.stdin.close()
+        stderr = self._stderr()
+        returncode = self._proc.wait()
+        if self._pump is not None:
+            self._pump.join()
+        if self._pump_error is not None:
+            raise self._pump_error
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg encode failed: {stderr}")
+
+    def abort(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        if self._pump is not None:
+            self._pump.join()
+
+    def _stderr(self) -> str:
+        return self._proc.stderr.read().decode(errors="replace").strip()[-500:]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def encode_frames(frames, output_path: str, fps: int, **options) -> int:
+    """Drop-in replacement for export_to_video(frames, output_path, fps); returns frames written (see FrameEncoder for sink=)"""
+    with FrameEncoder(output_path, fps, **options) as enc:
+        for frame in frames:
+            enc.write(frame)
+    return enc.frames
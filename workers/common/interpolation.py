@@ -0,0 +1,28 @@
+"""
+Frame-rate upsampling filters shared by the video workers and the backend's timeline stitch
+One rule everywhere: target_fps is 1..MAX_TARGET_FPS and interpolation is a key of INTERPOLATION_FILTERS.
+The backend validates both when a job is submitted, so bad values are a 422 rather than a failed job.
+"""
+
+from typing import Optional
+
+# Motion-compensated interpolation, or much cheaper frame blending
+INTERPOLATION_FILTERS = {
+    "mci": "minterpolate=fps={fps}:mi_mode=mci:mc_mode=aobmc:me_mode=bidir:vsbmc=1",
+    "blend": "framerate=fps={fps}",
+}
+MAX_TARGET_FPS = 60
+
+
+def validate_interpolation(target_fps: Optional[int], interpolation: str = "mci"):
+    """Raise ValueError unless (target_fps, interpolation) is usable; target_fps None means no upsampling"""
+    if interpolation not in INTERPOLATION_FILTERS:
+        raise ValueError(f"Unknown interpolation '{interpolation}' (expected one of {', '.join(INTERPOLATION_FILTERS)})")
+    if target_fps is not None and not 0 < target_fps <= MAX_TARGET_FPS:
+        raise ValueError(f"target_fps must be between 1 and {MAX_TARGET_FPS}")
+
+
+def interpolation_filter(target_fps: int, interpolation: str = "mci") -> str:
+    """ffmpeg -vf expression that raises the frame rate to target_fps"""
+    validate_interpolation(target_fps, interpolation)
+    return INTERPOLATION_FILTERS[interpolation].format(fps=target_fps)
@@ -0,0 +1,289 @@
+"""
+Shared R2 uploader for the GPU workers
+One cached boto3 client per process. Files at or above R2_MULTIPART_THRESHOLD go up as parallel
+multipart parts, each retried on its own; every part (or single PUT) carries a Content-MD5, so the
+store itself rejects corrupted bodies. Returned ETags are only compared against the local digests when
+they are plain MD5s (not under SSE-KMS/SSE-C or on stores with opaque ETags). StreamingUpload takes bytes as a producer
+(e.g. ffmpeg writing fragmented MP4 to stdout) emits them, so upload overlaps encoding.
+
+Copied into each worker image (see the worker Dockerfiles); set R2_BUCKET, R2_PUBLIC_BASE_URL,
+AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY and AWS_ENDPOINT_URL.
+"""
+
+import os
+import base64
+import hashlib
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, NoCredentialsError
+
+MIB = 1024 * 1024
+MULTIPART_THRESHOLD = int(os.getenv("R2_MULTIPART_THRESHOLD", str(64 * MIB)))
+PART_SIZE = max(5 * MIB, int(os.getenv("R2_PART_SIZE", str(16 * MIB))))  # S3/R2 minimum is 5 MiB (except the last part)
+UPLOAD_CONCURRENCY = int(os.getenv("R2_UPLOAD_CONCURRENCY", "8"))
+PART_RETRIES = int(os.getenv("R2_PART_RETRIES", "3"))
+CACHE_CONTROL = "public, max-age=31536000"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class UploadError(RuntimeError):
+    """Upload failed after retries, or the stored object doesn't match what we sent"""
+
+
+def get_s3_client():
+    """Process-wide client; boto3 clients are thread-safe and keep their connection pool between uploads"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client(
+                "s3",
+                region_name=os.getenv("AWS_REGION", "auto"),
+                endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                config=Config(max_pool_connections=max(10, UPLOAD_CONCURRENCY * 2)),
+            )
+    return _client
+
+
+def public_url(key: str) -> str:
+    return f"{os.getenv('R2_PUBLIC_BASE_URL').rstrip('/')}/{key}"
+
+
+def validate_r2_env():
+    """Fail a job up front when the worker has nowhere to upload its result"""
+    required = ["R2_BUCKET", "R2_PUBLIC_BASE_URL", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_ENDPOINT_URL"]
+    missing = [k for k in required if not os.getenv(k)]
+    if missing:
+        raise ValueError(f"Missing env vars: {', '.join(missing)}")
+
+
+def _etag(resp: dict) -> str:
+    return resp["ETag"].strip('"')
+
+
+def _is_md5(etag: str) -> bool:
+    return len(etag) == 32 and all(c in "0123456789abcdef" for c in etag.lower())
+
+
+def _check_etag(etag: str, md5, what: str):
+    """Extra end-to-end check on top of Content-MD5, skipped when the ETag isn't an MD5 of the body"""
+    if _is_md5(etag) and etag.lower() != md5.hexdigest():
+        raise UploadError(f"checksum mismatch on {what}")
+
+
+def _with_retries(fn, what: str):
+    """Call fn(), retrying transient failures with exponential backoff"""
+    for attempt in range(PART_RETRIES + 1):
+        try:
+            return fn()
+        except NoCredentialsError:
+            raise UploadError("R2 credentials not configured")
+        except Exception as e:
+            if attempt == PART_RETRIES:
+                if isinstance(e, ClientError):
+                    e = e.response.get("Error", {}).get("Message", str(e))
+                raise UploadError(f"R2 upload failed ({what}): {e}")
+            time.sleep(0.5 * 2 ** attempt)
+
+
+class MultipartUpload:
+    """
+    One multipart upload: upload_part() may be called from several threads, in any order;
+    complete() stitches the parts and verifies the combined ETag where the store reports one.
+    """
+
+    def __init__(self, key: str, content_type: str, cache_control: str = CACHE_CONTROL, bucket: Optional[str] = None):
+        self.s3 = get_s3_client()
+        self.bucket = bucket or os.getenv("R2_BUCKET")
+        self.key = key
+        self.parts: Dict[int, Tuple[str, bytes]] = {}  # part number -> (etag, md5 digest)
+        self.size = 0
+        self._lock = threading.Lock()
+        resp = _with_retries(lambda: self.s3.create_multipart_upload(
+            Bucket=self.bucket, Key=key, ContentType=content_type, CacheControl=cache_control,
+        ), "create")
+        self.upload_id = resp["UploadId"]
+
+    def upload_part(self, part_number: int, data: bytes):
+        md5 = hashlib.md5(data)
+
+        def put():
+            resp = self.s3.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=part_number,
+                Body=data, ContentMD5=base64.b64encode(md5.digest()).decode(),
+            )
+            _check_etag(_etag(resp), md5, f"part {part_number}")
+            return _etag(resp)
+
+        etag = _with_retries(put, f"part {part_number}")
+        with self._lock:
+            self.parts[part_number] = (etag, md5.digest())
+            self.size += len(data)
+
+    def complete(self) -> str:
+        numbers = sorted(self.parts)
+        resp = _with_retries(lambda: self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": [{"ETag": self.parts[n][0], "PartNumber": n} for n in numbers]},
+        ), "complete")
+
+        # S3-style multipart ETag: md5 of the concatenated part digests, suffixed with the part count.
+        # Only meaningful when the parts themselves came back with MD5 ETags.
+        etag = _etag(resp)
+        if etag.endswith(f"-{len(numbers)}") and all(_is_md5(self.parts[n][0]) for n in numbers):
+            expected = hashlib.md5(b"".join(self.parts[n][1] for n in numbers)).hexdigest()
+            if etag != f"{expected}-{len(numbers)}":
+                raise UploadError(f"checksum mismatch on {self.key}: {etag} != {expected}-{len(numbers)}")
+        verify_size(self.s3, self.bucket, self.key, self.size)
+        return public_url(self.key)
+
+    def abort(self):
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception:
+            pass
+
+
+def verify_size(s3, bucket: str, key: str, size: int):
+    stored = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    if stored != size:
+        raise UploadError(f"size mismatch on {key}: stored {stored} bytes, sent {size}")
+
+
+def _read_range(file_path: str, offset: int, length: int) -> bytes:
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def upload_file(file_path: str, key: str, content_type: str, cache_control: str = CACHE_CONTROL,
+                bucket: Optional[str] = None) -> str:
+    """Upload a local file to R2 and return its public URL"""
+    bucket = bucket or os.getenv("R2_BUCKET")
+    size = os.path.getsize(file_path)
+
+    if size < MULTIPART_THRESHOLD:
+        s3 = get_s3_client()
+        data = _read_range(file_path, 0, size)
+        md5 = hashlib.md5(data)
+
+        def put():
+            resp = s3.put_object(
+                Bucket=bucket, Key=key, Body=data, ContentType=content_type, CacheControl=cache_control,
+                ContentMD5=base64.b64encode(md5.digest()).decode(),
+            )
+            _check_etag(_etag(resp), md5, key)
+
+        _with_retries(put, key)
+        return public_url(key)
+
+    upload = MultipartUpload(key, content_type, cache_control, bucket)
+    offsets = range(0, size, PART_SIZE)
+    try:
+        with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as pool:
+            # Each part is read inside its own task so at most UPLOAD_CONCURRENCY parts sit in memory
+            futures = [
+                pool.submit(lambda n, off: upload.upload_part(n, _read_range(file_path, off, PART_SIZE)), i + 1, offset)
+                for i, offset in enumerate(offsets)
+            ]
+            for f in futures:
+                f.result()
+        return upload.complete()
+    except Exception:
+        upload.abort()
+        raise
+
+
+class StreamingUpload:
+    """
+    Writable sink that uploads PART_SIZE chunks as multipart parts while the producer is still running.
+    write() blocks once UPLOAD_CONCURRENCY parts are in flight, so memory stays bounded;
+    close() uploads the tail, completes the object and returns its public URL.
+    """
+
+    def __init__(self, key: str, content_type: str, cache_control: str = CACHE_CONTROL, bucket: Optional[str] = None):
+        self.key = key
+        self.upload = MultipartUpload(key, content_type, cache_control, bucket)
+        self._buf = bytearray()
+        self._next_part = 1
+        self._pool = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY)
+        self._slots = threading.BoundedSemaphore(UPLOAD_CONCURRENCY)
+        self._futures = []
+
+    def write(self, data: bytes):
+        self._buf += data
+        while len(self._buf) >= PART_SIZE:
+            self._submit(bytes(self._buf[:PART_SIZE]))
+            del self._buf[:PART_SIZE]
+
+    def _submit(self, data: bytes):
+        # Fail fast if an earlier part already gave up
+        for f in self._futures:
+            if f.done():
+                f.result()
+        self._slots.acquire()
+        part_number = self._next_part
+        self._next_part += 1
+
+        def run():
+            try:
+                self.upload.upload_part(part_number, data)
+            finally:
+                self._slots.release()
+
+        self._futures.append(self._pool.submit(run))
+
+    def close(self) -> str:
+        try:
+            if self._buf or self._next_part == 1:
+                self._submit(bytes(self._buf))
+                self._buf.clear()
+            for f in self._futures:
+                f.result()
+            return self.upload.complete()
+        except Exception:
+            self.upload.abort()
+            raise
+        finally:
+            self._pool.shutdown()
+
+    def abort(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self.upload.abort()
+
+
+def pump(stream, sink, chunk_size: int = MIB):
+    """Copy a readable stream (e.g. a subprocess stdout) into sink until EOF"""
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        sink.write(chunk)
+
+
+def upload_process_output(cmd: List[str], key: str, content_type: str, cache_control: str = CACHE_CONTROL) -> str:
+    """Run cmd (which must write its result to stdout) and upload the output as it is produced"""
+    sink = StreamingUpload(key, content_type, cache_control)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = []
+    stderr_reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+    stderr_reader.start()
+    try:
+        pump(proc.stdout, sink)
+        returncode = proc.wait()
+        stderr_reader.join()
+        if returncode != 0:
+            raise RuntimeError(f"{os.path.basename(cmd[0])} failed: {b''.join(stderr).decode(errors='replace').strip()[-500:]}")
+        return sink.close()
+    except Exception:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        sink.abort()
+        raise
@@ -0,0 +1,147 @@
+"""
+Segmented CogVideoX generation shared by the serverless video handlers and the pod API server
+Long videos are generated as consecutive native-length segments (optionally conditioned on the previous
+segment's tail), encoded one by one and joined with ffmpeg stream copy, optionally upsampling the
+frame rate in the same pass.
+"""
+
+import math
+import os
+import subprocess
+from typing import Callable, List
+
+import numpy as np
+
+from encoder import FRAGMENTED_MP4, encode_frames, to_rgb24
+from interpolation import interpolation_filter
+from r2_upload import StreamingUpload, upload_process_output
+
+FPS = 8
+SEGMENT_FRAMES = 49  # CogVideoX-2b native clip length (~6s at 8fps)
+MAX_DURATION = int(os.getenv("MAX_DURATION", "60"))
+SEGMENT_CONDITIONING = os.getenv("SEGMENT_CONDITIONING", "false").lower() == "true"
+SEGMENT_CONDITION_FRAMES = int(os.getenv("SEGMENT_CONDITION_FRAMES", "8"))
+SEGMENT_CONDITION_STRENGTH = float(os.getenv("SEGMENT_CONDITION_STRENGTH", "0.8"))
+_v2v_instance = None
+
+# Optional CPU frame-rate upsampling after generation, per job (target_fps + interpolation, see interpolation.py)
+UPSAMPLE_CRF = os.getenv("UPSAMPLE_CRF", "18")
+UPSAMPLE_PRESET = os.getenv("UPSAMPLE_PRESET", "medium")
+
+# "stream" pipes raw frames into ffmpeg (encoder.py, VIDEO_CODEC/VIDEO_CRF/VIDEO_PRESET); "export_to_video" is the diffusers helper
+VIDEO_ENCODER = os.getenv("VIDEO_ENCODER", "stream")
+
+
+def load_v2v_pipeline(pipe):
+    """Video-to-video pipeline sharing pipe's CogVideoX weights (needs a diffusers release that ships it)"""
+    global _v2v_instance
+    if _v2v_instance is None:
+        from diffusers import CogVideoXVideoToVideoPipeline  # type: ignore
+        _v2v_instance = CogVideoXVideoToVideoPipeline(**pipe.components)
+    return _v2v_instance
+
+
+def segment_count(duration: int) -> int:
+    """Number of native-length segments needed to cover `duration` seconds"""
+    duration = max(1, min(int(duration), MAX_DURATION))
+    return max(1, math.ceil(duration * FPS / SEGMENT_FRAMES))
+
+
+def segment_condition(prev_frames):
+    """Init video for the next segment: the previous segment's last frames, held on the final one"""
+    if not SEGMENT_CONDITIONING or prev_frames is None:
+        return None
+    from PIL import Image
+    tail = [
+        Image.fromarray(to_rgb24(frame, np.empty(frame.shape, dtype=np.uint8)))
+        for frame in prev_frames[-SEGMENT_CONDITION_FRAMES:]
+    ]
+    return tail + [tail[-1]] * (SEGMENT_FRAMES - len(tail))
+
+
+def generate_segment(pipe, prompts, settings: dict, conditions, callback, log: Callable[[str], None] = print) -> list:
+    """One segment per prompt; conditioned prompts go through video-to-video one at a time"""
+    if any(c is not None for c in conditions):
+        try:
+            v2v = load_v2v_pipeline(pipe)
+            return [
+                v2v(
+                    prompt=prompt,
+                    video=condition,
+                    strength=SEGMENT_CONDITION_STRENGTH,
+                    guidance_scale=settings["guidance_scale"],
+                    num_inference_steps=settings["num_inference_steps"],
+                    output_type="np",
+                    callback_on_step_end=callback,
+                ).frames[0]
+                for prompt, condition in zip(prompts, conditions)
+            ]
+        except ImportError as e:
+            log(f"Segment conditioning unavailable ({e}); generating unconditioned")
+    # Float arrays rather than PIL images: the encoder converts each frame as it streams it out
+    return pipe(prompt=prompts, **settings, output_type="np", callback_on_step_end=callback).frames
+
+
+def write_video(frames, path: str):
+    """Encode one segment's frames to MP4"""
+    if VIDEO_ENCODER == "export_to_video":
+        from diffusers.utils import export_to_video  # type: ignore
+        export_to_video(list(frames), path, fps=FPS)
+    else:
+        encode_frames(frames, path, FPS)
+
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+
+def finalize_video(segment_paths, output_path: str, target_fps: int = None, interpolation: str = "mci", upload_key: str = None):
+    """
+    Join segments (ffmpeg concat demuxer) and optionally upsample fps, in a single ffmpeg pass;
+    without upsampling the join is a stream copy. With upload_key the result is written as fragmented
+    MP4 straight to R2 while ffmpeg runs and the URL is returned; otherwise it lands at output_path.
+    """
+    list_path = f"{output_path}.txt"
+    try:
+        if len(segment_paths) == 1 and not target_fps and not upload_key:
+            os.replace(segment_paths[0], output_path)
+            return None
+
+        if len(segment_paths) == 1:
+            inputs = ["-i", segment_paths[0]]
+        else:
+            with open(list_path, "w") as f:
+                for path in segment_paths:
+                    f.write(f"file '{path}'\n")
+            inputs = ["-f", "concat", "-safe", "0", "-i", list_path]
+
+        if target_fps:
+            codec = ["-vf", interpolation_filter(target_fps, interpolation),
+                     "-c:v", "libx264", "-crf", UPSAMPLE_CRF, "-preset", UPSAMPLE_PRESET, "-pix_fmt", "yuv420p"]
+        else:
+            codec = ["-c", "copy"]
+        cmd = ["ffmpeg", "-y", "-v", "error"] + inputs + codec
+
+        if upload_key:
+            return upload_process_output(cmd + FRAGMENTED_MP4, upload_key, "video/mp4")
+        result = subprocess.run(cmd + ["-movflags", "+faststart", output_path], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg finalize failed: {result.stderr.strip()[-500:]}")
+        return None
+    finally:
+        remove_files(segment_paths + [list_path])
+
+
+def stream_frames_to_r2(frames, key: str) -> str:
+    """Encode frames straight into a multipart upload; the MP4 never touches local disk"""
+    sink = StreamingUpload(key, "video/mp4")
+    try:
+        encode_frames(frames, None, FPS, sink=sink)
+    except Exception:
+        sink.abort()
+        raise
+    return sink.close()
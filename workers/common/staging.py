@@ -0,0 +1,225 @@
+"""
+Per-job input staging for the GPU workers
+job_scratch() gives every job its own directory that is removed afterwards, even on failure, so
+concurrent jobs never share paths and nothing leaks into the next job. download_all() fetches a
+job's inputs in parallel (bounded by DOWNLOAD_CONCURRENCY) over one pooled HTTP client.
+
+Downloads go through a content-addressed cache on the network volume (INPUT_CACHE_DIR): blobs are
+stored by sha256, an index maps each URL to its blob and ETag, and a repeat URL is revalidated with
+If-None-Match so a 304 is served from the volume. Blobs and index entries are written with atomic
+renames (workers share the volume); least recently used blobs are evicted past INPUT_CACHE_MAX_GB
+(0 disables the cache). Responses without an ETag are never cached.
+
+Copied into each worker image next to r2_upload.py (see the worker Dockerfiles).
+"""
+
+import os
+import re
+import json
+import uuid
+import hashlib
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterable, Optional, Tuple
+
+import httpx
+
+MIB = 1024 * 1024
+SCRATCH_ROOT = os.getenv("SCRATCH_ROOT") or tempfile.gettempdir()
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1 * MIB)))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "300"))
+INPUT_CACHE_DIR = os.getenv("INPUT_CACHE_DIR", "/runpod-volume/input-cache")
+INPUT_CACHE_MAX_BYTES = int(float(os.getenv("INPUT_CACHE_MAX_GB", "20")) * 1024 ** 3)
+
+_client = None
+_client_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Process-wide client so parallel and back-to-back downloads reuse connections"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                follow_redirects=True,
+                timeout=DOWNLOAD_TIMEOUT,
+                limits=httpx.Limits(max_connections=max(10, DOWNLOAD_CONCURRENCY * 2)),
+            )
+    return _client
+
+
+@contextmanager
+def job_scratch(job_id: str):
+    """with job_scratch(job_id) as work_dir: ... -- a fresh directory, deleted on exit"""
+    os.makedirs(SCRATCH_ROOT, exist_ok=True)
+    prefix = re.sub(r"[^A-Za-z0-9_.-]", "_", str(job_id))[:64]
+    path = tempfile.mkdtemp(prefix=f"{prefix}-", dir=SCRATCH_ROOT)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _index_path(url: str) -> str:
+    return os.path.join(INPUT_CACHE_DIR, "index", hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(INPUT_CACHE_DIR, "objects", digest)
+
+
+def _atomic_copy(src: str, dst: str):
+    tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _cached_entry(url: str) -> Optional[dict]:
+    """Index entry for url whose blob is still present, or None"""
+    if INPUT_CACHE_MAX_BYTES <= 0:
+        return None
+    try:
+        with open(_index_path(url)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("url") != url or not os.path.exists(_object_path(entry["sha256"])):
+        return None
+    return entry
+
+
+def _store(url: str, etag: str, digest: str, size: int, file_path: str):
+    """Add a downloaded file to the cache; failures only cost the cache entry, never the job"""
+    try:
+        os.makedirs(os.path.dirname(_object_path(digest)), exist_ok=True)
+        os.makedirs(os.path.dirname(_index_path(url)), exist_ok=True)
+        if not os.path.exists(_object_path(digest)):
+            _atomic_copy(file_path, _object_path(digest))
+        index_path = _index_path(url)
+        tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"url": url, "etag": etag, "sha256": digest, "size": size}, f)
+        os.replace(tmp_path, index_path)
+        evict_input_cache()
+    except OSError:
+        pass
+
+
+def evict_input_cache(max_bytes: Optional[int] = None):
+    """Delete least recently used blobs (by mtime, bumped on every hit) until the cache fits max_bytes"""
+    max_bytes = INPUT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    objects_dir = os.path.join(INPUT_CACHE_DIR, "objects")
+    entries = []
+    for name in os.listdir(objects_dir):
+        if name.endswith(".tmp"):
+            continue
+        try:
+            st = os.stat(os.path.join(objects_dir, name))
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(objects_dir, name))  # index entries pointing here now read as misses
+        except OSError:
+            pass
+        total -= size
+
+
+def _fetch(url: str, output_path: str, client: Optional[httpx.Client] = None, use_cache: bool = True) -> Tuple[int, bool]:
+    """Download url to output_path through the cache; returns (bytes, served_from_cache)"""
+    client = client or get_http_client()
+    entry = _cached_entry(url) if use_cache else None
+    headers = {"If-None-Match": entry["etag"]} if entry else {}
+    tmp_path = f"{output_path}.part"
+    try:
+        with client.stream("GET", url, headers=headers) as resp:
+            if entry and resp.status_code == 304:
+                blob = _object_path(entry["sha256"])
+                try:
+                    os.utime(blob)
+                    shutil.copyfile(blob, tmp_path)
+                except OSError:
+                    # Evicted by another worker since the lookup
+                    return _fetch(url, output_path, client, use_cache=False)
+                os.replace(tmp_path, output_path)
+                return entry["size"], True
+
+            resp.raise_for_status()
+            etag = resp.headers.get("etag")
+            digest = hashlib.sha256()
+            size = 0
+            with open(tmp_path, "wb") as f:
+                for chunk in resp.iter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        if etag and INPUT_CACHE_MAX_BYTES > 0:
+            _store(url, etag, digest.hexdigest(), size, tmp_path)
+        os.replace(tmp_path, output_path)
+        return size, False
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def download_file(url: str, output_path: str, client: Optional[httpx.Client] = None) -> int:
+    """Stream url to output_path and return the byte count; a partial file never appears at output_path"""
+    return _fetch(url, output_path, client)[0]
+
+
+def cache_stats() -> dict:
+    """Hit counts since the process started"""
+    with _stats_lock:
+        lookups = _cache_stats["hits"] + _cache_stats["misses"]
+        return {**_cache_stats, "hit_rate": round(_cache_stats["hits"] / lookups, 3) if lookups else 0.0}
+
+
+def download_all(items: Iterable[Tuple[str, str]], concurrency: int = DOWNLOAD_CONCURRENCY,
+                 client: Optional[httpx.Client] = None) -> dict:
+    """
+    Download (url, output_path) pairs with at most `concurrency` in flight.
+    The first failure cancels downloads that haven't started and is re-raised.
+    Returns a summary for the job's meta: files, bytes, cache hits and hit rates (this job, and
+    since the worker started).
+    """
+    items = list(items)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as pool:
+        futures = [pool.submit(_fetch, url, path, client) for url, path in items]
+        try:
+            results = [f.result() for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    hits = sum(1 for _, hit in results if hit)
+    with _stats_lock:
+        _cache_stats["hits"] += hits
+        _cache_stats["misses"] += len(results) - hits
+    return {
+        "files": len(results),
+        "bytes": sum(size for size, _ in results),
+        "cache_hits": hits,
+        "cache_hit_rate": round(hits / len(results), 3) if results else 0.0,
+        "worker_cache_hit_rate": cache_stats()["hit_rate"],
+    }
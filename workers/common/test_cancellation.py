@@ -0,0 +1,49 @@
+"""
+Tests for the diffusion step callback and the RunPod cancel check
+Run: cd workers/common && python -m pytest -q test_cancellation.py
+"""
+
+import pytest
+
+import cancellation
+
+
+def test_callback_reports_progress_into_its_range_and_always_on_the_last_step(monkeypatch):
+    monkeypatch.setattr(cancellation, "PROGRESS_INTERVAL", 3600)
+    reported = []
+    callback = cancellation.make_step_callback(4, reported.append, lambda: False, start_pct=40, end_pct=80)
+
+    for step in range(4):
+        assert callback(None, step, 0, {"latents": step}) == {"latents": step}
+
+    assert reported == [50, 80]  # the first step, then throttled until the final one
+
+
+def test_callback_raises_once_cancelled():
+    cancelled = {"now": False}
+    callback = cancellation.make_step_callback(10, lambda pct: None, lambda: cancelled["now"])
+
+    callback(None, 0, 0, {})
+    cancelled["now"] = True
+    with pytest.raises(cancellation.JobCancelled, match="step 2/10"):
+        callback(None, 1, 0, {})
+
+
+def test_cancel_checks_are_throttled_by_interval():
+    checks = []
+    callback = cancellation.make_step_callback(5, lambda pct: None, lambda: checks.append(1) or False, cancel_interval=3600)
+
+    for step in range(5):
+        callback(None, step, 0, {})
+
+    assert len(checks) == 1
+
+
+def test_unconfigured_cancel_check_is_never_cancelled(monkeypatch):
+    monkeypatch.delenv("RUNPOD_API_KEY", raising=False)
+    monkeypatch.setenv("RUNPOD_ENDPOINT_ID", "ep")
+    logged = []
+
+    assert cancellation.runpod_job_cancelled("job-1") is False
+    cancellation.check_cancel_config(logged.append)
+    assert logged == ["RUNPOD_API_KEY not set: cancelled jobs will not be stopped mid-generation"]
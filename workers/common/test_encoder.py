@@ -0,0 +1,88 @@
+"""
+Tests for the streaming frame encoder (the FrameEncoder tests need ffmpeg/ffprobe on PATH)
+Run: cd workers/common && python -m pytest -q test_encoder.py
+"""
+
+import json
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from encoder import FrameEncoder, encode_frames, to_rgb24
+
+needs_ffmpeg = pytest.mark.skipif(not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="ffmpeg not installed")
+
+
+def probe(path) -> dict:
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-count_frames",
+         "-show_entries", "stream=width,height,nb_read_frames,pix_fmt", "-of", "json", str(path)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out)["streams"][0]
+
+
+def test_float_frames_are_clipped_and_rounded():
+    frame = np.array([[[0.0, 0.5, 1.0], [-0.2, 1.3, 0.999]]], dtype=np.float32)
+    out = to_rgb24(frame, np.empty((1, 2, 3), dtype=np.uint8))
+    assert out.tolist() == [[[0, 128, 255], [0, 255, 255]]]
+
+
+def test_uint8_frames_are_copied_unchanged():
+    frame = np.arange(12, dtype=np.uint8).reshape(2, 2, 3)
+    out = np.empty_like(frame)
+    assert to_rgb24(frame, out) is out
+    assert np.array_equal(out, frame)
+
+
+def test_pil_frames_are_converted_to_rgb():
+    Image = pytest.importorskip("PIL.Image")
+    img = Image.new("L", (3, 2), color=200)  # grayscale gets expanded to RGB
+    out = to_rgb24(img, np.empty((2, 3, 3), dtype=np.uint8))
+    assert (out == 200).all()
+
+
+@needs_ffmpeg
+def test_odd_dimensions_are_padded_to_even(tmp_path):
+    frames = np.random.default_rng(0).random((5, 33, 47, 3), dtype=np.float32)
+    path = tmp_path / "odd.mp4"
+
+    assert encode_frames(frames, str(path), 8) == 5
+
+    stream = probe(path)
+    assert (stream["width"], stream["height"]) == (48, 34)
+    assert int(stream["nb_read_frames"]) == 5
+    assert stream["pix_fmt"] == "yuv420p"
+
+
+@needs_ffmpeg
+def test_mixed_uint8_and_pil_input(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    frames = [np.full((16, 16, 3), 10, dtype=np.uint8), Image.new("RGB", (16, 16), (0, 255, 0))]
+    path = tmp_path / "mixed.mp4"
+
+    assert encode_frames(frames, str(path), 8) == 2
+    assert int(probe(path)["nb_read_frames"]) == 2
+
+
+@needs_ffmpeg
+def test_sink_receives_fragmented_mp4():
+    class Sink:
+        def __init__(self):
+            self.data = b""
+
+        def write(self, chunk):
+            self.data += chunk
+
+    sink = Sink()
+    encode_frames(np.zeros((3, 16, 16, 3), dtype=np.float32), None, 8, sink=sink)
+
+    assert sink.data[4:8] == b"ftyp"
+    assert b"moof" in sink.data
+
+
+def test_close_without_frames_fails(tmp_path):
+    with pytest.raises(RuntimeError):
+        FrameEncoder(str(tmp_path / "empty.mp4"), 8).close()
@@ -0,0 +1,25 @@
+"""
+Tests for the shared frame-rate upsampling filters
+Run: cd workers/common && python -m pytest -q test_interpolation.py
+"""
+
+import pytest
+
+from interpolation import MAX_TARGET_FPS, interpolation_filter, validate_interpolation
+
+
+def test_filters_carry_the_target_rate():
+    assert interpolation_filter(24) == "minterpolate=fps=24:mi_mode=mci:mc_mode=aobmc:me_mode=bidir:vsbmc=1"
+    assert interpolation_filter(MAX_TARGET_FPS, "blend") == "framerate=fps=60"
+
+
+def test_no_target_fps_only_checks_the_interpolation():
+    validate_interpolation(None, "blend")
+    with pytest.raises(ValueError):
+        validate_interpolation(None, "optical-flow")
+
+
+@pytest.mark.parametrize("target_fps", [0, -1, MAX_TARGET_FPS + 1])
+def test_rejects_out_of_range_rates(target_fps):
+    with pytest.raises(ValueError):
+        interpolation_filter(target_fps)
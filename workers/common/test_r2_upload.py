@@ -0,0 +1,169 @@
+"""
+Tests for the shared R2 uploader against moto's in-process S3
+Run: pip install "moto[s3]" pytest && cd workers/common && python -m pytest -q test_r2_upload.py
+"""
+
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import r2_upload
+
+BUCKET = "test-bucket"
+MIB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def s3(monkeypatch, tmp_path):
+    monkeypatch.setenv("R2_BUCKET", BUCKET)
+    monkeypatch.setenv("R2_PUBLIC_BASE_URL", "https://cdn.example.com/")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+    monkeypatch.setattr(r2_upload, "MULTIPART_THRESHOLD", 8 * MIB)
+    monkeypatch.setattr(r2_upload, "PART_SIZE", 5 * MIB)
+    monkeypatch.setattr(r2_upload, "_client", None)
+    monkeypatch.setattr(r2_upload.time, "sleep", lambda s: None)
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield r2_upload.get_s3_client()
+
+
+def make_file(tmp_path, size: int) -> str:
+    path = os.path.join(tmp_path, "blob.bin")
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def stored(s3, key: str) -> bytes:
+    return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_small_file_single_put(s3, tmp_path):
+    path = make_file(tmp_path, 1 * MIB)
+
+    url = r2_upload.upload_file(path, "audio/j1/voice.wav", "audio/wav")
+
+    assert url == "https://cdn.example.com/audio/j1/voice.wav"
+    assert stored(s3, "audio/j1/voice.wav") == open(path, "rb").read()
+    assert s3.head_object(Bucket=BUCKET, Key="audio/j1/voice.wav")["ContentType"] == "audio/wav"
+
+
+def test_large_file_parallel_multipart(s3, tmp_path, monkeypatch):
+    path = make_file(tmp_path, 12 * MIB + 123)
+    parts = []
+    real_upload_part = s3.upload_part
+    monkeypatch.setattr(s3, "upload_part", lambda **kw: parts.append(kw["PartNumber"]) or real_upload_part(**kw))
+
+    r2_upload.upload_file(path, "lora/j2/adapter.safetensors", "application/octet-stream")
+
+    assert sorted(parts) == [1, 2, 3]
+    assert stored(s3, "lora/j2/adapter.safetensors") == open(path, "rb").read()
+
+
+def test_client_is_reused():
+    assert r2_upload.get_s3_client() is r2_upload.get_s3_client()
+
+
+def test_failed_part_is_retried(s3, tmp_path, monkeypatch):
+    path = make_file(tmp_path, 10 * MIB)
+    real_upload_part = s3.upload_part
+    failures = {2: 2}  # part 2 fails twice, then succeeds
+
+    def flaky(**kw):
+        if failures.get(kw["PartNumber"]):
+            failures[kw["PartNumber"]] -= 1
+            raise ConnectionResetError("connection reset by peer")
+        return real_upload_part(**kw)
+
+    monkeypatch.setattr(s3, "upload_part", flaky)
+
+    r2_upload.upload_file(path, "videos/j3/final.mp4", "video/mp4")
+
+    assert failures[2] == 0
+    assert stored(s3, "videos/j3/final.mp4") == open(path, "rb").read()
+
+
+def test_checksum_mismatch_fails_and_aborts(s3, tmp_path, monkeypatch):
+    path = make_file(tmp_path, 10 * MIB)
+    real_upload_part = s3.upload_part
+    monkeypatch.setattr(s3, "upload_part", lambda **kw: {**real_upload_part(**kw), "ETag": f'"{"0" * 32}"'})
+
+    with pytest.raises(r2_upload.UploadError, match="checksum mismatch"):
+        r2_upload.upload_file(path, "videos/j4/final.mp4", "video/mp4")
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET)
+
+
+@pytest.mark.parametrize("size", [1 * MIB, 10 * MIB])
+def test_non_md5_etags_are_not_compared(s3, tmp_path, monkeypatch, size):
+    # e.g. SSE-KMS: the ETag isn't the body's MD5; Content-MD5 already covered the transfer
+    path = make_file(tmp_path, size)
+    real_put_object, real_upload_part, real_complete = s3.put_object, s3.upload_part, s3.complete_multipart_upload
+
+    def opaque(resp):
+        return {**resp, "ETag": f'"kms-{resp["ETag"].strip(chr(34))}"'}
+
+    def complete(MultipartUpload, **kw):
+        parts = [{**p, "ETag": p["ETag"].removeprefix("kms-")} for p in MultipartUpload["Parts"]]
+        return opaque(real_complete(MultipartUpload={"Parts": parts}, **kw))
+
+    monkeypatch.setattr(s3, "put_object", lambda **kw: opaque(real_put_object(**kw)))
+    monkeypatch.setattr(s3, "upload_part", lambda **kw: opaque(real_upload_part(**kw)))
+    monkeypatch.setattr(s3, "complete_multipart_upload", complete)
+
+    r2_upload.upload_file(path, "videos/j6/final.mp4", "video/mp4")
+
+    assert stored(s3, "videos/j6/final.mp4") == open(path, "rb").read()
+
+
+def test_retries_exhausted_raises_upload_error(s3, tmp_path, monkeypatch):
+    path = make_file(tmp_path, 1 * MIB)
+
+    def down(**kw):
+        raise ConnectionResetError("connection reset by peer")
+
+    monkeypatch.setattr(s3, "put_object", down)
+
+    with pytest.raises(r2_upload.UploadError, match="connection reset"):
+        r2_upload.upload_file(path, "audio/j5/voice.wav", "audio/wav")
+
+
+def test_streaming_upload_sends_parts_as_written(s3, monkeypatch):
+    data = os.urandom(11 * MIB + 7)
+    parts = []
+    real_upload_part = s3.upload_part
+    monkeypatch.setattr(s3, "upload_part", lambda **kw: parts.append(kw["PartNumber"]) or real_upload_part(**kw))
+
+    sink = r2_upload.StreamingUpload("videos/j1/final.mp4", "video/mp4")
+    for offset in range(0, len(data), 300 * 1024):
+        sink.write(data[offset:offset + 300 * 1024])
+    url = sink.close()
+
+    assert url == "https://cdn.example.com/videos/j1/final.mp4"
+    assert sorted(parts) == [1, 2, 3]
+    assert stored(s3, "videos/j1/final.mp4") == data
+
+
+def test_upload_process_output(s3):
+    cmd = [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'x' * (6 * 1024 * 1024))"]
+
+    r2_upload.upload_process_output(cmd, "videos/j2/final.mp4", "video/mp4")
+
+    assert stored(s3, "videos/j2/final.mp4") == b"x" * 6 * MIB
+
+
+def test_upload_process_output_failure_aborts(s3):
+    cmd = [sys.executable, "-c", "import sys; sys.stderr.write('boom'); sys.exit(1)"]
+
+    with pytest.raises(RuntimeError, match="boom"):
+        r2_upload.upload_process_output(cmd, "videos/j3/final.mp4", "video/mp4")
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET)
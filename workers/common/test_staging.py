@@ -0,0 +1,140 @@
+"""
+Tests for per-job scratch directories and parallel downloads
+Run: pip install httpx pytest && cd workers/common && python -m pytest -q test_staging.py
+"""
+
+import os
+import threading
+import time
+
+import httpx
+import pytest
+
+import staging
+
+
+@pytest.fixture(autouse=True)
+def input_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "volume-cache"
+    monkeypatch.setattr(staging, "INPUT_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(staging, "_cache_stats", {"hits": 0, "misses": 0})
+    return cache_dir
+
+
+def make_client(handler) -> httpx.Client:
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def test_job_scratch_is_unique_and_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(staging, "SCRATCH_ROOT", str(tmp_path))
+
+    with staging.job_scratch("job/1") as a, staging.job_scratch("job/1") as b:
+        assert a != b
+        open(os.path.join(a, "face.mp4"), "w").close()
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_job_scratch_removed_on_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(staging, "SCRATCH_ROOT", str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        with staging.job_scratch("j2") as work_dir:
+            open(os.path.join(work_dir, "audio.wav"), "w").close()
+            raise RuntimeError("boom")
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_all_runs_in_parallel(tmp_path):
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def handler(request):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return httpx.Response(200, content=request.url.path.encode() * 1000)
+
+    items = [(f"https://cdn.test/img{i}.jpg", str(tmp_path / f"{i:04d}.jpg")) for i in range(6)]
+    summary = staging.download_all(items, concurrency=3, client=make_client(handler))
+
+    assert active["peak"] == 3
+    assert summary["bytes"] == sum(len(f"/img{i}.jpg") * 1000 for i in range(6))
+    assert open(tmp_path / "0002.jpg", "rb").read() == b"/img2.jpg" * 1000
+
+
+def test_failed_download_leaves_no_file(tmp_path):
+    def handler(request):
+        if request.url.path == "/missing.jpg":
+            return httpx.Response(404)
+        return httpx.Response(200, content=b"ok")
+
+    items = [("https://cdn.test/ok.jpg", str(tmp_path / "ok.jpg")), ("https://cdn.test/missing.jpg", str(tmp_path / "missing.jpg"))]
+    with pytest.raises(httpx.HTTPStatusError):
+        staging.download_all(items, client=make_client(handler))
+
+    assert not os.path.exists(tmp_path / "missing.jpg")
+    assert not os.path.exists(tmp_path / "missing.jpg.part")
+
+
+class Origin:
+    """R2-like origin: ETag on every response, 304 when If-None-Match matches"""
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def __call__(self, request):
+        body = self.files[request.url.path]
+        etag = f'"{hash(body)}"'
+        self.requests.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, content=body, headers={"ETag": etag})
+
+
+def test_repeat_url_is_served_from_cache(tmp_path):
+    origin = Origin({"/face.mp4": b"avatar" * 1000})
+    client = make_client(origin)
+    out = tmp_path / "job"
+    out.mkdir()
+
+    first = staging.download_all([("https://cdn.test/face.mp4", str(out / "a.mp4"))], client=client)
+    second = staging.download_all([("https://cdn.test/face.mp4", str(out / "b.mp4"))], client=client)
+
+    assert first["cache_hits"] == 0
+    assert second["cache_hits"] == 1 and second["cache_hit_rate"] == 1.0
+    assert second["worker_cache_hit_rate"] == 0.5
+    assert origin.requests[0] is None and origin.requests[1] is not None
+    assert open(out / "b.mp4", "rb").read() == b"avatar" * 1000
+
+
+def test_changed_etag_refetches(tmp_path):
+    origin = Origin({"/img.jpg": b"v1"})
+    client = make_client(origin)
+
+    staging.download_file("https://cdn.test/img.jpg", str(tmp_path / "1.jpg"), client=client)
+    origin.files["/img.jpg"] = b"v2"
+    size = staging.download_file("https://cdn.test/img.jpg", str(tmp_path / "2.jpg"), client=client)
+
+    assert size == 2
+    assert open(tmp_path / "2.jpg", "rb").read() == b"v2"
+
+
+def test_cache_evicts_least_recently_used(tmp_path, input_cache, monkeypatch):
+    monkeypatch.setattr(staging, "INPUT_CACHE_MAX_BYTES", 2500)
+    origin = Origin({f"/{name}.jpg": name.encode() * 1000 for name in "abc"})
+    client = make_client(origin)
+
+    for name in "abc":
+        staging.download_file(f"https://cdn.test/{name}.jpg", str(tmp_path / f"{name}.jpg"), client=client)
+        time.sleep(0.01)
+
+    # a (oldest) was evicted to fit b and c; it is a miss again
+    assert len(os.listdir(input_cache / "objects")) == 2
+    summary = staging.download_all([(f"https://cdn.test/{name}.jpg", str(tmp_path / f"{name}2.jpg")) for name in "ac"], client=client)
+    assert summary["cache_hits"] == 1
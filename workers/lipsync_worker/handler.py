@@ -2,14 +2,18 @@ import os
 import time
 import traceback
 import subprocess
+from urllib.parse import urlparse
 import runpod
-import boto3
-import httpx
-from botocore.exceptions import ClientError, NoCredentialsError
+
+import lipsync
+from r2_upload import upload_file
+from staging import download_all, download_file, job_scratch
 
 WORKER_VERSION = "v1-wav2lip"
 WAV2LIP_REPO = "https://github.com/Rudrabha/Wav2Lip.git"
 CHECKPOINT_URL = "https://github.com/Rudrabha/Wav2Lip/releases/download/models/wav2lip_gan.pth"
+# TTS uploads Opus/AAC/MP3 by default; ffmpeg picks the demuxer from the extension, so keep it
+AUDIO_EXTENSIONS = {".wav", ".ogg", ".opus", ".m4a", ".aac", ".mp3", ".flac"}
 
 def log(msg: str):
     print(f"[{WORKER_VERSION}] {msg}", flush=True)
@@ -27,24 +31,6 @@ def validate_env():
     if missing:
         raise ValueError(f"Missing env vars: {', '.join(missing)}")
 
-def get_s3_client():
-    return boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_REGION", "auto"),
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-
-def download_file(url: str, output_path: str):
-    log(f"Downloading {url}...")
-    with httpx.stream("GET", url, follow_redirects=True, timeout=300) as resp:
-        resp.raise_for_status()
-        with open(output_path, "wb") as f:
-            for chunk in resp.iter_bytes(chunk_size=8192):
-                f.write(chunk)
-    log(f"Downloaded to {output_path}")
-
 def setup_wav2lip():
     if not os.path.exists("/app/Wav2Lip"):
         log("Cloning Wav2Lip repo...")
@@ -53,60 +39,52 @@ def setup_wav2lip():
     checkpoint_path = "/app/Wav2Lip/checkpoints/wav2lip_gan.pth"
     if not os.path.exists(checkpoint_path):
         os.makedirs("/app/Wav2Lip/checkpoints", exist_ok=True)
+        log(f"Downloading {CHECKPOINT_URL}...")
         download_file(CHECKPOINT_URL, checkpoint_path)
 
-def generate_lipsync(face_url: str, audio_url: str, output_path: str, job):
+def warm_up():
+    """Fetch Wav2Lip and load the model and face detector before accepting jobs"""
+    try:
+        setup_wav2lip()
+        log(f"Wav2Lip loaded in {lipsync.load():.1f}s")
+    except Exception as e:
+        # Don't keep the worker from starting; jobs will retry the load and report the error
+        log(f"Warm-up failed: {e}")
+
+def audio_extension(audio_url: str) -> str:
+    ext = os.path.splitext(urlparse(audio_url).path)[1].lower()
+    return ext if ext in AUDIO_EXTENSIONS else ".wav"
+
+def generate_lipsync(face_url: str, audio_url: str, work_dir: str, output_path: str, job) -> dict:
+    """Runs Wav2Lip in this process (model stays loaded between jobs); returns (per-stage timings, download summary)"""
     log(f"Generating lipsync: face={face_url} audio={audio_url}")
     
     safe_progress(job, 20)
     setup_wav2lip()
     
     safe_progress(job, 40)
-    face_path = "/tmp/face.mp4"
-    audio_path = "/tmp/audio.wav"
+    face_path = os.path.join(work_dir, "face.mp4")
+    audio_path = os.path.join(work_dir, f"audio{audio_extension(audio_url)}")
     
-    download_file(face_url, face_path)
-    download_file(audio_url, audio_path)
+    t0 = time.time()
+    downloads = download_all([(face_url, face_path), (audio_url, audio_path)])
+    download_s = round(time.time() - t0, 2)
     
     safe_progress(job, 60)
     log("Running Wav2Lip inference...")
-    
-    cmd = [
-        "python3", "/app/Wav2Lip/inference.py",
-        "--checkpoint_path", "/app/Wav2Lip/checkpoints/wav2lip_gan.pth",
-        "--face", face_path,
-        "--audio", audio_path,
-        "--outfile", output_path,
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-    if result.returncode != 0:
-        raise RuntimeError(f"Wav2Lip failed: {result.stderr[:2000]}")
+    timings = lipsync.run(face_path, audio_path, output_path)
     
     if not os.path.exists(output_path):
         raise RuntimeError("Lipsync video not created")
     
     size = os.path.getsize(output_path)
-    log(f"Lipsync video created: {size} bytes")
+    log(f"Lipsync video created: {size} bytes {timings}")
+    return {"download_s": download_s, **timings}, downloads
 
 def upload_to_r2(file_path: str, job_id: str) -> str:
-    bucket = os.getenv("R2_BUCKET")
-    public_base = os.getenv("R2_PUBLIC_BASE_URL").rstrip("/")
     key = f"lipsync/{job_id}/final.mp4"
-    
     log(f"Uploading to R2: {key}")
-    
-    s3 = get_s3_client()
-    with open(file_path, "rb") as f:
-        s3.put_object(
-            Bucket=bucket,
-            Key=key,
-            Body=f,
-            ContentType="video/mp4",
-            CacheControl="public, max-age=31536000",
-        )
-    
-    url = f"{public_base}/{key}"
+    url = upload_file(file_path, key, "video/mp4")
     log(f"Upload complete: {url}")
     return url
 
@@ -116,6 +94,12 @@ def handler(job):
         log(f"Job started: {job_id}")
         payload = job.get("input", {}) or {}
         
+        # Pre-warm ping from the backend: boot the worker and load the model, do no work
+        if payload.get("warmup"):
+            setup_wav2lip()
+            lipsync.load()
+            return {"ok": True, "warmup": True, "worker_version": WORKER_VERSION}
+        
         face_url = payload.get("face_url")
         audio_url = payload.get("audio_url")
         
@@ -130,16 +114,14 @@ def handler(job):
         safe_progress(job, 10)
         validate_env()
         
-        output_path = f"/tmp/{job_id}_lipsync.mp4"
-        generate_lipsync(str(face_url), str(audio_url), output_path, job)
-        
-        safe_progress(job, 85)
-        public_url = upload_to_r2(output_path, job_id)
-        
-        try:
-            os.remove(output_path)
-        except Exception:
-            pass
+        with job_scratch(job_id) as work_dir:
+            output_path = os.path.join(work_dir, "lipsync.mp4")
+            timings, downloads = generate_lipsync(str(face_url), str(audio_url), work_dir, output_path, job)
+            
+            safe_progress(job, 85)
+            t0 = time.time()
+            public_url = upload_to_r2(output_path, job_id)
+            timings["upload_s"] = round(time.time() - t0, 2)
         
         safe_progress(job, 100)
         return {
@@ -148,6 +130,8 @@ def handler(job):
             "worker_version": WORKER_VERSION,
             "meta": {
                 "model": "wav2lip-gan",
+                "timings": timings,
+                "input_cache": downloads,
             },
         }
     
@@ -164,4 +148,5 @@ def handler(job):
 
 if __name__ == "__main__":
     log("Wav2Lip worker starting...")
+    warm_up()
     runpod.serverless.start({"handler": handler})
@@ -0,0 +1,327 @@
+"""
+In-process Wav2Lip inference
+The generator checkpoint and the S3FD face detector are loaded once per process and stay on the GPU;
+a job only reads frames, detects faces, runs the generator and encodes. Follows the defaults of
+Wav2Lip's inference.py (pads 0/10/0/0, 5-frame box smoothing, 96px faces, generator batch 128).
+
+Face boxes are cached on the network volume keyed by the sha256 of the face video, so an avatar that
+is lip-synced against many audio tracks is only run through the detector once (FACE_CACHE_DIR,
+least recently used entries evicted past FACE_CACHE_MAX_MB; 0 disables the cache).
+"""
+
+import os
+import sys
+import hashlib
+import subprocess
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+WAV2LIP_DIR = os.getenv("WAV2LIP_DIR", "/app/Wav2Lip")
+CHECKPOINT_PATH = os.path.join(WAV2LIP_DIR, "checkpoints", "wav2lip_gan.pth")
+
+IMG_SIZE = 96
+MEL_STEP_SIZE = 16
+PADS = (0, 10, 0, 0)  # top, bottom, left, right
+SMOOTH_WINDOW = 5
+FACE_DET_BATCH_SIZE = int(os.getenv("FACE_DET_BATCH_SIZE", "16"))
+WAV2LIP_BATCH_SIZE = int(os.getenv("WAV2LIP_BATCH_SIZE", "128"))
+OUTPUT_CRF = os.getenv("LIPSYNC_CRF", "18")
+OUTPUT_PRESET = os.getenv("LIPSYNC_PRESET", "medium")
+FACE_CACHE_DIR = os.getenv("FACE_CACHE_DIR", "/runpod-volume/face-cache")
+FACE_CACHE_MAX_BYTES = int(float(os.getenv("FACE_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+Box = Tuple[int, int, int, int]  # y1, y2, x1, x2
+
+_lock = threading.Lock()
+_state = {"model": None, "detector": None, "device": None}
+
+
+def load() -> float:
+    """Load the generator and face detector on first use; returns the seconds spent (0.0 once loaded)"""
+    with _lock:
+        if _state["model"] is not None:
+            return 0.0
+        t0 = time.time()
+        if WAV2LIP_DIR not in sys.path:
+            sys.path.insert(0, WAV2LIP_DIR)
+        import torch  # type: ignore
+        import face_detection  # type: ignore  # from the Wav2Lip repo
+        from models import Wav2Lip  # type: ignore
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        checkpoint = torch.load(CHECKPOINT_PATH, map_location=device)
+        state_dict = {k.replace("module.", ""): v for k, v in checkpoint["state_dict"].items()}
+        model = Wav2Lip()
+        model.load_state_dict(state_dict)
+        _state["model"] = model.to(device).eval()
+        _state["detector"] = face_detection.FaceAlignment(
+            face_detection.LandmarksType._2D, flip_input=False, device=device,
+        )
+        _state["device"] = device
+        return time.time() - t0
+
+
+def read_frames(video_path: str) -> Tuple[List[np.ndarray], float]:
+    """All frames of the face video (BGR, as cv2 decodes them) and its frame rate"""
+    import cv2  # type: ignore
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"No frames could be read from {os.path.basename(video_path)}")
+    return frames, fps
+
+
+def mel_chunks(audio_path: str, fps: float) -> List[np.ndarray]:
+    """One 80x16 mel window per output video frame"""
+    import audio  # type: ignore  # from the Wav2Lip repo
+
+    if not audio_path.endswith(".wav"):
+        wav_path = f"{audio_path}.wav"
+        result = subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", audio_path, wav_path], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg audio conversion failed: {result.stderr.strip()[-500:]}")
+        audio_path = wav_path
+
+    mel = audio.melspectrogram(audio.load_wav(audio_path, 16000))
+    if np.isnan(mel.reshape(-1)).sum() > 0:
+        raise RuntimeError("Mel spectrogram contains NaN; try adding a small epsilon of noise to the audio")
+
+    chunks = []
+    step = 80.0 / fps
+    i = 0
+    while True:
+        start = int(i * step)
+        if start + MEL_STEP_SIZE > mel.shape[1]:
+            chunks.append(mel[:, mel.shape[1] - MEL_STEP_SIZE:])
+            return chunks
+        chunks.append(mel[:, start:start + MEL_STEP_SIZE])
+        i += 1
+
+
+def smooth_boxes(boxes: np.ndarray, window: int = SMOOTH_WINDOW) -> np.ndarray:
+    """Average each box with its following frames so the crop doesn't jitter"""
+    smoothed = boxes.astype(np.float64)
+    for i in range(len(boxes)):
+        span = boxes[len(boxes) - window:] if i + window > len(boxes) else boxes[i:i + window]
+        smoothed[i] = np.mean(span, axis=0)
+    return smoothed
+
+
+def detect_faces(frames: List[np.ndarray]) -> np.ndarray:
+    """Padded face box per frame (before smoothing); the detector batch is halved on CUDA OOM"""
+    detector = _state["detector"]
+    batch_size = FACE_DET_BATCH_SIZE
+    while True:
+        try:
+            rects = []
+            for i in range(0, len(frames), batch_size):
+                rects.extend(detector.get_detections_for_batch(np.array(frames[i:i + batch_size])))
+            break
+        except RuntimeError as e:
+            if batch_size == 1:
+                raise RuntimeError("Face video too large for GPU face detection") from e
+            batch_size //= 2
+
+    pad_top, pad_bottom, pad_left, pad_right = PADS
+    boxes = []
+    for i, (rect, frame) in enumerate(zip(rects, frames)):
+        if rect is None:
+            raise RuntimeError(f"Face not detected in frame {i}; the face video needs a visible face in every frame")
+        height, width = frame.shape[:2]
+        boxes.append([
+            max(0, rect[1] - pad_top), min(height, rect[3] + pad_bottom),
+            max(0, rect[0] - pad_left), min(width, rect[2] + pad_right),
+        ])
+    return np.array(boxes, dtype=np.int32)
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_path(digest: str) -> str:
+    # Padding is baked into the stored boxes, so it is part of the key
+    return os.path.join(FACE_CACHE_DIR, f"{digest}-{'_'.join(map(str, PADS))}.npy")
+
+
+def load_cached_boxes(digest: str, num_frames: int):
+    """Cached boxes covering at least num_frames, or None"""
+    path = _cache_path(digest)
+    try:
+        boxes = np.load(path)
+    except (OSError, ValueError):
+        return None
+    if len(boxes) < num_frames:
+        return None  # cached from a shorter audio track; detect again and store the longer run
+    try:
+        os.utime(path)  # mtime is the LRU clock
+    except OSError:
+        pass
+    return boxes
+
+
+def store_cached_boxes(digest: str, boxes: np.ndarray):
+    """Write atomically (other workers share the volume), then evict down to FACE_CACHE_MAX_BYTES"""
+    path = _cache_path(digest)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(FACE_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.save(f, boxes)
+        os.replace(tmp_path, path)
+        evict_face_cache()
+    except OSError:
+        # The cache is an optimization; a missing or full volume must not fail the job
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def evict_face_cache(max_bytes: int = None):
+    max_bytes = FACE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for name in os.listdir(FACE_CACHE_DIR):
+        if not name.endswith(".npy"):
+            continue
+        try:
+            st = os.stat(os.path.join(FACE_CACHE_DIR, name))
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(FACE_CACHE_DIR, name))
+        except OSError:
+            pass
+        total -= size
+
+
+def face_boxes(face_path: str, frames: List[np.ndarray]) -> Tuple[List[Box], bool]:
+    """Smoothed box per frame, from the cache when this face video was seen before; returns (boxes, cache_hit)"""
+    digest = file_digest(face_path) if FACE_CACHE_MAX_BYTES > 0 else None
+    boxes = load_cached_boxes(digest, len(frames)) if digest else None
+    hit = boxes is not None
+    if not hit:
+        boxes = detect_faces(frames)
+        if digest:
+            store_cached_boxes(digest, boxes)
+    return [tuple(int(v) for v in box) for box in smooth_boxes(boxes[:len(frames)])], hit
+
+
+class _Encoder:
+    """BGR frames piped into ffmpeg and muxed with the job's audio in one pass"""
+
+    def __init__(self, output_path: str, audio_path: str, fps: float, width: int, height: int):
+        self._proc = subprocess.Popen([
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+            "-i", audio_path,
+            "-map", "0:v", "-map", "1:a", "-shortest",
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", "libx264", "-crf", OUTPUT_CRF, "-preset", OUTPUT_PRESET, "-pix_fmt", "yuv420p",
+            # Fixed AAC rate whatever the input audio (22 kHz WAV, 48 kHz Opus, ...) so the stitcher's
+            # stream-copy concat of scene clips sees identical audio parameters
+            "-c:a", "aac", "-ar", "48000", "-movflags", "+faststart", output_path,
+        ], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame: np.ndarray):
+        try:
+            self._proc.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited early: {self._proc.stderr.read().decode(errors='replace')[-500:]}")
+
+    def close(self):
+        self._proc.stdin.close()
+        stderr = self._proc.stderr.read().decode(errors="replace").strip()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg encode failed: {stderr[-500:]}")
+
+    def abort(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+
+
+def run(face_path: str, audio_path: str, output_path: str) -> Dict[str, float]:
+    """Lip-sync face_path to audio_path into output_path; returns per-stage timings in seconds (and face_cache_hit)"""
+    import cv2  # type: ignore
+    import torch  # type: ignore
+
+    timings = {"load_s": round(load(), 2)}
+    model, device = _state["model"], _state["device"]
+
+    t0 = time.time()
+    frames, fps = read_frames(face_path)
+    mels = mel_chunks(audio_path, fps)
+    frames = frames[:len(mels)]
+    timings["prepare_s"] = round(time.time() - t0, 2)
+
+    t0 = time.time()
+    boxes, timings["face_cache_hit"] = face_boxes(face_path, frames)
+    timings["detect_s"] = round(time.time() - t0, 2)
+
+    height, width = frames[0].shape[:2]
+    encoder = _Encoder(output_path, audio_path, fps, width, height)
+    infer_s = encode_s = 0.0
+    try:
+        for start in range(0, len(mels), WAV2LIP_BATCH_SIZE):
+            t0 = time.time()
+            idx = [i % len(frames) for i in range(start, min(start + WAV2LIP_BATCH_SIZE, len(mels)))]
+            faces = []
+            for i in idx:
+                y1, y2, x1, x2 = boxes[i]
+                faces.append(cv2.resize(frames[i][y1:y2, x1:x2], (IMG_SIZE, IMG_SIZE)))
+            faces = np.stack(faces)
+            masked = faces.copy()
+            masked[:, IMG_SIZE // 2:] = 0  # the generator fills in the lower half
+            img_batch = np.concatenate((masked, faces), axis=3) / 255.0
+            mel_batch = np.stack(mels[start:start + len(idx)])[..., np.newaxis]
+
+            with torch.no_grad():
+                pred = model(
+                    torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(device),
+                    torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(device),
+                )
+            pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.0
+
+            out_frames = []
+            for p, i in zip(pred, idx):
+                y1, y2, x1, x2 = boxes[i]
+                frame = frames[i].copy()
+                frame[y1:y2, x1:x2] = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
+                out_frames.append(frame)
+            infer_s += time.time() - t0
+
+            t0 = time.time()
+            for frame in out_frames:
+                encoder.write(frame)
+            encode_s += time.time() - t0
+
+        t0 = time.time()
+        encoder.close()
+        encode_s += time.time() - t0
+    except Exception:
+        encoder.abort()
+        raise
+
+    timings["infer_s"] = round(infer_s, 2)
+    timings["encode_s"] = round(encode_s, 2)
+    return timings
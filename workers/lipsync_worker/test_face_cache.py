@@ -0,0 +1,98 @@
+"""
+Tests for the face box cache and box smoothing (no GPU or Wav2Lip checkout needed)
+Run: cd workers/lipsync_worker && python -m pytest -q test_face_cache.py
+"""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+import lipsync
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(lipsync, "FACE_CACHE_DIR", str(tmp_path / "face-cache"))
+    monkeypatch.setattr(lipsync, "FACE_CACHE_MAX_BYTES", 1024 * 1024)
+    return tmp_path / "face-cache"
+
+
+@pytest.fixture
+def detector(tmp_path, monkeypatch):
+    """Counts detector runs; every frame gets the same box"""
+    calls = []
+
+    def detect_faces(frames):
+        calls.append(len(frames))
+        return np.tile(np.array([10, 60, 20, 70], dtype=np.int32), (len(frames), 1))
+
+    monkeypatch.setattr(lipsync, "detect_faces", detect_faces)
+    face_path = tmp_path / "avatar.mp4"
+    face_path.write_bytes(b"same face video")
+    return calls, str(face_path)
+
+
+def frames(n):
+    return [np.zeros((80, 80, 3), dtype=np.uint8)] * n
+
+
+def test_second_run_on_the_same_face_video_is_a_hit(detector):
+    calls, face_path = detector
+
+    boxes, hit = lipsync.face_boxes(face_path, frames(10))
+    again, hit_again = lipsync.face_boxes(face_path, frames(10))
+
+    assert (hit, hit_again) == (False, True)
+    assert calls == [10]
+    assert again == boxes == [(10, 60, 20, 70)] * 10
+
+
+def test_shorter_cached_run_is_a_miss_and_is_replaced(detector):
+    calls, face_path = detector
+
+    lipsync.face_boxes(face_path, frames(5))
+    _, hit = lipsync.face_boxes(face_path, frames(8))
+    _, hit_shorter = lipsync.face_boxes(face_path, frames(6))
+
+    assert hit is False and hit_shorter is True
+    assert calls == [5, 8]
+    assert len(lipsync.load_cached_boxes(lipsync.file_digest(face_path), 8)) == 8
+
+
+def test_eviction_drops_least_recently_used(cache_dir):
+    boxes = np.zeros((100, 4), dtype=np.int32)
+    digests = ["a" * 64, "b" * 64, "c" * 64]
+    now = time.time()
+    for age, digest in zip([300, 200, 100], digests):
+        lipsync.store_cached_boxes(digest, boxes)
+        os.utime(lipsync._cache_path(digest), (now - age, now - age))
+    assert lipsync.load_cached_boxes(digests[0], 100) is not None  # touch the oldest so "b" becomes LRU
+
+    entry_size = os.path.getsize(lipsync._cache_path(digests[0]))
+    lipsync.evict_face_cache(max_bytes=2 * entry_size)
+
+    assert lipsync.load_cached_boxes(digests[0], 100) is not None
+    assert lipsync.load_cached_boxes(digests[1], 100) is None
+    assert lipsync.load_cached_boxes(digests[2], 100) is not None
+
+
+def test_disabled_cache_always_detects_and_writes_nothing(detector, cache_dir, monkeypatch):
+    calls, face_path = detector
+    monkeypatch.setattr(lipsync, "FACE_CACHE_MAX_BYTES", 0)  # FACE_CACHE_MAX_MB=0
+
+    hits = [lipsync.face_boxes(face_path, frames(4))[1] for _ in range(2)]
+
+    assert hits == [False, False]
+    assert calls == [4, 4]
+    assert not cache_dir.exists()
+
+
+def test_smoothing_averages_each_box_with_the_following_window():
+    boxes = np.array([[0, 0, 0, 0], [10, 10, 10, 10], [20, 20, 20, 20], [30, 30, 30, 30]], dtype=np.int32)
+
+    smoothed = lipsync.smooth_boxes(boxes, window=2)
+
+    assert smoothed[:, 0].tolist() == [5, 15, 25, 25]  # the last frame reuses the final full window
+    assert lipsync.smooth_boxes(boxes, window=1).tolist() == boxes.tolist()
@@ -0,0 +1,86 @@
+"""
+LoRA dataset preprocessing (CPU, before the trainer starts)
+Images are decoded in a process pool, EXIF-rotated, center-cropped to a square, resized to the
+training resolution and written as JPEG with a caption .txt beside each one (the config's caption_ext).
+Near-duplicates are dropped by 64-bit difference hash (dHash), so no GPU steps go to oversized or
+repeated samples; the returned report says what was filtered and why.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+TRAIN_RESOLUTION = int(os.getenv("TRAIN_RESOLUTION", "1024"))
+MIN_IMAGE_SIDE = int(os.getenv("MIN_IMAGE_SIDE", "256"))
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "6"))  # max differing dHash bits to count as a duplicate
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "0")) or os.cpu_count() or 1
+JPEG_QUALITY = 95
+
+
+def dhash(image, size: int = 8) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a (size+1)x size grayscale thumbnail"""
+    from PIL import Image  # type: ignore
+    gray = image.convert("L").resize((size + 1, size), Image.LANCZOS)
+    px = list(gray.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            i = row * (size + 1) + col
+            bits = (bits << 1) | int(px[i] > px[i + 1])
+    return bits
+
+
+def process_image(src: str, dst: str, resolution: int, min_side: int) -> dict:
+    """Pool worker: decode, crop and resize src into dst; returns its hash, or why it was rejected"""
+    from PIL import Image, ImageOps  # type: ignore
+    try:
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im).convert("RGB")
+    except Exception as e:
+        return {"ok": False, "reason": "unreadable", "error": str(e)[:200]}
+
+    width, height = im.size
+    if min(width, height) < min_side:
+        return {"ok": False, "reason": "too_small", "size": [width, height]}
+
+    side = min(width, height)
+    left, top = (width - side) // 2, (height - side) // 2
+    im = im.crop((left, top, left + side, top + side))
+    if side != resolution:
+        im = im.resize((resolution, resolution), Image.LANCZOS)
+    im.save(dst, "JPEG", quality=JPEG_QUALITY)
+    return {"ok": True, "hash": dhash(im), "size": [width, height]}
+
+
+def preprocess(raw_paths: List[str], dataset_dir: str, captions: List[str],
+               resolution: int = TRAIN_RESOLUTION, workers: int = PREPROCESS_WORKERS) -> dict:
+    """
+    Turn downloaded images into the trainer's dataset folder (NNNN.jpg + NNNN.txt).
+    Indices in the report refer to positions in raw_paths (i.e. the job's image list).
+    """
+    t0 = time.time()
+    os.makedirs(dataset_dir, exist_ok=True)
+    n = len(raw_paths)
+    outputs = [os.path.join(dataset_dir, f"{i:04d}.jpg") for i in range(n)]
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, n))) as pool:
+        results = list(pool.map(process_image, raw_paths, outputs, [resolution] * n, [MIN_IMAGE_SIDE] * n))
+
+    report = {"input": n, "kept": 0, "resolution": resolution, "unreadable": [], "too_small": [], "duplicates": []}
+    kept = []  # (index, hash), in input order so the first copy of a duplicate wins
+    for i, (result, output_path, caption) in enumerate(zip(results, outputs, captions)):
+        if not result["ok"]:
+            report[result["reason"]].append(i)
+            continue
+        duplicate_of = next((j for j, h in kept if bin(h ^ result["hash"]).count("1") <= DEDUP_MAX_DISTANCE), None)
+        if duplicate_of is not None:
+            os.remove(output_path)
+            report["duplicates"].append({"index": i, "duplicate_of": duplicate_of})
+            continue
+        kept.append((i, result["hash"]))
+        with open(os.path.splitext(output_path)[0] + ".txt", "w") as f:
+            f.write(caption)
+
+    report["kept"] = len(kept)
+    report["preprocess_s"] = round(time.time() - t0, 2)
+    return report
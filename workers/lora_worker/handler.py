@@ -1,13 +1,24 @@
 import os
+import json
 import time
+import shutil
+import zipfile
+import hashlib
 import traceback
-import subprocess
 import runpod
-import boto3
-import httpx
-from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor
+
+from dataset import preprocess, TRAIN_RESOLUTION
+from botocore.exceptions import ClientError
+from r2_upload import get_s3_client, upload_file
+from staging import download_all, job_scratch
+from trainer import CHECKPOINT_RE, find_checkpoints, run_trainer
 
 WORKER_VERSION = "v1-lora-trainer"
+MIN_TRAIN_IMAGES = 5
+TRAIN_STEPS = 1000
+SAVE_EVERY = 250
+TRAIN_TIMEOUT = int(os.getenv("TRAIN_TIMEOUT", "3600"))
 
 def log(msg: str):
     print(f"[{WORKER_VERSION}] {msg}", flush=True)
@@ -25,46 +36,15 @@ def validate_env():
     if missing:
         raise ValueError(f"Missing env vars: {', '.join(missing)}")
 
-def get_s3_client():
-    return boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_REGION", "auto"),
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-
-def download_file(url: str, output_path: str):
-    log(f"Downloading {url}...")
-    with httpx.stream("GET", url, follow_redirects=True, timeout=300) as resp:
-        resp.raise_for_status()
-        with open(output_path, "wb") as f:
-            for chunk in resp.iter_bytes(chunk_size=8192):
-                f.write(chunk)
-
-def train_lora(image_urls: list, name: str, output_dir: str, job):
-    log(f"Training LoRA: name={name} images={len(image_urls)}")
-    
-    safe_progress(job, 20)
-    dataset_dir = "/tmp/dataset"
-    os.makedirs(dataset_dir, exist_ok=True)
-    
-    # Download training images
-    for i, url in enumerate(image_urls):
-        img_path = f"{dataset_dir}/{i:04d}.jpg"
-        download_file(url, img_path)
-    
-    safe_progress(job, 40)
-    log(f"Downloaded {len(image_urls)} images")
-    
-    # Create training config
-    config = f"""
+def training_config(name: str, dataset_dir: str, output_dir: str) -> str:
+    """AI-Toolkit job config"""
+    return f"""
 job: extension
 config:
   name: {name}
   process:
     - type: sd_trainer
-      training_folder: {dataset_dir}
+      training_folder: {output_dir}
       device: cuda:0
       network:
         type: lora
@@ -72,15 +52,16 @@ config:
         linear_alpha: 16
       save:
         dtype: float16
-        save_every: 250
+        save_every: {SAVE_EVERY}
         max_step_saves_to_keep: 1
       datasets:
         - folder_path: {dataset_dir}
           caption_ext: txt
           caption_dropout_rate: 0.05
+          resolution: [{TRAIN_RESOLUTION}]
       train:
         batch_size: 1
-        steps: 1000
+        steps: {TRAIN_STEPS}
         gradient_accumulation_steps: 1
         train_unet: true
         train_text_encoder: false
@@ -91,9 +72,9 @@ config:
         is_flux: false
       sample:
         sampler: ddpm
-        sample_every: 250
-        width: 1024
-        height: 1024
+        sample_every: {SAVE_EVERY}
+        width: {TRAIN_RESOLUTION}
+        height: {TRAIN_RESOLUTION}
         prompts:
           - {name} portrait
         neg: ""
@@ -102,54 +83,211 @@ config:
         guidance_scale: 7
         sample_steps: 20
 """
+
+def run_fingerprint(dataset_dir: str, name: str) -> str:
+    """Hash of the preprocessed dataset (images + captions) and the training config, minus job paths"""
+    h = hashlib.sha256(training_config(name, "", "").encode())
+    for file_name in sorted(os.listdir(dataset_dir)):
+        h.update(file_name.encode())
+        with open(os.path.join(dataset_dir, file_name), "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    return h.hexdigest()[:32]
+
+def run_prefix(run_id: str) -> str:
+    return f"lora/runs/{run_id}"
+
+def optimizer_ready(optimizer_path: str, checkpoint_path: str) -> bool:
+    """optimizer.pt belongs to this save (not an older one) and torch finished writing it (the zip has its end record)"""
+    try:
+        return (os.path.getmtime(optimizer_path) >= os.path.getmtime(checkpoint_path)
+                and zipfile.is_zipfile(optimizer_path))
+    except OSError:
+        return False
+
+def checkpoint_optimizer_ready(checkpoint_path: str) -> bool:
+    """AI-Toolkit writes optimizer.pt after the .safetensors; the trainer watcher holds a save until this is true"""
+    return optimizer_ready(os.path.join(os.path.dirname(checkpoint_path), "optimizer.pt"), checkpoint_path)
+
+def snapshot_optimizer(path: str, step: int):
+    """
+    Copy this save's optimizer.pt aside so the next save can't overwrite it mid-upload; None when it isn't
+    this save's (not written yet, or a later save has started replacing it)
+    """
+    save_dir = os.path.dirname(path)
+    if not checkpoint_optimizer_ready(path) or any(later > step for later in find_checkpoints(save_dir)):
+        return None
+    snapshot = f"{path}.optimizer.pt"
+    shutil.copyfile(os.path.join(save_dir, "optimizer.pt"), snapshot)
+    if zipfile.is_zipfile(snapshot) and not any(later > step for later in find_checkpoints(save_dir)):
+        return snapshot
+    os.remove(snapshot)
+    return None
+
+def upload_checkpoint(run_id: str, path: str, step: int, job_id: str, optimizer_path: str = None) -> str:
+    """Upload a save (plus its optimizer state snapshot, if any) and point the run's latest.json at it"""
+    prefix = run_prefix(run_id)
+    file_name = os.path.basename(path)
+    url = upload_file(path, f"{prefix}/{file_name}", "application/octet-stream")
+    state = {"step": step, "file": file_name, "job_id": job_id, "updated_at": time.time()}
+    
+    if optimizer_path:
+        try:
+            state["optimizer"] = f"optimizer_{step:09d}.pt"
+            upload_file(optimizer_path, f"{prefix}/{state['optimizer']}", "application/octet-stream")
+        finally:
+            os.remove(optimizer_path)
+    
+    state_path = f"{path}.latest.json"
+    with open(state_path, "w") as f:
+        json.dump(state, f)
+    try:
+        upload_file(state_path, f"{prefix}/latest.json", "application/json", cache_control="no-store")
+    finally:
+        os.remove(state_path)
+    return url
+
+def restore_checkpoint(run_id: str, save_root: str) -> int:
+    """
+    Put the run's latest uploaded checkpoint (and optimizer state) where AI-Toolkit looks for saves,
+    so it resumes from there. Returns the step restored, 0 when starting fresh.
+    """
+    prefix = run_prefix(run_id)
+    bucket = os.getenv("R2_BUCKET")
+    s3 = get_s3_client()
+    try:
+        state = json.loads(s3.get_object(Bucket=bucket, Key=f"{prefix}/latest.json")["Body"].read())
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            log(f"Checkpoint lookup for run {run_id} failed, starting fresh: {e}")
+        return 0
+    
+    os.makedirs(save_root, exist_ok=True)
+    try:
+        s3.download_file(bucket, f"{prefix}/{state['file']}", os.path.join(save_root, state["file"]))
+        if state.get("optimizer"):
+            s3.download_file(bucket, f"{prefix}/{state['optimizer']}", os.path.join(save_root, "optimizer.pt"))
+    except Exception as e:
+        # Resuming is an optimization; a half-restored run must not reach the trainer
+        log(f"Checkpoint restore for run {run_id} failed, starting fresh: {e}")
+        shutil.rmtree(save_root, ignore_errors=True)
+        return 0
+    log(f"Resuming run {run_id} from step {state['step']} (uploaded by job {state.get('job_id')})")
+    return int(state["step"])
+
+def train_lora(image_urls: list, name: str, work_dir: str, job, captions: list = None):
+    log(f"Training LoRA: name={name} images={len(image_urls)}")
+    
+    safe_progress(job, 20)
+    raw_dir = os.path.join(work_dir, "raw")
+    dataset_dir = os.path.join(work_dir, "dataset")
+    output_dir = os.path.join(work_dir, "output")
+    os.makedirs(raw_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
     
-    config_path = "/tmp/train_config.yaml"
+    # Download training images in parallel
+    t0 = time.time()
+    raw_paths = [os.path.join(raw_dir, f"{i:04d}") for i in range(len(image_urls))]
+    downloads = download_all(zip(image_urls, raw_paths))
+    
+    safe_progress(job, 35)
+    log(f"Downloaded {len(image_urls)} images ({downloads['bytes'] / 1024 / 1024:.1f} MB, {downloads['cache_hits']} from cache) in {time.time() - t0:.1f}s")
+    
+    # Decode, crop/resize, dedup and caption on CPU so the trainer only sees usable samples
+    dataset = preprocess(raw_paths, dataset_dir, captions or [name] * len(image_urls))
+    log(f"Preprocessed dataset: kept {dataset['kept']}/{dataset['input']} "
+        f"(duplicates={len(dataset['duplicates'])} unreadable={len(dataset['unreadable'])} "
+        f"too_small={len(dataset['too_small'])}) in {dataset['preprocess_s']}s")
+    if dataset["kept"] < MIN_TRAIN_IMAGES:
+        raise RuntimeError(f"Only {dataset['kept']} usable training images after preprocessing, need {MIN_TRAIN_IMAGES}: {dataset}")
+    
+    safe_progress(job, 40)
+    
+    # Same images + same config = same run, so a retry resumes the last uploaded checkpoint
+    save_root = os.path.join(output_dir, name)  # AI-Toolkit saves into <training_folder>/<name>
+    run_id = run_fingerprint(dataset_dir, name)
+    resumed_from = restore_checkpoint(run_id, save_root)
+    
+    config = training_config(name, dataset_dir, output_dir)
+    
+    config_path = os.path.join(work_dir, "train_config.yaml")
     with open(config_path, "w") as f:
         f.write(config)
     
     safe_progress(job, 50)
     log("Starting LoRA training...")
     
-    # Run AI-Toolkit training
+    # Run AI-Toolkit training; progress 50-90 follows the trainer's step counter
     cmd = [
         "python3", "-m", "toolkit.job",
         "--config", config_path,
         "--output_dir", output_dir,
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
-    if result.returncode != 0:
-        raise RuntimeError(f"Training failed: {result.stderr[:2000]}")
+    last = {"pct": 50, "logged": 0.0}
+    
+    def on_progress(step: int, total: int, loss):
+        pct = 50 + 40 * step // total
+        if pct != last["pct"]:
+            last["pct"] = pct
+            safe_progress(job, pct)
+        if time.time() - last["logged"] >= 30 or step == total:
+            last["logged"] = time.time()
+            log(f"Step {step}/{total} loss={loss}")
+    
+    # Checkpoints go up in the background so a timeout or preemption keeps the finished steps
+    job_id = job.get("id", name)
+    checkpoint_uploads = {}
+    uploader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-upload")
+    
+    def on_checkpoint(path: str, step: int):
+        optimizer_path = snapshot_optimizer(path, step)
+        log(f"Checkpoint at step {step}{'' if optimizer_path else ' (without optimizer state)'}, uploading to {run_prefix(run_id)}")
+        checkpoint_uploads[step] = uploader.submit(upload_checkpoint, run_id, path, step, job_id, optimizer_path)
+    
+    try:
+        training = run_trainer(cmd, output_dir, on_progress, on_checkpoint, TRAIN_TIMEOUT,
+                               total_steps=TRAIN_STEPS, skip_steps=[resumed_from] if resumed_from else (),
+                               checkpoint_ready=checkpoint_optimizer_ready)
+    finally:
+        uploader.shutdown(wait=True)
+        checkpoints = {}
+        for step, future in sorted(checkpoint_uploads.items()):
+            try:
+                checkpoints[step] = future.result()
+            except Exception as e:
+                log(f"Checkpoint upload for step {step} failed (ignored): {e}")
     
     safe_progress(job, 90)
     
-    # Find output LoRA file
-    lora_files = [f for f in os.listdir(output_dir) if f.endswith(".safetensors")]
+    # Final LoRA: the newest .safetensors without a step suffix
+    lora_files = [
+        os.path.join(root, f)
+        for root, _, files in os.walk(output_dir)
+        for f in files
+        if f.endswith(".safetensors") and not CHECKPOINT_RE.search(f)
+    ]
     if not lora_files:
         raise RuntimeError("No LoRA file generated")
     
-    lora_path = os.path.join(output_dir, lora_files[0])
+    lora_path = max(lora_files, key=os.path.getmtime)
     log(f"LoRA trained: {lora_path}")
-    return lora_path
+    return lora_path, {
+        "input_cache": downloads,
+        "dataset": dataset,
+        "training": {
+            "run_id": run_id,
+            "resumed_from_step": resumed_from,
+            "steps": training["step"],
+            "final_loss": training["loss"],
+            "checkpoints": [checkpoints[step] for step in sorted(checkpoints)],
+        },
+    }
 
 def upload_to_r2(file_path: str, job_id: str) -> str:
-    bucket = os.getenv("R2_BUCKET")
-    public_base = os.getenv("R2_PUBLIC_BASE_URL").rstrip("/")
     key = f"lora/{job_id}/adapter.safetensors"
-    
     log(f"Uploading to R2: {key}")
-    
-    s3 = get_s3_client()
-    with open(file_path, "rb") as f:
-        s3.put_object(
-            Bucket=bucket,
-            Key=key,
-            Body=f,
-            ContentType="application/octet-stream",
-            CacheControl="public, max-age=31536000",
-        )
-    
-    url = f"{public_base}/{key}"
+    url = upload_file(file_path, key, "application/octet-stream")
     log(f"Upload complete: {url}")
     return url
 
@@ -159,26 +297,42 @@ def handler(job):
         log(f"Job started: {job_id}")
         payload = job.get("input", {}) or {}
         
+        # Pre-warm ping from the backend: boot the worker, do no work
+        if payload.get("warmup"):
+            return {"ok": True, "warmup": True, "worker_version": WORKER_VERSION}
+        
         image_urls = payload.get("images", [])
         name = payload.get("name", "subject")
+        captions = payload.get("captions")  # optional, one per image; defaults to the name
         
-        if not image_urls or len(image_urls) < 5:
+        if not image_urls or len(image_urls) < MIN_TRAIN_IMAGES:
+            return {
+                "ok": False,
+                "error_code": "invalid_input",
+                "error_message": f"Need at least {MIN_TRAIN_IMAGES} training images",
+                "worker_version": WORKER_VERSION,
+            }
+        if captions is not None and (not isinstance(captions, list) or len(captions) != len(image_urls)):
             return {
                 "ok": False,
                 "error_code": "invalid_input",
-                "error_message": "Need at least 5 training images",
+                "error_message": "captions must have one entry per image",
+                "worker_version": WORKER_VERSION,
+            }
+        if captions is not None and not all(isinstance(c, str) for c in captions):
+            return {
+                "ok": False,
+                "error_code": "invalid_input",
+                "error_message": "captions must be strings",
                 "worker_version": WORKER_VERSION,
             }
         
         safe_progress(job, 10)
         validate_env()
         
-        output_dir = f"/tmp/{job_id}_output"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        lora_path = train_lora(image_urls, name, output_dir, job)
-        
-        public_url = upload_to_r2(lora_path, job_id)
+        with job_scratch(job_id) as work_dir:
+            lora_path, report = train_lora(image_urls, name, work_dir, job, captions)
+            public_url = upload_to_r2(lora_path, job_id)
         
         safe_progress(job, 100)
         return {
@@ -187,7 +341,8 @@ def handler(job):
             "worker_version": WORKER_VERSION,
             "meta": {
                 "model": "sdxl-lora",
-                "steps": 1000,
+                "steps": TRAIN_STEPS,
+                **report,
             },
         }
     
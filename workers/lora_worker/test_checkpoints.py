@@ -0,0 +1,127 @@
+"""
+Tests for LoRA run fingerprints and checkpoint upload/resume against moto's in-process S3
+Run: pip install "moto[s3]" pytest && cd workers/lora_worker && python -m pytest -q test_checkpoints.py
+"""
+
+import json
+import os
+import sys
+import time
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))  # r2_upload, staging
+
+boto3 = pytest.importorskip("boto3")
+mock_aws = pytest.importorskip("moto").mock_aws
+pytest.importorskip("runpod")
+
+import handler  # noqa: E402
+import r2_upload  # noqa: E402
+
+BUCKET = "test-bucket"
+RUN_ID = "run0123"
+
+
+@pytest.fixture(autouse=True)
+def s3(monkeypatch):
+    monkeypatch.setenv("R2_BUCKET", BUCKET)
+    monkeypatch.setenv("R2_PUBLIC_BASE_URL", "https://cdn.example.com/")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+    monkeypatch.setattr(r2_upload, "_client", None)
+    monkeypatch.setattr(r2_upload.time, "sleep", lambda s: None)
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield r2_upload.get_s3_client()
+
+
+def latest(s3) -> dict:
+    return json.loads(s3.get_object(Bucket=BUCKET, Key=f"lora/runs/{RUN_ID}/latest.json")["Body"].read())
+
+
+def save(save_dir, step: int, with_optimizer: bool = True) -> str:
+    """An AI-Toolkit save: the .safetensors, then optimizer.pt (a torch zip) written after it"""
+    os.makedirs(save_dir, exist_ok=True)
+    path = os.path.join(save_dir, f"bob_{step:09d}.safetensors")
+    with open(path, "wb") as f:
+        f.write(f"weights {step}".encode())
+    if with_optimizer:
+        later = time.time() + 1
+        with zipfile.ZipFile(os.path.join(save_dir, "optimizer.pt"), "w") as z:
+            z.writestr("data.pkl", f"optimizer {step}")
+        os.utime(os.path.join(save_dir, "optimizer.pt"), (later, later))
+    return path
+
+
+def test_fingerprint_follows_dataset_content(tmp_path):
+    dataset_dir = tmp_path / "dataset"
+    dataset_dir.mkdir()
+    (dataset_dir / "0000.jpg").write_bytes(b"jpeg")
+    (dataset_dir / "0000.txt").write_text("bob")
+
+    run_id = handler.run_fingerprint(str(dataset_dir), "bob")
+    assert run_id == handler.run_fingerprint(str(dataset_dir), "bob")
+    assert run_id != handler.run_fingerprint(str(dataset_dir), "alice")  # name is in the config
+    (dataset_dir / "0000.txt").write_text("bob smiling")
+    assert run_id != handler.run_fingerprint(str(dataset_dir), "bob")
+
+
+def test_fresh_start_without_uploaded_checkpoint(tmp_path):
+    save_root = tmp_path / "output" / "bob"
+
+    assert handler.restore_checkpoint(RUN_ID, str(save_root)) == 0
+    assert not save_root.exists()
+
+
+def test_upload_then_resume_restores_weights_and_optimizer(tmp_path, s3):
+    path = save(tmp_path / "first" / "bob", 250)
+    handler.upload_checkpoint(RUN_ID, path, 250, "job-1", handler.snapshot_optimizer(path, 250))
+
+    assert latest(s3)["step"] == 250 and latest(s3)["optimizer"] == "optimizer_000000250.pt"
+    assert not os.path.exists(f"{path}.optimizer.pt")  # the snapshot is removed after upload
+
+    save_root = tmp_path / "retry" / "bob"
+    assert handler.restore_checkpoint(RUN_ID, str(save_root)) == 250
+    assert (save_root / "bob_000000250.safetensors").read_bytes() == b"weights 250"
+    with zipfile.ZipFile(save_root / "optimizer.pt") as z:
+        assert z.read("data.pkl") == b"optimizer 250"
+
+
+def test_latest_pointer_moves_to_the_newest_save(tmp_path, s3):
+    save_dir = tmp_path / "out" / "bob"
+    first = save(save_dir, 250)
+    handler.upload_checkpoint(RUN_ID, first, 250, "job-1", handler.snapshot_optimizer(first, 250))
+    second = save(save_dir, 500, with_optimizer=False)  # optimizer.pt on disk is still step 250's
+    os.utime(second, (time.time() + 5, time.time() + 5))
+
+    assert handler.snapshot_optimizer(second, 500) is None
+    handler.upload_checkpoint(RUN_ID, second, 500, "job-1", None)
+
+    state = latest(s3)
+    assert (state["step"], state["file"]) == (500, "bob_000000500.safetensors")
+    assert "optimizer" not in state
+    save_root = tmp_path / "retry" / "bob"
+    assert handler.restore_checkpoint(RUN_ID, str(save_root)) == 500
+    assert sorted(os.listdir(save_root)) == ["bob_000000500.safetensors"]
+
+
+def test_optimizer_of_a_superseded_save_is_not_snapshotted(tmp_path):
+    save_dir = tmp_path / "out" / "bob"
+    first = save(save_dir, 250)
+    save(save_dir, 500, with_optimizer=False)  # the next save started; optimizer.pt is about to be replaced
+
+    assert handler.snapshot_optimizer(first, 250) is None
+
+
+def test_partial_restore_falls_back_to_a_fresh_start(tmp_path, s3):
+    path = save(tmp_path / "first" / "bob", 250)
+    handler.upload_checkpoint(RUN_ID, path, 250, "job-1", handler.snapshot_optimizer(path, 250))
+    s3.delete_object(Bucket=BUCKET, Key=f"lora/runs/{RUN_ID}/optimizer_000000250.pt")
+
+    save_root = tmp_path / "retry" / "bob"
+    assert handler.restore_checkpoint(RUN_ID, str(save_root)) == 0
+    assert not save_root.exists()  # the weights that did download aren't left for the trainer to resume from
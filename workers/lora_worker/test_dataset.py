@@ -0,0 +1,72 @@
+"""
+Tests for LoRA dataset preprocessing (needs Pillow)
+Run: cd workers/lora_worker && python -m pytest -q test_dataset.py
+"""
+
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import dataset  # noqa: E402
+
+
+def gradient(path, width, height, reverse=False, offset=0):
+    """Horizontal grayscale ramp (dHash is all zeros, or all ones when reversed)"""
+    im = Image.new("RGB", (width, height))
+    for x in range(width):
+        v = min(255, offset + (width - 1 - x if reverse else x) * 200 // width)
+        for y in range(height):
+            im.putpixel((x, y), (v, v, v))
+    im.save(path)
+    return str(path)
+
+
+def test_crop_is_centered_and_resized(tmp_path):
+    src = Image.new("RGB", (600, 300), (0, 0, 255))
+    src.paste((255, 0, 0), (150, 0, 450, 300))  # the centered square is red, the sides blue
+    src.save(tmp_path / "wide.png")
+
+    result = dataset.process_image(str(tmp_path / "wide.png"), str(tmp_path / "out.jpg"), 128, 256)
+
+    assert result["ok"] and result["size"] == [600, 300]
+    with Image.open(tmp_path / "out.jpg") as out:
+        assert out.size == (128, 128)
+        for corner in [(0, 0), (127, 0), (0, 127), (127, 127)]:
+            r, g, b = out.getpixel(corner)
+            assert r > 200 and b < 60
+
+
+def test_dhash_ignores_small_brightness_changes(tmp_path):
+    base = Image.open(gradient(tmp_path / "a.png", 64, 64))
+    brighter = Image.open(gradient(tmp_path / "b.png", 64, 64, offset=10))
+    flipped = Image.open(gradient(tmp_path / "c.png", 64, 64, reverse=True))
+
+    assert dataset.dhash(base) == dataset.dhash(brighter)
+    assert bin(dataset.dhash(base) ^ dataset.dhash(flipped)).count("1") > dataset.DEDUP_MAX_DISTANCE
+
+
+def test_preprocess_filters_and_captions(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    paths = [
+        gradient(raw / "0.png", 400, 300),
+        gradient(raw / "1.png", 100, 100),  # too small
+        gradient(raw / "2.png", 400, 300, offset=10),  # near-duplicate of 0
+        str(raw / "3.jpg"),  # not an image
+        gradient(raw / "4.png", 300, 400, reverse=True),
+    ]
+    (raw / "3.jpg").write_text("not an image")
+    out = tmp_path / "dataset"
+
+    report = dataset.preprocess(paths, str(out), [f"photo {i}" for i in range(5)], resolution=128, workers=1)
+
+    assert report["input"] == 5 and report["kept"] == 2
+    assert report["too_small"] == [1]
+    assert report["unreadable"] == [3]
+    assert report["duplicates"] == [{"index": 2, "duplicate_of": 0}]
+    assert sorted(os.listdir(out)) == ["0000.jpg", "0000.txt", "0004.jpg", "0004.txt"]
+    assert (out / "0004.txt").read_text() == "photo 4"
+    with Image.open(out / "0000.jpg") as im:
+        assert im.size == (128, 128)
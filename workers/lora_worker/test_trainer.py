@@ -0,0 +1,105 @@
+"""
+Tests for trainer supervision with a fake AI-Toolkit process
+Run: cd workers/lora_worker && python -m pytest -q test_trainer.py
+"""
+
+import json
+import sys
+import textwrap
+
+import pytest
+
+import trainer
+
+FAKE_TRAINER = textwrap.dedent("""
+    import json, os, sys, time
+    out, fail = sys.argv[1], int(sys.argv[2])
+    os.makedirs(f"{out}/bob", exist_ok=True)
+
+    def save(path, truncate=False):
+        header = json.dumps({"w": {"dtype": "F16", "shape": [4], "data_offsets": [0, 8]}}).encode()
+        with open(path, "wb") as f:
+            f.write(len(header).to_bytes(8, "little") + header + b"\\0" * (3 if truncate else 8))
+
+    sys.stderr.write("Fetching 17 files: 100%|##| 17/17 [00:01<00:00]\\n")
+    for step in range(1, 11):
+        sys.stderr.write(f"\\rbob:  {step * 10}%|#| {step}/10 [00:01<00:02, 1.0it/s, lr: 1.0e-04 loss: {1 / step:.3e}]")
+        sys.stderr.flush()
+        if step % 4 == 0:
+            save(f"{out}/bob/bob_{step:09d}.safetensors")
+        time.sleep(0.02)
+    if fail:
+        save(f"{out}/bob/bob_{10:09d}.safetensors", truncate=True)  # killed mid-save
+        sys.exit(1)
+    save(f"{out}/bob/bob.safetensors")
+""")
+
+
+@pytest.fixture
+def fake_cmd(tmp_path, monkeypatch):
+    monkeypatch.setattr(trainer, "POLL_INTERVAL", 0.05)
+    script = tmp_path / "fake_train.py"
+    script.write_text(FAKE_TRAINER)
+    return lambda fail=0: [sys.executable, str(script), str(tmp_path / "out"), str(fail)]
+
+
+def test_progress_and_checkpoints_are_reported(tmp_path, fake_cmd):
+    progress, checkpoints = [], []
+
+    state = trainer.run_trainer(
+        fake_cmd(), str(tmp_path / "out"), lambda *a: progress.append(a),
+        lambda path, step: checkpoints.append(step), timeout=60, total_steps=10,
+    )
+
+    assert state == {"step": 10, "total_steps": 10, "loss": 0.1}
+    assert progress[0] == (1, 10, 1.0)  # the 17/17 download bar is ignored
+    assert checkpoints == [4, 8]
+
+
+def test_failure_keeps_complete_checkpoints_only(tmp_path, fake_cmd):
+    checkpoints = []
+
+    with pytest.raises(trainer.TrainingFailed) as exc:
+        trainer.run_trainer(
+            fake_cmd(fail=1), str(tmp_path / "out"), lambda *a: None,
+            lambda path, step: checkpoints.append(step), timeout=60, total_steps=10, skip_steps=[4],
+        )
+
+    assert exc.value.step == 10
+    assert checkpoints == [8]
+
+
+def test_safetensors_complete(tmp_path):
+    header = json.dumps({"w": {"data_offsets": [0, 16]}, "__metadata__": {"step": "8"}}).encode()
+    path = tmp_path / "ckpt.safetensors"
+    path.write_bytes(len(header).to_bytes(8, "little") + header + b"\0" * 10)
+    assert not trainer.safetensors_complete(str(path))
+    path.write_bytes(len(header).to_bytes(8, "little") + header + b"\0" * 16)
+    assert trainer.safetensors_complete(str(path))
+
+
+def test_save_is_held_until_ready_or_superseded(tmp_path):
+    def save(step):
+        header = json.dumps({"w": {"data_offsets": [0, 8]}}).encode()
+        (tmp_path / f"bob_{step:09d}.safetensors").write_bytes(len(header).to_bytes(8, "little") + header + b"\0" * 8)
+
+    ready, released = set(), []
+    watcher = trainer._CheckpointWatcher(
+        str(tmp_path), lambda path, step: released.append(step),
+        is_ready=lambda path: trainer.CHECKPOINT_RE.search(path).group(1) in ready,
+    )
+
+    save(4)
+    watcher.poll()
+    assert released == []  # optimizer state not written yet
+    ready.add(f"{4:09d}")
+    watcher.poll()
+    assert released == [4]
+
+    save(8)
+    watcher.poll()
+    save(12)
+    watcher.poll()
+    assert released == [4, 8]  # never got ready, but a later save replaces its optimizer state
+    watcher.poll(final=True)
+    assert released == [4, 8, 12]  # the trainer exited
@@ -0,0 +1,152 @@
+"""
+AI-Toolkit trainer supervision
+The training subprocess's output is read on a background thread, so the worker can report step/loss
+while training runs and hand each save_every checkpoint to a callback (upload) as soon as the file is
+complete (judged from its safetensors header), instead of learning about everything when the process exits.
+"""
+
+import os
+import re
+import json
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# tqdm bar as printed by AI-Toolkit: "name:  25%|██▌  | 250/1000 [02:10<06:30, 1.92it/s, lr: 1.0e-04 loss: 1.234e-01]"
+STEP_RE = re.compile(r"(\d+)/(\d+) \[")
+LOSS_RE = re.compile(r"loss[:=]\s*([0-9.]+(?:e[-+]?\d+)?)", re.IGNORECASE)
+# Intermediate saves are "<name>_<step zero-padded to 9>.safetensors"; the final save has no step suffix
+CHECKPOINT_RE = re.compile(r"_(\d{9})\.safetensors$")
+POLL_INTERVAL = float(os.getenv("CHECKPOINT_POLL_INTERVAL", "5"))
+
+
+class TrainingFailed(RuntimeError):
+    """Trainer exited non-zero or ran past its timeout; step is the last one reported"""
+
+    def __init__(self, message: str, step: int = 0):
+        super().__init__(message)
+        self.step = step
+
+
+def parse_progress(line: str):
+    """(step, total, loss or None) from one output line, or None when the line carries no progress"""
+    match = STEP_RE.search(line)
+    if not match:
+        return None
+    loss = LOSS_RE.search(line)
+    return int(match.group(1)), int(match.group(2)), float(loss.group(1)) if loss else None
+
+
+def find_checkpoints(output_dir: str) -> Dict[int, str]:
+    """step -> path for every intermediate save under output_dir"""
+    found = {}
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            match = CHECKPOINT_RE.search(name)
+            if match:
+                found[int(match.group(1))] = os.path.join(root, name)
+    return found
+
+
+def _read_lines(stream, lines: queue.Queue):
+    # tqdm redraws with \r, so split on both line endings
+    buf = b""
+    for chunk in iter(lambda: stream.read1(4096), b""):
+        buf += chunk
+        *complete, buf = re.split(rb"[\r\n]", buf)
+        for line in complete:
+            if line.strip():
+                lines.put(line.decode(errors="replace"))
+    if buf.strip():
+        lines.put(buf.decode(errors="replace"))
+    lines.put(None)
+
+
+def safetensors_complete(path: str) -> bool:
+    """True once the file holds every byte its header declares (i.e. the trainer finished writing it)"""
+    try:
+        with open(path, "rb") as f:
+            header_len = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_len))
+        data_end = max((t["data_offsets"][1] for k, t in header.items() if k != "__metadata__"), default=0)
+        return os.path.getsize(path) >= 8 + header_len + data_end
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+class _CheckpointWatcher:
+    """
+    Hands each complete save to on_checkpoint once. With is_ready, a save is held until is_ready(path)
+    (e.g. its optimizer state is written too), a later save appears, or the trainer has exited.
+    """
+
+    def __init__(self, output_dir: str, on_checkpoint: Callable[[str, int], None], skip_steps=(),
+                 is_ready: Optional[Callable[[str], bool]] = None):
+        self.output_dir = output_dir
+        self.on_checkpoint = on_checkpoint
+        self.is_ready = is_ready
+        self.done = set(skip_steps)
+
+    def poll(self, final: bool = False):
+        saves = find_checkpoints(self.output_dir)
+        for step, path in sorted(saves.items()):
+            if step in self.done or not safetensors_complete(path):
+                continue
+            superseded = any(later > step for later in saves)
+            if final or superseded or self.is_ready is None or self.is_ready(path):
+                self.done.add(step)
+                self.on_checkpoint(path, step)
+
+
+def run_trainer(cmd, output_dir: str, on_progress: Callable[[int, int, Optional[float]], None],
+                on_checkpoint: Callable[[str, int], None], timeout: float, total_steps: Optional[int] = None,
+                skip_steps=(), checkpoint_ready: Optional[Callable[[str], bool]] = None) -> dict:
+    """
+    Run cmd to completion, calling on_progress(step, total, loss) per training progress line and
+    on_checkpoint(path, step) once per completed intermediate save (steps in skip_steps are ignored;
+    with checkpoint_ready, a save waits for it as described in _CheckpointWatcher).
+    With total_steps, other progress bars (model downloads, sampling) are not mistaken for training.
+    Returns {"step", "total_steps", "loss"} as last reported; raises TrainingFailed.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    lines: queue.Queue = queue.Queue()
+    threading.Thread(target=_read_lines, args=(proc.stdout, lines), daemon=True, name="trainer-output").start()
+
+    watcher = _CheckpointWatcher(output_dir, on_checkpoint, skip_steps, checkpoint_ready)
+    tail = deque(maxlen=40)
+    state = {"step": 0, "total_steps": None, "loss": None}
+    deadline = time.time() + timeout
+    next_poll = time.time() + POLL_INTERVAL
+    while True:
+        try:
+            line = lines.get(timeout=1.0)
+        except queue.Empty:
+            line = ""
+        if line is None:
+            break
+        if line:
+            tail.append(line)
+            progress = parse_progress(line)
+            if progress and (total_steps is None or progress[1] == total_steps):
+                step, total, loss = progress
+                state.update(step=step, total_steps=total, loss=loss if loss is not None else state["loss"])
+                on_progress(step, total, state["loss"])
+
+        now = time.time()
+        if now >= next_poll:
+            watcher.poll()
+            next_poll = now + POLL_INTERVAL
+        if now > deadline:
+            proc.kill()
+            proc.wait()
+            watcher.poll(final=True)
+            raise TrainingFailed(f"Training timed out after {timeout:.0f}s at step {state['step']}", state["step"])
+
+    returncode = proc.wait()
+    watcher.poll(final=True)
+    if returncode != 0:
+        raise TrainingFailed(f"Training failed at step {state['step']}: " + "\n".join(tail)[-2000:], state["step"])
+    return state
@@ -0,0 +1,59 @@
+"""
+Output encoding for TTS audio
+Speech is synthesized to 16-bit WAV and encoded in-worker before upload: Opus at 48 kb/s is a fraction
+of the WAV size, which shortens the R2 upload and every later download (backend, lipsync). WAV is
+still available when a caller asks for it.
+"""
+
+import os
+import re
+import subprocess
+from typing import Optional, Tuple
+
+# format -> (file extension, content type, ffmpeg codec args, default bitrate)
+OUTPUT_FORMATS = {
+    "opus": ("ogg", "audio/ogg", ["-c:a", "libopus", "-application", "voip"], "48k"),
+    "aac": ("m4a", "audio/mp4", ["-c:a", "aac", "-movflags", "+faststart"], "64k"),
+    "mp3": ("mp3", "audio/mpeg", ["-c:a", "libmp3lame"], "64k"),
+    "wav": ("wav", "audio/wav", None, None),
+}
+DEFAULT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "opus")
+MIN_BITRATE_K, MAX_BITRATE_K = 16, 320
+
+
+def resolve_format(fmt: Optional[str] = None, bitrate: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """(format, bitrate) from a job payload, with defaults filled in; raises ValueError"""
+    fmt = (fmt or DEFAULT_FORMAT).lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of {', '.join(OUTPUT_FORMATS)})")
+    if fmt == "wav":
+        return fmt, None
+    if bitrate is None:
+        return fmt, OUTPUT_FORMATS[fmt][3]
+    match = re.fullmatch(r"(\d+)k?", str(bitrate).strip().lower())
+    if not match or not MIN_BITRATE_K <= int(match.group(1)) <= MAX_BITRATE_K:
+        raise ValueError(f"bitrate must be between {MIN_BITRATE_K}k and {MAX_BITRATE_K}k")
+    return fmt, f"{match.group(1)}k"
+
+
+def extension(fmt: str) -> str:
+    return OUTPUT_FORMATS[fmt][0]
+
+
+def content_type(fmt: str) -> str:
+    return OUTPUT_FORMATS[fmt][1]
+
+
+def encode(wav_path: str, fmt: str, bitrate: Optional[str]) -> str:
+    """Encode wav_path next to itself; returns the encoded path (wav_path itself for wav)"""
+    codec_args = OUTPUT_FORMATS[fmt][2]
+    if codec_args is None:
+        return wav_path
+    out_path = f"{os.path.splitext(wav_path)[0]}.{extension(fmt)}"
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-i", wav_path, *codec_args, "-b:a", bitrate, out_path],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg {fmt} encode failed: {result.stderr.strip()[-500:]}")
+    return out_path
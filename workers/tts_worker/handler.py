@@ -1,21 +1,33 @@
 import os
 import time
+import wave
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import runpod
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
 from TTS.api import TTS
 
+import audio_format
+import phrase_cache
+from r2_upload import upload_file
+from sentences import split_sentences
+
 WORKER_VERSION = "v1-coqui-tts"
 MODEL_NAME = "tts_models/en/ljspeech/tacotron2-DDC"
+VOICE = "ljspeech"
+SENTENCE_PAUSE_S = float(os.getenv("TTS_SENTENCE_PAUSE_S", "0.25"))
+# Upload the first sentence on its own as soon as it is ready so playback can start early
+PREVIEW_ENABLED = os.getenv("TTS_PREVIEW", "true").lower() == "true"
 
 def log(msg: str):
     print(f"[{WORKER_VERSION}] {msg}", flush=True)
 
-def safe_progress(job, pct: int):
+def safe_progress(job, pct: int, extra: dict = None):
+    """extra (e.g. preview_url) is sent along as {"progress": pct, **extra}"""
     try:
         pct = max(0, min(100, int(pct)))
-        runpod.serverless.progress_update(job, pct)
+        runpod.serverless.progress_update(job, {"progress": pct, **extra} if extra else pct)
     except Exception as e:
         log(f"progress_update failed (ignored): {e}")
 
@@ -25,15 +37,6 @@ def validate_env():
     if missing:
         raise ValueError(f"Missing env vars: {', '.join(missing)}")
 
-def get_s3_client():
-    return boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_REGION", "auto"),
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-
 # Global TTS model
 _tts = None
 
@@ -45,40 +48,106 @@ def load_tts():
         log("TTS model loaded")
     return _tts
 
-def generate_audio(text: str, output_path: str, job):
+def to_pcm16(wav) -> bytes:
+    return (np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+def write_wav(path: str, pcm: bytes, sample_rate: int):
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(pcm)
+
+def generate_audio(text: str, output_path: str, job, job_id: str, fmt: str = "wav", bitrate: str = None) -> dict:
+    """
+    Synthesize sentence by sentence, appending each to output_path (WAV) as it is produced; sentences
+    already in the phrase cache are not synthesized again. The first sentence is also uploaded on its
+    own as a preview, encoded as fmt. Returns stats for the job meta.
+    """
     log(f"Generating audio: text='{text[:50]}...'")
     
     safe_progress(job, 30)
     tts = load_tts()
+    sample_rate = tts.synthesizer.output_sample_rate
+    pause = b"\0\0" * int(sample_rate * SENTENCE_PAUSE_S)
+    
+    sentences = split_sentences(text)
+    if not sentences:
+        raise ValueError("Text has nothing to synthesize")
+    log(f"Running TTS inference on {len(sentences)} sentences...")
     
-    safe_progress(job, 60)
-    log("Running TTS inference...")
-    tts.tts_to_file(text=text, file_path=output_path)
+    # The Coqui API synthesizes one text per call for this model (no cross-sentence batching)
+    uploader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview-upload")
+    preview, extra = None, {}
+    stats = {"sentences": len(sentences)}
+    hits = 0
+    t0 = time.time()
+    try:
+        with wave.open(output_path, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(sample_rate)
+            for i, sentence in enumerate(sentences):
+                key = phrase_cache.cache_key(sentence, MODEL_NAME, VOICE, sample_rate)
+                pcm = phrase_cache.get(key)
+                if pcm is None:
+                    pcm = to_pcm16(tts.tts(text=sentence, split_sentences=False))
+                    phrase_cache.put(key, pcm)
+                else:
+                    hits += 1
+                out.writeframes(pcm if i == len(sentences) - 1 else pcm + pause)
+                
+                if i == 0:
+                    stats["first_chunk_s"] = round(time.time() - t0, 2)
+                    if PREVIEW_ENABLED and len(sentences) > 1:
+                        preview_path = f"{output_path}.preview.wav"
+                        write_wav(preview_path, pcm, sample_rate)
+                        preview = uploader.submit(upload_preview, preview_path, job_id, fmt, bitrate)
+                if preview is not None and preview.done() and "preview_url" not in stats:
+                    stats["preview_url"] = preview_result(preview)
+                    if stats["preview_url"]:
+                        extra["preview_url"] = stats["preview_url"]
+                safe_progress(job, 60 + 20 * (i + 1) / len(sentences), extra)
+    finally:
+        uploader.shutdown(wait=True)
+    
+    stats["synthesis_s"] = round(time.time() - t0, 2)
+    stats["cache_hits"] = hits
+    stats["cache_hit_ratio"] = round(hits / len(sentences), 3)
+    if hits < len(sentences):
+        phrase_cache.evict()
+    if preview is not None and "preview_url" not in stats:
+        stats["preview_url"] = preview_result(preview)
     
     if not os.path.exists(output_path):
         raise RuntimeError("Audio file not created")
     
     size = os.path.getsize(output_path)
-    log(f"Audio created: {size} bytes")
+    log(f"Audio created: {size} bytes {stats}")
+    return stats
 
-def upload_to_r2(file_path: str, job_id: str) -> str:
-    bucket = os.getenv("R2_BUCKET")
-    public_base = os.getenv("R2_PUBLIC_BASE_URL").rstrip("/")
-    key = f"audio/{job_id}/voice.wav"
-    
+def upload_preview(file_path: str, job_id: str, fmt: str, bitrate: str) -> str:
+    encoded_path = file_path
+    try:
+        encoded_path = audio_format.encode(file_path, fmt, bitrate)
+        key = f"audio/{job_id}/preview.{audio_format.extension(fmt)}"
+        return upload_file(encoded_path, key, audio_format.content_type(fmt))
+    finally:
+        for path in {file_path, encoded_path}:
+            os.remove(path)
+
+def preview_result(future):
+    """Preview URL, or None when its upload failed (the full audio is still produced)"""
+    try:
+        return future.result()
+    except Exception as e:
+        log(f"Preview upload failed (ignored): {e}")
+        return None
+
+def upload_to_r2(file_path: str, job_id: str, fmt: str) -> str:
+    key = f"audio/{job_id}/voice.{audio_format.extension(fmt)}"
     log(f"Uploading to R2: {key}")
-    
-    s3 = get_s3_client()
-    with open(file_path, "rb") as f:
-        s3.put_object(
-            Bucket=bucket,
-            Key=key,
-            Body=f,
-            ContentType="audio/wav",
-            CacheControl="public, max-age=31536000",
-        )
-    
-    url = f"{public_base}/{key}"
+    url = upload_file(file_path, key, audio_format.content_type(fmt))
     log(f"Upload complete: {url}")
     return url
 
@@ -88,6 +157,11 @@ def handler(job):
         log(f"Job started: {job_id}")
         payload = job.get("input", {}) or {}
         
+        # Pre-warm ping from the backend: boot the worker and load the model, do no work
+        if payload.get("warmup"):
+            load_tts()
+            return {"ok": True, "warmup": True, "worker_version": WORKER_VERSION}
+        
         text = payload.get("text")
         
         if not text or not str(text).strip():
@@ -98,19 +172,35 @@ def handler(job):
                 "worker_version": WORKER_VERSION,
             }
         
+        try:
+            fmt, bitrate = audio_format.resolve_format(payload.get("format"), payload.get("bitrate"))
+        except ValueError as e:
+            return {
+                "ok": False,
+                "error_code": "invalid_input",
+                "error_message": str(e),
+                "worker_version": WORKER_VERSION,
+            }
+        
         safe_progress(job, 10)
         validate_env()
         
         output_path = f"/tmp/{job_id}_voice.wav"
-        generate_audio(str(text), output_path, job)
+        stats = generate_audio(str(text), output_path, job, job_id, fmt, bitrate)
+        
+        safe_progress(job, 82)
+        wav_bytes = os.path.getsize(output_path)
+        encoded_path = audio_format.encode(output_path, fmt, bitrate)
+        stats.update(format=fmt, bitrate=bitrate, bytes=os.path.getsize(encoded_path), wav_bytes=wav_bytes)
         
         safe_progress(job, 85)
-        public_url = upload_to_r2(output_path, job_id)
+        public_url = upload_to_r2(encoded_path, job_id, fmt)
         
-        try:
-            os.remove(output_path)
-        except Exception:
-            pass
+        for path in {output_path, encoded_path}:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
         
         safe_progress(job, 100)
         return {
@@ -119,7 +209,8 @@ def handler(job):
             "worker_version": WORKER_VERSION,
             "meta": {
                 "model": "coqui-tts",
-                "voice": "ljspeech",
+                "voice": VOICE,
+                **stats,
             },
         }
     
@@ -0,0 +1,89 @@
+"""
+Phrase-level TTS cache on the network volume
+Synthesized PCM is stored per sentence, keyed by the normalized sentence text, the model, the voice
+and the sample rate, so recurring intros, outros and stock phrases are synthesized once across jobs
+and workers. Entries are written with atomic renames (workers share the volume) and the least
+recently used are evicted past TTS_CACHE_MAX_MB (0 disables the cache).
+"""
+
+import os
+import re
+import hashlib
+import unicodedata
+import uuid
+from typing import Optional
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/runpod-volume/tts-cache")
+TTS_CACHE_MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'", "–": "-", "—": "-"})
+
+
+def normalize(sentence: str) -> str:
+    """Unicode-normalized, straight quotes, single spaces; case is kept (it can change pronunciation)"""
+    text = unicodedata.normalize("NFKC", sentence).translate(_QUOTES)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(sentence: str, model: str, voice: str, sample_rate: int) -> str:
+    return hashlib.sha256("\0".join([model, voice, str(sample_rate), normalize(sentence)]).encode()).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(TTS_CACHE_DIR, key[:2], f"{key}.pcm")
+
+
+def get(key: str) -> Optional[bytes]:
+    """16-bit mono PCM for key, or None"""
+    if TTS_CACHE_MAX_BYTES <= 0:
+        return None
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            pcm = f.read()
+        os.utime(path)  # mtime is the LRU clock
+        return pcm
+    except OSError:
+        return None
+
+
+def put(key: str, pcm: bytes):
+    """Store atomically; cache errors never fail the job (call evict() once the job's puts are done)"""
+    if TTS_CACHE_MAX_BYTES <= 0:
+        return
+    path = _path(key)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def evict(max_bytes: Optional[int] = None):
+    """Delete least recently used entries until the cache fits max_bytes"""
+    max_bytes = TTS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for root, _, files in os.walk(TTS_CACHE_DIR):
+        for name in files:
+            if not name.endswith(".pcm"):
+                continue
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
@@ -0,0 +1,72 @@
+"""
+Sentence chunking for TTS
+Text is synthesized one sentence at a time: time to first audio no longer grows with the script, only
+one sentence of audio is held in memory, and Tacotron-style attention (which degrades on long inputs)
+never sees more than MAX_SENTENCE_CHARS.
+"""
+
+import os
+import re
+from typing import List
+
+MAX_SENTENCE_CHARS = int(os.getenv("TTS_MAX_SENTENCE_CHARS", "250"))
+
+# Period after these is not a sentence end
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "a.m", "p.m", "no", "approx"}
+
+_BREAK = re.compile(r"(?<=[.!?…\"'”’)\]])\s+")  # candidate boundaries; _SENTENCE_END decides
+_SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]]*$")
+_CLAUSE_END = re.compile(r"(?<=[,;:—])\s+")
+_WORD = re.compile(r"\w")
+
+
+def _ends_with_abbreviation(piece: str) -> bool:
+    words = piece.rstrip(".").split()  # empty for a bare "..."
+    last = words[-1].lower() if words else ""
+    return piece.endswith(".") and (last in ABBREVIATIONS or (len(last) == 1 and last.isalpha()))
+
+
+def _pack(parts: List[str], max_chars: int) -> List[str]:
+    """Greedily join parts (with spaces) into pieces of at most max_chars"""
+    pieces, current = [], ""
+    for part in parts:
+        if current and len(current) + 1 + len(part) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Break an over-long sentence at clause boundaries, falling back to word boundaries"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    for clause in _pack(_CLAUSE_END.split(sentence), max_chars):
+        pieces.extend(_pack(clause.split(), max_chars) if len(clause) > max_chars else [clause])
+    return pieces
+
+
+def split_sentences(text: str, max_chars: int = MAX_SENTENCE_CHARS) -> List[str]:
+    """Sentences (and line breaks) of text, in order, none longer than max_chars"""
+    sentences = []
+    for line in re.split(r"\n\s*", text):
+        pending = ""
+        for piece in _BREAK.split(line.strip()):
+            pending = f"{pending} {piece}" if pending else piece
+            if _SENTENCE_END.search(pending) and not _ends_with_abbreviation(pending):
+                if _WORD.search(pending):
+                    sentences.append(pending)
+                    pending = ""
+                elif sentences:
+                    # A bare "..." is a pause, not something to speak: keep it with the previous sentence
+                    sentences[-1] = f"{sentences[-1]} {pending}"
+                    pending = ""
+        if pending and sentences and not _WORD.search(pending):
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        elif pending:
+            sentences.append(pending)
+    return [chunk for s in sentences if _WORD.search(s) for chunk in _split_long(s.strip(), max_chars)]
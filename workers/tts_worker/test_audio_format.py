@@ -0,0 +1,25 @@
+"""
+Tests for TTS output format selection
+Run: cd workers/tts_worker && python -m pytest -q test_audio_format.py
+"""
+
+import pytest
+
+import audio_format
+
+
+def test_defaults_to_compressed_format_with_its_bitrate():
+    assert audio_format.resolve_format() == ("opus", "48k")
+    assert audio_format.resolve_format("MP3") == ("mp3", "64k")
+    assert audio_format.resolve_format("aac", "96") == ("aac", "96k")
+
+
+def test_wav_ignores_bitrate():
+    assert audio_format.resolve_format("wav", "128k") == ("wav", None)
+    assert audio_format.encode("/tmp/x.wav", "wav", None) == "/tmp/x.wav"
+
+
+@pytest.mark.parametrize("fmt,bitrate", [("flac", None), ("opus", "8k"), ("mp3", "fast")])
+def test_rejects_unknown_formats_and_bitrates(fmt, bitrate):
+    with pytest.raises(ValueError):
+        audio_format.resolve_format(fmt, bitrate)
@@ -0,0 +1,53 @@
+"""
+Tests for the phrase-level TTS cache
+Run: cd workers/tts_worker && python -m pytest -q test_phrase_cache.py
+"""
+
+import os
+import time
+
+import pytest
+
+import phrase_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(phrase_cache, "TTS_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_key_ignores_spacing_and_quote_style_but_not_voice():
+    key = phrase_cache.cache_key("Welcome  back, it’s   time.", "model-a", "ljspeech", 22050)
+    assert key == phrase_cache.cache_key("Welcome back, it's time. ", "model-a", "ljspeech", 22050)
+    assert key != phrase_cache.cache_key("Welcome back, it's time.", "model-a", "other-voice", 22050)
+    assert key != phrase_cache.cache_key("Welcome back, it's time.", "model-b", "ljspeech", 22050)
+
+
+def test_round_trip_and_miss():
+    key = phrase_cache.cache_key("Hello.", "m", "v", 22050)
+    assert phrase_cache.get(key) is None
+    phrase_cache.put(key, b"\x01\x02" * 100)
+    assert phrase_cache.get(key) == b"\x01\x02" * 100
+
+
+def test_evict_drops_least_recently_used(monkeypatch):
+    keys = [phrase_cache.cache_key(f"Sentence {i}.", "m", "v", 22050) for i in range(3)]
+    for key in keys:
+        phrase_cache.put(key, b"\0" * 1000)
+        time.sleep(0.01)
+    phrase_cache.get(keys[0])  # touch the oldest so the middle one becomes LRU
+
+    phrase_cache.evict(max_bytes=2000)
+
+    assert phrase_cache.get(keys[0]) is not None
+    assert phrase_cache.get(keys[1]) is None
+    assert phrase_cache.get(keys[2]) is not None
+
+
+def test_disabled_cache_stores_nothing(cache_dir, monkeypatch):
+    monkeypatch.setattr(phrase_cache, "TTS_CACHE_MAX_BYTES", 0)
+    key = phrase_cache.cache_key("Hello.", "m", "v", 22050)
+    phrase_cache.put(key, b"pcm")
+    assert phrase_cache.get(key) is None
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,49 @@
+"""
+Tests for TTS sentence chunking
+Run: cd workers/tts_worker && python -m pytest -q test_sentences.py
+"""
+
+import pytest
+
+from sentences import split_sentences
+
+
+def test_splits_on_sentence_punctuation():
+    assert split_sentences("Hello there. How are you? Great!") == ["Hello there.", "How are you?", "Great!"]
+
+
+def test_closing_quotes_stay_with_their_sentence():
+    assert split_sentences('He said "stop." Then he left. A "word" here.') == ['He said "stop."', "Then he left.", 'A "word" here.']
+
+
+def test_keeps_abbreviations_and_initials():
+    text = "Dr. Smith met J. R. Tolkien at 5 p.m. yesterday. They talked."
+    assert split_sentences(text) == ["Dr. Smith met J. R. Tolkien at 5 p.m. yesterday.", "They talked."]
+
+
+def test_line_breaks_end_sentences():
+    assert split_sentences("Welcome back\n\nToday we cook pasta.") == ["Welcome back", "Today we cook pasta."]
+
+
+def test_long_sentences_are_broken_at_clauses_then_words():
+    clauses = ", ".join(f"clause number {i}" for i in range(20)) + "."
+    chunks = split_sentences(clauses, max_chars=60)
+    assert all(len(c) <= 60 for c in chunks)
+    assert " ".join(chunks) == clauses
+
+    words = " ".join(["word"] * 40)
+    assert all(len(c) <= 30 for c in split_sentences(words, max_chars=30))
+
+
+def test_empty_text():
+    assert split_sentences("  \n ") == []
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("Well. ... Okay then.", ["Well. ...", "Okay then."]),
+    ("Wait!\n...\nGo on.", ["Wait! ...", "Go on."]),
+    ("... Hello there.", ["... Hello there."]),
+    ("...", []),
+])
+def test_bare_ellipsis_stays_with_a_sentence(text, expected):
+    assert split_sentences(text) == expected
@@ -2,13 +2,24 @@ import os
 import time
 import traceback
 import uuid
-from typing import Dict, Optional
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import threading
+from collections import deque
+
+from cancellation import PROGRESS_INTERVAL, JobCancelled  # workers/common
+from cogvideo import LazyPipeline  # workers/common
+from interpolation import validate_interpolation  # workers/common
+from job_store import JOB_EVICT_INTERVAL, JobStore
+from r2_upload import upload_file, validate_r2_env  # workers/common, on PYTHONPATH via bootstrap.sh
+from segments import (  # workers/common
+    FPS, SEGMENT_FRAMES, VIDEO_ENCODER, finalize_video, generate_segment, remove_files,
+    segment_condition, segment_count, stream_frames_to_r2, write_video,
+)
 
 # Force all caches to /workspace
 os.environ.setdefault("HF_HOME", "/workspace/hf")
@@ -27,168 +38,371 @@ BUILD_ID = "v9-20260201-pod"
 MODEL_ID = "THUDM/CogVideoX-2b"
 OUTPUT_DIR = "/workspace/outputs"
 
+def log(msg: str):
+    print(f"[{WORKER_VERSION}] {msg}", flush=True)
+
 app = FastAPI(title="CogVideoX Worker API")
 
-# Lazy imports
-_torch = None
-_pipeline_class = None
-_export_to_video = None
-_pipeline_instance = None
-
-# Job storage
-jobs: Dict[str, dict] = {}
-executor = ThreadPoolExecutor(max_workers=1)
-
-def lazy_import_ml():
-    global _torch, _pipeline_class, _export_to_video
-    if _torch is None:
-        import torch
-        from diffusers.pipelines.cogvideo import CogVideoXPipeline
-        from diffusers.utils import export_to_video
-        _torch = torch
-        _pipeline_class = CogVideoXPipeline
-        _export_to_video = export_to_video
+# Job storage: active jobs in memory, journaled to /workspace so results survive restarts
+jobs = JobStore(os.getenv("JOB_DB_PATH", "/workspace/jobs.db"))
 
-def log(msg: str):
-    print(f"[{WORKER_VERSION}] {msg}", flush=True)
+# Bounded priority queue drained by a single GPU thread; full queue -> 429 + Retry-After
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "8"))
+DEFAULT_JOB_SECONDS = float(os.getenv("DEFAULT_JOB_SECONDS", "180"))  # estimate until real durations exist
+_queue: list = []  # heap of (-priority, seq, job_id)
+_queue_cond = threading.Condition()
+_queue_seq = itertools.count()
+_recent_durations: deque = deque(maxlen=20)
+_current = {"job_ids": [], "started_at": None}
+_evictor: Optional[asyncio.Task] = None  # evict_loop, started with the server
+
+# Micro-batching: the GPU thread folds queued jobs with identical settings into one pipeline call
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1"))  # >1 needs VRAM for every prompt in the batch
+BATCH_WAIT_S = float(os.getenv("BATCH_WAIT_S", "0.5"))  # how long the head of the queue waits for company
 
-def validate_env():
-    required = ["R2_BUCKET", "R2_PUBLIC_BASE_URL", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_ENDPOINT_URL"]
-    missing = [k for k in required if not os.getenv(k)]
-    if missing:
-        raise ValueError(f"Missing env vars: {', '.join(missing)}")
-
-def get_s3_client():
-    return boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_REGION", "auto"),
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-
-def load_pipeline():
-    global _pipeline_instance
-    if _pipeline_instance is None:
-        lazy_import_ml()
-        log(f"Loading {MODEL_ID}...")
-        _pipeline_instance = _pipeline_class.from_pretrained(
-            MODEL_ID,
-            torch_dtype=_torch.float16,
-        ).to("cuda")
-        _pipeline_instance.enable_model_cpu_offload()
-        _pipeline_instance.vae.enable_slicing()
-        log("Pipeline loaded")
-    return _pipeline_instance
-
-def generate_video_sync(job_id: str, prompt: str, duration: int):
+# Eager model load at startup; /health and /ready report progress so the backend can avoid cold pods
+WARMUP_INFERENCE = os.getenv("WARMUP_INFERENCE", "false").lower() == "true"
+_pipeline = LazyPipeline(MODEL_ID, WARMUP_INFERENCE, log)  # warm_up() runs first on the GPU thread
+EXPECTED_LOAD_SECONDS = float(os.getenv("EXPECTED_LOAD_SECONDS", "180"))  # cold load estimate for queue ETAs
+
+# Per-step progress writes are throttled (PROGRESS_INTERVAL); POST /cancel stops a running job within one step
+NUM_INFERENCE_STEPS = 50
+
+# Upload while ffmpeg encodes (fragmented MP4 into R2 multipart parts) instead of encode-then-upload
+STREAM_UPLOAD = os.getenv("STREAM_UPLOAD", "true").lower() == "true"
+
+def job_settings(job: dict) -> dict:
+    """Pipeline kwargs (plus segment count) that must match for jobs to share a batch"""
+    return {
+        "num_frames": SEGMENT_FRAMES,
+        "guidance_scale": job.get("guidance_scale", 6.0),
+        "num_inference_steps": job.get("num_inference_steps", NUM_INFERENCE_STEPS),
+        "segments": segment_count(job.get("duration", 5)),
+    }
+
+def make_step_callback(job_ids: List[str], num_steps: int, start_pct: float = 40, end_pct: float = 75):
+    """
+    diffusers callback_on_step_end: throttled per-step progress plus cooperative cancellation.
+    A batch only stops once every job in it is cancelled; otherwise cancelled outputs are dropped at the end.
+    """
+    last = {"progress": 0.0}
+    
+    def callback(pipe, step, timestep, callback_kwargs):
+        batch = [jobs[job_id] for job_id in job_ids]
+        if all(job.get("cancel_requested") for job in batch):
+            raise JobCancelled(f"Cancelled at step {step + 1}/{num_steps}")
+        now = time.time()
+        if now - last["progress"] >= PROGRESS_INTERVAL or step + 1 == num_steps:
+            last["progress"] = now
+            for job in batch:
+                job["progress"] = round(start_pct + (end_pct - start_pct) * (step + 1) / num_steps, 1)
+                job["step"] = step + 1
+        return callback_kwargs
+    
+    return callback
+
+def upload_video(job_id: str, segment_paths: List[str]) -> str:
+    """Join one job's segments (upsampling if requested) and upload the result to R2"""
+    output_path = os.path.join(OUTPUT_DIR, f"{job_id}_final.mp4")
+    key = f"videos/{job_id}/final.mp4"
+    
+    jobs[job_id]["progress"] = 90
+    target_fps = jobs[job_id].get("target_fps")
+    interpolation = jobs[job_id].get("interpolation", "mci")
+    if target_fps:
+        log(f"Upsampling {job_id} {FPS} -> {target_fps} fps ({interpolation})...")
+    url = finalize_video(segment_paths, output_path, target_fps, interpolation,
+                         upload_key=key if STREAM_UPLOAD else None)
+    if url:
+        return url
+    
+    if not os.path.exists(output_path):
+        raise RuntimeError("Video file not created")
     try:
-        jobs[job_id]["status"] = "processing"
-        jobs[job_id]["progress"] = 10
-        
-        validate_env()
-        
-        jobs[job_id]["progress"] = 25
-        pipe = load_pipeline()
-        
-        output_path = os.path.join(OUTPUT_DIR, f"{job_id}_final.mp4")
-        
-        jobs[job_id]["progress"] = 40
-        log(f"Running inference for {job_id}...")
-        
-        video_frames = pipe(
-            prompt=prompt,
-            num_frames=49,
-            guidance_scale=6.0,
-            num_inference_steps=50,
-        ).frames[0]
-        
-        jobs[job_id]["progress"] = 75
-        log(f"Generated {len(video_frames)} frames")
+        return upload_file(output_path, key, "video/mp4")
+    finally:
+        remove_files([output_path])
+
+def direct_upload(job: dict, num_segments: int) -> bool:
+    """Single-segment jobs without upsampling skip the local MP4 and encode straight into R2"""
+    return STREAM_UPLOAD and VIDEO_ENCODER == "stream" and num_segments == 1 and not job.get("target_fps")
+
+def generate_batch_sync(job_ids: List[str]):
+    """
+    Run compatible jobs through shared pipeline calls, one call per segment;
+    each job's segments are joined and uploaded on their own
+    """
+    segment_paths = {job_id: [] for job_id in job_ids}
+    direct_frames = {}
+    try:
+        for job_id in job_ids:
+            jobs[job_id]["status"] = "processing"
+            jobs[job_id]["progress"] = 10
+            jobs.save(job_id)
         
-        jobs[job_id]["progress"] = 90
-        _export_to_video(video_frames, output_path, fps=8)
+        validate_r2_env()
         
-        if not os.path.exists(output_path):
-            raise RuntimeError("Video file not created")
+        for job_id in job_ids:
+            jobs[job_id]["progress"] = 25
+        pipe = _pipeline.load()
         
-        # Upload to R2
-        bucket = os.getenv("R2_BUCKET")
-        public_base = os.getenv("R2_PUBLIC_BASE_URL").rstrip("/")
-        key = f"videos/{job_id}/final.mp4"
+        settings = job_settings(jobs[job_ids[0]])
+        num_segments = settings.pop("segments")
+        prompts = [jobs[job_id]["prompt"] for job_id in job_ids]
+        prev_frames = {}
+        for job_id in job_ids:
+            jobs[job_id]["progress"] = 40
         
-        s3 = get_s3_client()
-        with open(output_path, "rb") as f:
-            s3.put_object(
-                Bucket=bucket,
-                Key=key,
-                Body=f,
-                ContentType="video/mp4",
-                CacheControl="public, max-age=31536000",
+        for i in range(num_segments):
+            log(f"Running inference for {', '.join(job_ids)} (segment {i + 1}/{num_segments})...")
+            callback = make_step_callback(
+                job_ids,
+                settings["num_inference_steps"],
+                start_pct=40 + 45 * i / num_segments,
+                end_pct=40 + 45 * (i + 1) / num_segments,
             )
+            conditions = [segment_condition(prev_frames.get(job_id)) for job_id in job_ids]
+            batch_frames = generate_segment(pipe, prompts, settings, conditions, callback, log)
+            
+            for job_id, video_frames in zip(job_ids, batch_frames):
+                if direct_upload(jobs[job_id], num_segments):
+                    direct_frames[job_id] = video_frames
+                    continue
+                path = os.path.join(OUTPUT_DIR, f"{job_id}_seg{i}.mp4")
+                write_video(video_frames, path)
+                segment_paths[job_id].append(path)
+                prev_frames[job_id] = video_frames
         
-        url = f"{public_base}/{key}"
-        
-        # Cleanup
-        try:
-            os.remove(output_path)
-        except Exception:
-            pass
-        
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["progress"] = 100
-        jobs[job_id]["output_url"] = url
-        log(f"Job {job_id} completed: {url}")
-        
+    except JobCancelled as e:
+        log(f"Jobs {', '.join(job_ids)} cancelled: {e}")
+        for job_id in job_ids:
+            remove_files(segment_paths[job_id])
+            jobs.finish(job_id, "cancelled", error=str(e))
+        return
     except Exception as e:
         tb = traceback.format_exc()
-        log(f"Job {job_id} failed: {e}\n{tb}")
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
+        log(f"Jobs {', '.join(job_ids)} failed: {e}\n{tb}")
+        for job_id in job_ids:
+            remove_files(segment_paths[job_id])
+            jobs.finish(job_id, "failed", error=str(e))
+        return
+    
+    for job_id in job_ids:
+        if jobs[job_id].get("cancel_requested"):
+            remove_files(segment_paths[job_id])
+            jobs.finish(job_id, "cancelled", error="Cancelled during batched inference")
+            continue
+        try:
+            if job_id in direct_frames:
+                jobs[job_id]["progress"] = 90
+                url = stream_frames_to_r2(direct_frames.pop(job_id), f"videos/{job_id}/final.mp4")
+            else:
+                url = upload_video(job_id, segment_paths[job_id])
+            jobs.finish(job_id, "completed", progress=100, output_url=url, segments=num_segments, fps=jobs[job_id].get("target_fps") or FPS)
+            log(f"Job {job_id} completed: {url}")
+        except Exception as e:
+            tb = traceback.format_exc()
+            log(f"Job {job_id} failed: {e}\n{tb}")
+            jobs.finish(job_id, "failed", error=str(e))
+
+def enqueue_job(job_id: str, priority: int) -> bool:
+    """Add a job to the queue; False if the queue is full"""
+    with _queue_cond:
+        if len(_queue) >= MAX_QUEUE_DEPTH:
+            return False
+        heapq.heappush(_queue, (-priority, next(_queue_seq), job_id))
+        _queue_cond.notify()
+        return True
+
+def dequeue_job(job_id: str) -> bool:
+    """Remove a job that hasn't started yet; False if it isn't queued"""
+    with _queue_cond:
+        for i, entry in enumerate(_queue):
+            if entry[2] == job_id:
+                _queue.pop(i)
+                heapq.heapify(_queue)
+                return True
+    return False
+
+def queue_position(job_id: str) -> Optional[int]:
+    """1-based position among queued jobs (1 = next to run)"""
+    with _queue_cond:
+        for i, entry in enumerate(sorted(_queue)):
+            if entry[2] == job_id:
+                return i + 1
+    return None
+
+def average_job_seconds() -> float:
+    """Moving average of recent job durations"""
+    if not _recent_durations:
+        return DEFAULT_JOB_SECONDS
+    return sum(_recent_durations) / len(_recent_durations)
+
+def seconds_until_model_ready() -> float:
+    """Estimated remaining model load time (0 once loaded, or if loading failed)"""
+    if _pipeline.state["status"] == "cold":
+        return EXPECTED_LOAD_SECONDS
+    if _pipeline.state["status"] != "loading":
+        return 0.0
+    # Past the estimate we can't tell how long is left; don't promise an imminent start
+    return max(EXPECTED_LOAD_SECONDS * 0.1, EXPECTED_LOAD_SECONDS - (time.time() - _pipeline.state["started_at"]))
+
+def seconds_until_slot_free() -> float:
+    """Estimated time until the GPU thread can take the next batch: model load, then the running job"""
+    if _current["started_at"] is None:
+        return seconds_until_model_ready()
+    return max(0.0, average_job_seconds() - (time.time() - _current["started_at"]))
+
+def estimated_start_in(position: int) -> float:
+    """Seconds until the job at `position` starts (assuming full batches ahead of it)"""
+    return seconds_until_slot_free() + ((position - 1) // MAX_BATCH_SIZE) * average_job_seconds()
+
+def take_batch() -> List[str]:
+    """
+    Pop the highest-priority job plus up to MAX_BATCH_SIZE - 1 queued jobs with the same settings,
+    waiting up to BATCH_WAIT_S for compatible jobs to arrive
+    """
+    with _queue_cond:
+        while not _queue:
+            _queue_cond.wait()
+        _, _, first = heapq.heappop(_queue)
+        batch = [first]
+        key = job_settings(jobs[first])
+        deadline = time.time() + BATCH_WAIT_S
+        
+        while len(batch) < MAX_BATCH_SIZE:
+            for entry in sorted(_queue):
+                if len(batch) >= MAX_BATCH_SIZE:
+                    break
+                if job_settings(jobs[entry[2]]) == key:
+                    _queue.remove(entry)
+                    batch.append(entry[2])
+            heapq.heapify(_queue)
+            remaining = deadline - time.time()
+            if len(batch) >= MAX_BATCH_SIZE or remaining <= 0:
+                break
+            _queue_cond.wait(remaining)
+        return batch
+
+def gpu_worker_loop():
+    """Single GPU thread: load the model, then run queued jobs by priority, batching compatible ones"""
+    _pipeline.warm_up()
+    while True:
+        job_ids = take_batch()
+        _current["job_ids"] = job_ids
+        _current["started_at"] = time.time()
+        try:
+            generate_batch_sync(job_ids)
+        finally:
+            _recent_durations.append(time.time() - _current["started_at"])
+            _current["job_ids"] = []
+            _current["started_at"] = None
 
 class GenerateRequest(BaseModel):
     prompt: str
     duration: int = 5
+    priority: int = 0  # higher runs first
+    guidance_scale: float = 6.0
+    num_inference_steps: int = NUM_INFERENCE_STEPS
+    target_fps: Optional[int] = None  # e.g. 24/30: interpolate on CPU after generation
+    interpolation: str = "mci"  # "mci" (motion interpolation) or "blend"
+
+async def evict_loop():
+    """Expire finished jobs on a timer, so memory and the journal shrink while the pod is idle too"""
+    while True:
+        try:
+            await asyncio.to_thread(jobs.evict)
+        except Exception as e:
+            log(f"Job eviction failed (ignored): {e}")
+        await asyncio.sleep(JOB_EVICT_INTERVAL)
+
+@app.on_event("startup")
+async def startup_event():
+    global _evictor
+    # Re-queue work accepted before a restart; anything mid-run is marked failed
+    for job in jobs.recover():
+        if not enqueue_job(job["id"], job.get("priority", 0)):
+            jobs.finish(job["id"], "failed", error="Queue full after worker restart")
+    # First pass right after recovery clears results that expired while the pod was down
+    _evictor = asyncio.create_task(evict_loop())
+    # Jobs submitted while the model loads simply wait in the queue
+    threading.Thread(target=gpu_worker_loop, daemon=True, name="gpu-worker").start()
 
 @app.get("/health")
 async def health():
     return {
         "status": "healthy",
+        "model_status": _pipeline.state["status"],
+        "ready": _pipeline.state["status"] == "ready",
+        "load_timings": _pipeline.state["timings"],
+        "load_error": _pipeline.state["error"],
+        "load_eta_s": round(seconds_until_model_ready(), 1),
+        "queue_depth": len(_queue),
+        "jobs_in_memory": len(jobs),
+        "max_queue_depth": MAX_QUEUE_DEPTH,
+        "max_batch_size": MAX_BATCH_SIZE,
+        "avg_job_s": round(average_job_seconds(), 1),
         "worker_version": WORKER_VERSION,
         "build_id": BUILD_ID,
         "model": MODEL_ID
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the model is loaded"""
+    if _pipeline.state["status"] != "ready":
+        raise HTTPException(503, f"Model {_pipeline.state['status']}")
+    return {"ready": True}
+
 @app.post("/generate")
 async def generate(req: GenerateRequest):
     if not req.prompt or not req.prompt.strip():
         raise HTTPException(400, "Missing required field: prompt")
+    if req.target_fps:
+        try:
+            validate_interpolation(req.target_fps, req.interpolation)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
     
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {
+    jobs.create({
         "id": job_id,
         "status": "queued",
         "progress": 0,
         "prompt": req.prompt,
         "duration": req.duration,
+        "priority": req.priority,
+        "guidance_scale": req.guidance_scale,
+        "num_inference_steps": req.num_inference_steps,
+        "target_fps": req.target_fps,
+        "interpolation": req.interpolation,
         "created_at": time.time()
-    }
+    })
     
-    # Start async processing
-    executor.submit(generate_video_sync, job_id, req.prompt, req.duration)
+    if not enqueue_job(job_id, req.priority):
+        jobs.remove(job_id)
+        retry_after = max(1, int(seconds_until_slot_free()))
+        raise HTTPException(
+            429,
+            f"Queue full ({MAX_QUEUE_DEPTH} jobs waiting)",
+            headers={"Retry-After": str(retry_after)},
+        )
     
+    position = queue_position(job_id)
     return {
         "job_id": job_id,
         "status": "queued",
+        "queue_position": position,
+        "estimated_start_in_s": round(estimated_start_in(position), 1) if position else 0,
         "message": "Job submitted successfully"
     }
 
 @app.get("/status/{job_id}")
 async def status(job_id: str):
-    if job_id not in jobs:
+    job = jobs.get(job_id)
+    if job is None:
         raise HTTPException(404, "Job not found")
     
-    job = jobs[job_id]
     response = {
         "job_id": job_id,
         "status": job["status"],
@@ -197,13 +411,36 @@ async def status(job_id: str):
         "build_id": BUILD_ID
     }
     
-    if job["status"] == "completed":
+    if job["status"] == "queued":
+        position = queue_position(job_id)
+        if position:
+            start_in = estimated_start_in(position)
+            response["queue_position"] = position
+            response["estimated_start_in_s"] = round(start_in, 1)
+            response["estimated_start_at"] = round(time.time() + start_in, 1)
+    elif job["status"] == "completed":
         response["output_url"] = job.get("output_url")
-    elif job["status"] == "failed":
+    elif job["status"] in ("failed", "cancelled"):
         response["error"] = job.get("error")
     
     return response
 
+@app.post("/cancel/{job_id}")
+async def cancel(job_id: str):
+    """Cancel a queued job immediately, or flag a running one to stop at its next diffusion step"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    
+    if job["status"] == "queued" and dequeue_job(job_id):
+        jobs.finish(job_id, "cancelled", error="Cancelled before start")
+    elif job["status"] in ("queued", "processing"):
+        # Already picked up by the GPU thread (or just about to be)
+        jobs[job_id]["cancel_requested"] = True
+        jobs.save(job_id)
+    
+    return {"job_id": job_id, "status": jobs.get(job_id)["status"], "cancel_requested": job.get("cancel_requested", False)}
+
 if __name__ == "__main__":
     import uvicorn
     log(f"BOOT build_id={BUILD_ID} worker_version={WORKER_VERSION}")
@@ -38,6 +38,7 @@ export HUGGINGFACE_HUB_CACHE=/workspace/hf
 export DIFFUSERS_CACHE=/workspace/hf
 export TORCH_HOME=/workspace/torch
 export TMPDIR=/workspace/tmp
+export PYTHONPATH="$(pwd)/../common:$PYTHONPATH"  # shared r2_upload module
 
 # Create directories
 mkdir -p /workspace/hf /workspace/torch /workspace/tmp /workspace/outputs
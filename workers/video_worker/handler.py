@@ -2,131 +2,90 @@ import os
 import time
 import traceback
 import runpod
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
+
+from cancellation import (
+    CANCEL_CHECK_INTERVAL, JobCancelled, check_cancel_config, make_step_callback, runpod_job_cancelled, safe_progress,
+)
+from cogvideo import LazyPipeline
+from interpolation import validate_interpolation
+from r2_upload import upload_file, validate_r2_env
+from segments import FPS, SEGMENT_FRAMES, finalize_video, generate_segment, remove_files, segment_condition, segment_count, write_video
 
 WORKER_VERSION = "v7-cogvideox-lazy"
 MODEL_ID = "THUDM/CogVideoX-2b"
 
-# Lazy imports - only load heavy deps when needed
-_torch = None
-_pipeline_class = None
-_export_to_video = None
-_pipeline_instance = None
-
-def lazy_import_ml():
-    global _torch, _pipeline_class, _export_to_video
-    if _torch is None:
-        import torch
-        from diffusers.pipelines.cogvideo import CogVideoXPipeline
-        from diffusers.utils import export_to_video
-        _torch = torch
-        _pipeline_class = CogVideoXPipeline
-        _export_to_video = export_to_video
-
 def log(msg: str):
     print(f"[{WORKER_VERSION}] {msg}", flush=True)
 
-def safe_progress(job, pct: int):
-    try:
-        pct = max(0, min(100, int(pct)))
-        runpod.serverless.progress_update(job, pct)
-    except Exception as e:
-        log(f"progress_update failed (ignored): {e}")
-
-def validate_env():
-    required = ["R2_BUCKET", "R2_PUBLIC_BASE_URL", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_ENDPOINT_URL"]
-    missing = [k for k in required if not os.getenv(k)]
-    if missing:
-        raise ValueError(f"Missing env vars: {', '.join(missing)}")
+# Loaded at boot (before serverless.start) so the first job after a scale-up doesn't pay for it
+WARMUP_INFERENCE = os.getenv("WARMUP_INFERENCE", "false").lower() == "true"
+_pipeline = LazyPipeline(MODEL_ID, WARMUP_INFERENCE, log)
 
-def get_s3_client():
-    return boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_REGION", "auto"),
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
+# Per-step progress and RunPod cancel polling: see cancellation.py (PROGRESS_INTERVAL, CANCEL_CHECK_INTERVAL)
+NUM_INFERENCE_STEPS = 50
 
-def load_pipeline():
-    global _pipeline_instance
-    if _pipeline_instance is None:
-        lazy_import_ml()
-        log(f"Loading {MODEL_ID}...")
-        _pipeline_instance = _pipeline_class.from_pretrained(
-            MODEL_ID,
-            torch_dtype=_torch.float16,
-        ).to("cuda")
-        _pipeline_instance.enable_model_cpu_offload()
-        
-        # Safe VAE optimization
-        vae = getattr(_pipeline_instance, "vae", None)
-        if vae is not None:
-            if hasattr(vae, "enable_slicing"):
-                vae.enable_slicing()
-                log("VAE slicing enabled")
-            elif hasattr(vae, "enable_tiling"):
-                vae.enable_tiling()
-                log("VAE tiling enabled")
-            else:
-                log("VAE slicing/tiling not supported (ok)")
-        
-        log("Pipeline loaded")
-    return _pipeline_instance
-
-def generate_video(prompt: str, duration: int, output_path: str, job):
+def generate_video(prompt: str, duration: int, output_path: str, job, guidance_scale: float = 6.0,
+                   num_inference_steps: int = NUM_INFERENCE_STEPS, target_fps: int = None, interpolation: str = "mci") -> dict:
+    """Generate and encode every segment needed for `duration`, then join them (upsampling to target_fps) at output_path"""
     log(f"Generating video: prompt='{prompt[:50]}...' duration={duration}s")
     
     safe_progress(job, 25)
-    pipe = load_pipeline()
+    pipe = _pipeline.load()
     
-    # CogVideoX-2B: max 48 frames at 8fps (6 seconds)
-    # For longer videos, we'll generate multiple clips and concat
-    num_frames = 48
-    fps = 8
+    # CogVideoX generates 49 frames (6s at 8fps) per segment; longer durations get more segments
+    num_segments = segment_count(duration)
+    job_id = job.get("id", "")
+    settings = {"num_frames": SEGMENT_FRAMES, "guidance_scale": guidance_scale, "num_inference_steps": num_inference_steps}
+    segment_paths = []
+    prev_frames = None
+    total_frames = 0
     
     safe_progress(job, 40)
-    log("Running inference...")
-    
-    video_frames = pipe(
-        prompt=prompt,
-        num_frames=num_frames,
-        guidance_scale=6.0,
-        num_inference_steps=50,
-    ).frames[0]
-    
-    safe_progress(job, 75)
-    log(f"Generated {len(video_frames)} frames")
+    try:
+        for i in range(num_segments):
+            if i and runpod_job_cancelled(job_id):
+                raise JobCancelled(f"Cancelled before segment {i + 1}/{num_segments}")
+            log(f"Running inference (segment {i + 1}/{num_segments})...")
+            callback = make_step_callback(
+                num_inference_steps,
+                lambda pct: safe_progress(job, pct),
+                lambda: runpod_job_cancelled(job_id),
+                start_pct=40 + 45 * i / num_segments,
+                end_pct=40 + 45 * (i + 1) / num_segments,
+                cancel_interval=CANCEL_CHECK_INTERVAL,
+            )
+            video_frames = generate_segment(pipe, [prompt], settings, [segment_condition(prev_frames)], callback, log)[0]
+            log(f"Segment {i + 1}/{num_segments}: {len(video_frames)} frames")
+            
+            segment_path = f"{output_path}.seg{i}.mp4"
+            write_video(video_frames, segment_path)
+            segment_paths.append(segment_path)
+            prev_frames = video_frames
+            total_frames += len(video_frames)
+    except Exception:
+        remove_files(segment_paths)
+        raise
     
     safe_progress(job, 90)
-    log("Encoding MP4...")
-    _export_to_video(video_frames, output_path, fps=fps)
+    info = {"fps": FPS, "segments": num_segments, "frames": total_frames, "duration_s": round(total_frames / FPS, 2)}
+    if target_fps:
+        log(f"Joining {num_segments} segment(s), upsampling {FPS} -> {target_fps} fps ({interpolation})...")
+        info.update(fps=target_fps, interpolation=interpolation)
+    else:
+        log(f"Joining {num_segments} segment(s)...")
+    finalize_video(segment_paths, output_path, target_fps, interpolation)
     
     if not os.path.exists(output_path):
         raise RuntimeError("Video file not created")
     
     size = os.path.getsize(output_path)
     log(f"MP4 created: {size} bytes")
+    return info
 
 def upload_to_r2(file_path: str, job_id: str) -> str:
-    bucket = os.getenv("R2_BUCKET")
-    public_base = os.getenv("R2_PUBLIC_BASE_URL").rstrip("/")
     key = f"videos/{job_id}/final.mp4"
-    
     log(f"Uploading to R2: {key}")
-    
-    s3 = get_s3_client()
-    with open(file_path, "rb") as f:
-        s3.put_object(
-            Bucket=bucket,
-            Key=key,
-            Body=f,
-            ContentType="video/mp4",
-            CacheControl="public, max-age=31536000",
-        )
-    
-    url = f"{public_base}/{key}"
+    url = upload_file(file_path, key, "video/mp4")
     log(f"Upload complete: {url}")
     return url
 
@@ -136,6 +95,12 @@ def handler(job):
         log(f"Job started: {job_id}")
         payload = job.get("input", {}) or {}
         
+        # Pre-warm ping from the backend: boot the worker and load the model, do no work
+        if payload.get("warmup"):
+            if _pipeline.state["status"] != "ready":
+                _pipeline.warm_up()
+            return {"ok": True, "warmup": True, "load": _pipeline.state, "worker_version": WORKER_VERSION}
+        
         prompt = payload.get("prompt")
         duration = payload.get("duration", 5)
         
@@ -147,18 +112,28 @@ def handler(job):
                 "worker_version": WORKER_VERSION,
             }
         
+        target_fps = payload.get("target_fps")
+        interpolation = payload.get("interpolation", "mci")
+        if target_fps:
+            try:
+                validate_interpolation(int(target_fps), interpolation)
+            except ValueError as e:
+                return {"ok": False, "error_code": "invalid_input", "error_message": str(e), "worker_version": WORKER_VERSION}
+        
         safe_progress(job, 10)
-        validate_env()
+        validate_r2_env()
         
         output_path = f"/tmp/{job_id}_final.mp4"
-        generate_video(str(prompt), int(duration), output_path, job)
+        video_info = generate_video(
+            str(prompt), int(duration), output_path, job,
+            guidance_scale=float(payload.get("guidance_scale", 6.0)),
+            num_inference_steps=int(payload.get("num_inference_steps", NUM_INFERENCE_STEPS)),
+            target_fps=int(target_fps) if target_fps else None,
+            interpolation=interpolation,
+        )
         
         public_url = upload_to_r2(output_path, job_id)
-        
-        try:
-            os.remove(output_path)
-        except Exception:
-            pass
+        remove_files([output_path])
         
         safe_progress(job, 100)
         return {
@@ -167,10 +142,13 @@ def handler(job):
             "worker_version": WORKER_VERSION,
             "meta": {
                 "model": "cogvideox-2b",
-                "fps": 8,
+                **video_info,
             },
         }
     
+    except JobCancelled as e:
+        log(f"Job {job_id} cancelled: {e}")
+        return {"ok": False, "error_code": "cancelled", "error_message": str(e), "worker_version": WORKER_VERSION}
     except (ValueError, ImportError) as e:
         log(f"Config/Import error: {e}")
         return {"ok": False, "error_code": "config_error", "error_message": str(e), "worker_version": WORKER_VERSION}
@@ -184,4 +162,6 @@ def handler(job):
 
 if __name__ == "__main__":
     log("CogVideoX worker starting...")
+    check_cancel_config(log)
+    _pipeline.warm_up()
     runpod.serverless.start({"handler": handler})
@@ -0,0 +1,141 @@
+"""
+Persistent job registry for the pod video API server
+Active jobs live in memory; creation and terminal states are journaled to SQLite under /workspace
+so finished results survive restarts. Terminal jobs are evicted from memory after JOB_MEMORY_TTL
+and deleted from disk after JOB_TTL; the server calls evict() every JOB_EVICT_INTERVAL, busy or idle.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "/workspace/jobs.db")
+JOB_MEMORY_TTL = int(os.getenv("JOB_MEMORY_TTL", "600"))  # finished jobs stay in memory this long
+JOB_TTL = int(os.getenv("JOB_TTL", "604800"))  # and on disk this long (7 days)
+JOB_EVICT_INTERVAL = int(os.getenv("JOB_EVICT_INTERVAL", "60"))  # how often the server runs evict()
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class JobStore:
+    """Dict-like for active jobs (jobs[job_id]["progress"] = ...), with disk fallback for get()"""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._mem: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_finished ON jobs(finished_at)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def __getitem__(self, job_id: str) -> dict:
+        return self._mem[job_id]
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+    def values(self) -> List[dict]:
+        with self._lock:
+            return list(self._mem.values())
+
+    def create(self, job: dict):
+        with self._lock:
+            self._mem[job["id"]] = job
+        self.save(job["id"])
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """In-memory job, or the journaled copy if it has been evicted / we restarted"""
+        job = self._mem.get(job_id)
+        if job is not None:
+            return job
+        conn = self._connect()
+        row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    def save(self, job_id: str):
+        """Journal the current in-memory state of a job"""
+        job = self._mem.get(job_id)
+        if job is None:
+            return
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, created_at, finished_at, data) VALUES (?, ?, ?, ?, ?)",
+            (job_id, job["status"], job["created_at"], job.get("finished_at"), json.dumps(job))
+        )
+        conn.commit()
+        conn.close()
+
+    def finish(self, job_id: str, status: str, **fields):
+        """Move a job to a terminal state and journal it"""
+        job = self._mem[job_id]
+        job.update(fields)
+        job["status"] = status
+        job["finished_at"] = time.time()
+        self.save(job_id)
+
+    def remove(self, job_id: str):
+        with self._lock:
+            self._mem.pop(job_id, None)
+        conn = self._connect()
+        conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        conn.commit()
+        conn.close()
+
+    def evict(self):
+        """Drop finished jobs from memory after JOB_MEMORY_TTL and from disk after JOB_TTL"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._mem.items()
+                if job["status"] in TERMINAL_STATUSES and now - job.get("finished_at", now) > JOB_MEMORY_TTL
+            ]
+            for job_id in expired:
+                del self._mem[job_id]
+
+        conn = self._connect()
+        conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (now - JOB_TTL,))
+        conn.commit()
+        conn.close()
+
+    def recover(self) -> List[dict]:
+        """
+        On boot: jobs that were mid-run are marked failed; queued jobs are restored to memory
+        and returned (oldest first) so the caller can re-enqueue them.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT data FROM jobs WHERE status NOT IN ('completed', 'failed', 'cancelled') ORDER BY created_at"
+        ).fetchall()
+        conn.close()
+
+        queued = []
+        for (data,) in rows:
+            job = json.loads(data)
+            with self._lock:
+                self._mem[job["id"]] = job
+            if job["status"] == "queued":
+                queued.append(job)
+            else:
+                self.finish(job["id"], "failed", error="Worker restarted while job was running")
+        return queued
@@ -0,0 +1,202 @@
+"""
+CPU-only tests for batched inference in the pod API server, with a stub pipeline and fake R2
+Run: cd workers/video_worker && python -m pytest -q test_batching.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))  # r2_upload, segments
+
+os.environ.setdefault("JOB_DB_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+for var in ["R2_BUCKET", "R2_PUBLIC_BASE_URL", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_ENDPOINT_URL"]:
+    os.environ.setdefault(var, "test")
+
+import api_server  # noqa: E402
+import segments  # noqa: E402
+
+
+class StubOutput:
+    def __init__(self, frames):
+        self.frames = frames
+
+
+class StubPipeline:
+    """Returns one fake video per prompt, running the step callback like diffusers does"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, num_frames, guidance_scale, num_inference_steps, output_type="pil", callback_on_step_end=None):
+        self.calls.append({"prompt": list(prompt), "num_inference_steps": num_inference_steps})
+        for step in range(num_inference_steps):
+            callback_on_step_end(self, step, 0, {})
+        return StubOutput([[f"{p}-frame-{i}" for i in range(3)] for p in prompt])
+
+
+class FakeR2:
+    def __init__(self):
+        self.objects = {}
+
+    def upload_file(self, file_path, key, content_type):
+        self.objects[key] = open(file_path).read()
+        return f"https://r2.test/{key}"
+
+
+def setup(monkeypatch, max_batch_size=2):
+    pipe = StubPipeline()
+    s3 = FakeR2()
+    monkeypatch.setattr(api_server._pipeline, "pipe", pipe)
+    monkeypatch.setattr(api_server, "upload_file", s3.upload_file)
+    monkeypatch.setattr(segments, "encode_frames", lambda frames, path, fps: open(path, "w").write(",".join(frames)))
+    monkeypatch.setattr(api_server, "OUTPUT_DIR", tempfile.mkdtemp())
+    monkeypatch.setattr(api_server, "STREAM_UPLOAD", False)
+    monkeypatch.setattr(api_server, "MAX_BATCH_SIZE", max_batch_size)
+    monkeypatch.setattr(api_server, "BATCH_WAIT_S", 0.05)
+    api_server._queue.clear()
+    return pipe, s3
+
+
+def submit(job_id, prompt, priority=0, duration=5, **settings):
+    api_server.jobs.create({
+        "id": job_id, "status": "queued", "progress": 0, "prompt": prompt, "duration": duration,
+        "priority": priority, "created_at": time.time(), **settings,
+    })
+    assert api_server.enqueue_job(job_id, priority)
+
+
+def run_queue():
+    while api_server._queue:
+        api_server.generate_batch_sync(api_server.take_batch())
+
+
+def test_compatible_jobs_run_in_one_call_and_upload_separately(monkeypatch):
+    pipe, s3 = setup(monkeypatch)
+    submit("a1", "cat", num_inference_steps=4)
+    submit("a2", "dog", num_inference_steps=4)
+
+    run_queue()
+
+    assert [c["prompt"] for c in pipe.calls] == [["cat", "dog"]]
+    for job_id, prompt in [("a1", "cat"), ("a2", "dog")]:
+        job = api_server.jobs.get(job_id)
+        assert job["status"] == "completed"
+        assert job["output_url"].endswith(f"videos/{job_id}/final.mp4")
+        assert s3.objects[f"videos/{job_id}/final.mp4"].startswith(f"{prompt}-frame-0")
+
+
+def test_incompatible_jobs_and_batch_limit(monkeypatch):
+    pipe, s3 = setup(monkeypatch, max_batch_size=2)
+    submit("b1", "one", num_inference_steps=4)
+    submit("b2", "two", num_inference_steps=2)
+    submit("b3", "three", num_inference_steps=4)
+    submit("b4", "four", num_inference_steps=4)
+
+    run_queue()
+
+    assert [c["prompt"] for c in pipe.calls] == [["one", "three"], ["two"], ["four"]]
+    assert s3.objects["videos/b4/final.mp4"].startswith("four-frame-0")
+
+
+def test_priority_picks_batch_head(monkeypatch):
+    pipe, s3 = setup(monkeypatch, max_batch_size=2)
+    submit("c1", "low", num_inference_steps=2)
+    submit("c2", "other", num_inference_steps=3)
+    submit("c3", "high", priority=5, num_inference_steps=3)
+
+    run_queue()
+
+    assert [c["prompt"] for c in pipe.calls] == [["high", "other"], ["low"]]
+
+
+def test_cancelled_job_output_is_dropped(monkeypatch):
+    pipe, s3 = setup(monkeypatch)
+    submit("d1", "keep", num_inference_steps=2)
+    submit("d2", "drop", num_inference_steps=2)
+    api_server.jobs["d2"]["cancel_requested"] = True
+
+    run_queue()
+
+    assert api_server.jobs.get("d1")["status"] == "completed"
+    assert api_server.jobs.get("d2")["status"] == "cancelled"
+    assert "videos/d2/final.mp4" not in s3.objects
+
+
+def test_long_duration_is_generated_in_segments(monkeypatch):
+    pipe, s3 = setup(monkeypatch)
+
+    def fake_finalize(paths, output_path, target_fps=None, interpolation="mci", upload_key=None):
+        with open(output_path, "w") as out:
+            out.write("|".join(open(p).read() for p in paths))
+        api_server.remove_files(paths)
+
+    monkeypatch.setattr(api_server, "finalize_video", fake_finalize)
+    submit("e1", "sea", duration=12, num_inference_steps=2)
+    submit("e2", "sky", duration=12, num_inference_steps=2)
+    submit("e3", "sun", duration=5, num_inference_steps=2)
+
+    run_queue()
+
+    assert api_server.segment_count(12) == 2
+    assert [c["prompt"] for c in pipe.calls] == [["sea", "sky"], ["sea", "sky"], ["sun"]]
+    assert s3.objects["videos/e1/final.mp4"].count("sea-frame-0") == 2
+    assert api_server.jobs.get("e2")["segments"] == 2
+
+
+def test_single_segment_streams_without_local_file(monkeypatch):
+    pipe, s3 = setup(monkeypatch)
+    monkeypatch.setattr(api_server, "STREAM_UPLOAD", True)
+
+    def fake_stream(frames, key):
+        s3.objects[key] = ",".join(frames)
+        return f"https://r2.test/{key}"
+
+    monkeypatch.setattr(api_server, "stream_frames_to_r2", fake_stream)
+    submit("f1", "fog", num_inference_steps=2)
+
+    run_queue()
+
+    assert api_server.jobs.get("f1")["output_url"] == "https://r2.test/videos/f1/final.mp4"
+    assert s3.objects["videos/f1/final.mp4"] == "fog-frame-0,fog-frame-1,fog-frame-2"
+    assert os.listdir(api_server.OUTPUT_DIR) == []
+
+
+def test_queue_estimates_include_model_load(monkeypatch):
+    setup(monkeypatch)
+    monkeypatch.setattr(api_server, "EXPECTED_LOAD_SECONDS", 100.0)
+    monkeypatch.setattr(api_server._pipeline, "state", {"status": "loading", "timings": {}, "error": None, "started_at": time.time() - 40})
+
+    assert 59 <= api_server.seconds_until_slot_free() <= 60
+    monkeypatch.setitem(api_server._pipeline.state, "started_at", time.time() - 500)
+    assert api_server.seconds_until_slot_free() == 10.0  # overran the estimate: still not "any second now"
+    monkeypatch.setitem(api_server._pipeline.state, "status", "ready")
+    assert api_server.seconds_until_slot_free() == 0.0
+
+
+def test_finished_jobs_are_evicted_while_idle(monkeypatch):
+    import asyncio
+    import job_store
+
+    monkeypatch.setattr(api_server, "JOB_EVICT_INTERVAL", 0.01)
+    monkeypatch.setattr(job_store, "JOB_MEMORY_TTL", 60)
+    monkeypatch.setattr(job_store, "JOB_TTL", 3600)
+    now = time.time()
+    for job_id, finished_ago in [("recent", 10), ("old", 120), ("expired", 7200)]:
+        api_server.jobs.create({"id": job_id, "status": "queued", "created_at": now - finished_ago})
+        api_server.jobs.finish(job_id, "completed", output_url=f"https://r2.test/{job_id}")
+        api_server.jobs[job_id]["finished_at"] = now - finished_ago
+        api_server.jobs.save(job_id)
+
+    async def idle_for_a_moment():
+        evictor = asyncio.create_task(api_server.evict_loop())
+        await asyncio.sleep(0.1)  # no GPU batch runs in the meantime
+        evictor.cancel()
+
+    asyncio.run(idle_for_a_moment())
+
+    in_memory = {job["id"] for job in api_server.jobs.values()}
+    assert "recent" in in_memory and not {"old", "expired"} & in_memory
+    assert api_server.jobs.get("old")["output_url"] == "https://r2.test/old"  # still served from the journal
+    assert api_server.jobs.get("expired") is None
@@ -0,0 +1,105 @@
+"""
+CPU-only tests for segmented generation in the serverless handler, with a stub pipeline and fake R2
+Run: cd workers/video_worker && python -m pytest -q test_handler.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))  # r2_upload, segments
+
+
+class StubOutput:
+    def __init__(self, frames):
+        self.frames = frames
+
+
+class StubPipeline:
+    """Called like CogVideoXPipeline: one fake video per prompt, running the step callback each step"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, num_frames, guidance_scale, num_inference_steps, output_type="pil", callback_on_step_end=None):
+        self.calls.append(list(prompt))
+        for step in range(num_inference_steps):
+            callback_on_step_end(self, step, 0, {})
+        return StubOutput([[f"{p}-{len(self.calls)}-frame-{i}" for i in range(3)] for p in prompt])
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    pytest.importorskip("runpod")
+    for var in ["R2_BUCKET", "R2_PUBLIC_BASE_URL", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_ENDPOINT_URL"]:
+        monkeypatch.setenv(var, "test")
+    import handler
+    import segments
+
+    state = {"pipe": StubPipeline(), "cancelled": set(), "uploads": {}}
+
+    def upload_file(path, key, content_type):
+        state["uploads"][key] = open(path).read()
+        return f"https://r2.test/{key}"
+
+    def finalize_video(segment_paths, output_path, *args, **kwargs):
+        with open(output_path, "w") as out:
+            out.write("|".join(open(path).read() for path in segment_paths))
+        segments.remove_files(segment_paths)
+
+    monkeypatch.setattr(handler._pipeline, "pipe", state["pipe"])
+    monkeypatch.setattr(handler, "safe_progress", lambda job, pct: None)
+    monkeypatch.setattr(handler, "runpod_job_cancelled", lambda job_id: job_id in state["cancelled"])
+    monkeypatch.setattr(handler, "upload_file", upload_file)
+    monkeypatch.setattr(handler, "finalize_video", finalize_video)
+    monkeypatch.setattr(segments, "encode_frames", lambda frames, path, fps: open(path, "w").write(",".join(frames)))
+    handler.state = state
+    return handler
+
+
+def test_duration_is_covered_by_joined_segments(handler):
+    result = handler.handler({"id": "long", "input": {"prompt": "cat", "duration": 12, "num_inference_steps": 2}})
+
+    assert result["ok"], result
+    assert result["meta"]["segments"] == 2 and result["meta"]["frames"] == 6
+    assert handler.state["pipe"].calls == [["cat"], ["cat"]]
+    assert handler.state["uploads"]["videos/long/final.mp4"] == (
+        "cat-1-frame-0,cat-1-frame-1,cat-1-frame-2|cat-2-frame-0,cat-2-frame-1,cat-2-frame-2"
+    )
+    assert not os.path.exists("/tmp/long_final.mp4")
+
+
+def test_cancel_between_segments_stops_before_the_next_one(handler, monkeypatch):
+    import segments
+
+    def encode_and_cancel(frames, path, fps):
+        open(path, "w").write(",".join(frames))
+        handler.state["cancelled"].add("gone")  # cancelled while segment 1 is being encoded
+
+    monkeypatch.setattr(segments, "encode_frames", encode_and_cancel)
+
+    result = handler.handler({"id": "gone", "input": {"prompt": "cat", "duration": 12, "num_inference_steps": 2}})
+
+    assert result["error_code"] == "cancelled"
+    assert handler.state["pipe"].calls == [["cat"]]
+    assert handler.state["uploads"] == {}
+    assert not os.path.exists("/tmp/gone_final.mp4.seg0.mp4")
+
+
+def test_target_fps_is_validated_and_passed_to_the_join(handler, monkeypatch):
+    joined = {}
+
+    def finalize_video(segment_paths, output_path, target_fps=None, interpolation="mci"):
+        joined.update(target_fps=target_fps, interpolation=interpolation)
+        open(output_path, "w").write("joined")
+
+    monkeypatch.setattr(handler, "finalize_video", finalize_video)
+
+    bad = handler.handler({"id": "bad", "input": {"prompt": "cat", "target_fps": 120}})
+    good = handler.handler({"id": "good", "input": {"prompt": "cat", "target_fps": 24, "interpolation": "blend", "num_inference_steps": 2}})
+
+    assert bad["error_code"] == "invalid_input"
+    assert handler.state["pipe"].calls == [["cat"]]
+    assert joined == {"target_fps": 24, "interpolation": "blend"}
+    assert good["meta"]["fps"] == 24 and good["meta"]["interpolation"] == "blend"